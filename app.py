@@ -1,15 +1,43 @@
-from flask import Flask, request, jsonify, render_template, g
+from flask import Flask, Response, request, jsonify, render_template, g
 import os
-from database import init_db, add_component, get_all_components_with_similarity_info, find_similar_components, merge_components, get_component_by_id, update_component_storage, update_component_quantity, search_components, update_component, delete_component, mark_components_not_similar
-from parser import parse_component
-import sqlite3
+from database import init_db, release_db_connection, prune_change_log, get_latest_change_id, get_changes_after, get_change_counter, wait_for_changes, get_connection_stats, get_write_queue_stats, add_component, add_components_bulk, get_all_components_with_similarity_info, get_all_components_columnar, get_inventory_revision, get_inventory_summary, get_component_changes, find_similar_components, merge_components, get_component_by_id, update_component_storage, update_component_quantity, search_components, update_component, delete_component, mark_components_not_similar, count_stale_specs, backfill_component_specs, count_stale_similarity, backfill_similarity_index, find_duplicate_clusters, apply_component_operations, RevisionConflictError
+from parser import parse_component, parse_component_stream, parse_many, LLM_HEDGE_SECONDS
+from importer import import_components, detect_format
+from exporter import export_components, MIME_TYPES
+from specs import SPEC_KINDS
+import io
+import json
+import threading
+import time
+import uuid
+import jobs
+import metrics
 import base64
-from llm_parser import process_image_with_llm
+from llm_parser import process_image_with_llm, IMAGE_MODEL, IMAGE_PROMPT_VERSION
+import images
+import llm_cache
+import circuit_breaker
+import gzip
+
+# Faster JSON encoding and brotli compression are used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
 # Configuration
 app.config['USE_LLM_PARSER'] = True  # Set to False to use only regex parsing
+app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')  # Images waiting for processing
+app.config['MAX_CHANGE_STREAMS'] = int(os.getenv('MAX_CHANGE_STREAMS', 32))  # Open /api/changes/stream connections
+app.config['COMPRESS_MIN_BYTES'] = int(os.getenv('COMPRESS_MIN_BYTES', 1024))  # Smaller JSON responses are sent as they are
+app.config['GZIP_LEVEL'] = int(os.getenv('GZIP_LEVEL', 5))
+app.config['BROTLI_QUALITY'] = int(os.getenv('BROTLI_QUALITY', 4))
 
 # Initialize the database before the first request
 # We'll use this function with app.before_request instead
@@ -22,30 +50,58 @@ def initialize_database():
 # Register the function to run before each request
 @app.before_request
 def before_request():
+    g.request_started = time.perf_counter()
     initialize_database()
+    # Started lazily so the debug reloader's parent process runs no workers
+    jobs.start_workers()
+
+@app.after_request
+def record_request_metrics(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        # The route pattern, not the path, so ids do not create new series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('inventory_http_request_duration_seconds', time.perf_counter() - started,
+                        method=request.method, route=route, status=response.status_code)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses with brotli or gzip when the client accepts it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(body, quality=app.config['BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=app.config['GZIP_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def json_response(value):
+    """Like jsonify, but compact, unsorted and encoded with orjson when available"""
+    if orjson is not None:
+        body = orjson.dumps(value)
+    else:
+        body = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return app.response_class(body, mimetype='application/json')
+
+# Return the request's pooled database connection once the request is done
+@app.teardown_appcontext
+def teardown_database(exception=None):
+    release_db_connection()
 
 # Alternatively, initialize immediately (outside of request context)
 # This works if init_db() doesn't need request context
-init_db()  # Initialize the database at startup
-
-# Replace before_first_request with a function that runs during app startup
-def create_excluded_similarities_table():
-    conn = sqlite3.connect('inventory.db')
-    conn.execute('''
-    CREATE TABLE IF NOT EXISTS excluded_similarities (
-        component1_id INTEGER NOT NULL,
-        component2_id INTEGER NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        PRIMARY KEY (component1_id, component2_id),
-        FOREIGN KEY (component1_id) REFERENCES components (id),
-        FOREIGN KEY (component2_id) REFERENCES components (id)
-    )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Execute the function immediately
-create_excluded_similarities_table()
+init_db()  # Initialize the database at startup (applies pending migrations)
+prune_change_log()
+# The startup thread is done with the database; pool its connection
+release_db_connection()
 
 @app.route('/')
 def index():
@@ -53,17 +109,125 @@ def index():
 
 @app.route('/api/components', methods=['GET'])
 def get_components():
+    """List components; pass limit (and cursor) to page through them and
+    fields=a,b,c to only return those keys. format=columnar returns the list
+    as one array per field (see get_all_components_columnar).
+
+    The inventory revision is sent as a weak ETag (If-None-Match gets a 304) and
+    in X-Inventory-Revision. With since=<revision> only the components changed
+    or deleted after that revision are returned."""
     try:
-        components = get_all_components_with_similarity_info()
-        print(f"Successfully retrieved {len(components)} components")
-        return jsonify(components)
+        fields = request.args.get('fields')
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ValueError('since must be a revision number')
+            if since < 0:
+                raise ValueError('since must be a revision number')
+            changes = get_component_changes(since, fields)
+            if since > changes['revision']:
+                # The client saw a different database; send everything
+                changes = get_component_changes(0, fields)
+                changes['reset'] = True
+            revision = changes['revision']
+            response = jsonify(changes)
+        else:
+            revision = get_inventory_revision()
+            etag = f'rev-{revision}'
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            elif request.args.get('format') == 'columnar':
+                components = get_all_components_columnar(
+                    limit=get_page_limit(request.args.get('limit')),
+                    cursor=request.args.get('cursor'),
+                    fields=fields
+                )
+                print(f"Successfully retrieved {components['count']} components")
+                response = json_response(components)
+            else:
+                components = get_all_components_with_similarity_info(
+                    limit=get_page_limit(request.args.get('limit')),
+                    cursor=request.args.get('cursor'),
+                    fields=fields
+                )
+                count = len(components) if isinstance(components, list) else len(components['items'])
+                print(f"Successfully retrieved {count} components")
+                response = jsonify(components)
+            # Weak: the gzip, brotli and identity bodies differ byte for byte
+            response.set_etag(etag, weak=True)
+        response.headers['X-Inventory-Revision'] = str(revision)
+        # Always revalidate; unchanged lists cost a 304
+        response.headers['Cache-Control'] = 'no-cache'
+        # Compressed and identity bodies share the weak ETag, so caches must key on the
+        # encoding too; set on 304s as well, which compress_response skips
+        response.vary.add('Accept-Encoding')
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error retrieving components: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Upper bound on descriptions accepted by one parse/add request
+MAX_BATCH_INPUTS = 500
+# Largest page a list or search request can ask for
+MAX_PAGE_SIZE = 1000
+
+def get_page_limit(value):
+    """Page size from a request (None when not paging), capped at MAX_PAGE_SIZE.
+
+    Raises ValueError unless it is a positive integer.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('limit must be a positive integer')
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+def get_batch_inputs(data):
+    """Return the 'inputs' list of a batch request, or None for a single input.
+
+    Raises ValueError if the list is malformed.
+    """
+    inputs = data.get('inputs')
+    if inputs is None:
+        return None
+    if not isinstance(inputs, list) or not all(isinstance(text, str) for text in inputs):
+        raise ValueError('inputs must be a list of strings')
+    inputs = [text.strip() for text in inputs if text.strip()]
+    if not inputs:
+        raise ValueError('No input provided')
+    if len(inputs) > MAX_BATCH_INPUTS:
+        raise ValueError(f'At most {MAX_BATCH_INPUTS} inputs per request')
+    return inputs
+
 @app.route('/api/components', methods=['POST'])
 def add_new_component():
-    input_text = request.json.get('input', '')
+    """Add a component from {'input': text}, or several from {'inputs': [text, ...]}"""
+    data = request.json or {}
+    try:
+        inputs = get_batch_inputs(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if inputs is not None:
+        parsed_components = parse_many(inputs, use_llm=app.config['USE_LLM_PARSER'])
+        added_count = add_components_bulk(parsed_components)
+        return jsonify({
+            'message': f'{added_count} component(s) added successfully',
+            'added_count': added_count,
+            'parsed_data': parsed_components
+        })
+    
+    input_text = data.get('input', '')
     if not input_text:
         return jsonify({'error': 'No input provided'}), 400
     
@@ -78,10 +242,40 @@ def add_new_component():
 
 @app.route('/api/parse', methods=['POST'])
 def parse_input():
-    input_text = request.json.get('input', '')
+    """Parse {'input': text}, or {'inputs': [text, ...]} in as few LLM calls as possible
+
+    With {'input': text, 'stream': true} the answer is newline-delimited JSON:
+    the regex result at once, then the LLM's refinements (see
+    parse_component_stream). Closing the connection cancels the LLM call.
+    """
+    data = request.json or {}
+    try:
+        inputs = get_batch_inputs(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if inputs is not None:
+        return jsonify(parse_many(inputs, use_llm=app.config['USE_LLM_PARSER']))
+    
+    input_text = data.get('input', '')
     if not input_text:
         return jsonify({'error': 'No input provided'}), 400
     
+    if data.get('stream'):
+        use_llm = app.config['USE_LLM_PARSER']
+        
+        def generate():
+            try:
+                for event in parse_component_stream(input_text, use_llm=use_llm):
+                    yield json.dumps(event) + '\n'
+            finally:
+                release_db_connection()
+        
+        return Response(generate(), mimetype='application/x-ndjson', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+        })
+    
     # Use LLM parsing if enabled in config
     parsed_data = parse_component(input_text, use_llm=app.config['USE_LLM_PARSER'])
     return jsonify(parsed_data)
@@ -94,12 +288,167 @@ def toggle_llm():
         'llm_enabled': app.config['USE_LLM_PARSER']
     })
 
+@app.route('/api/llm/breakers', methods=['GET'])
+def llm_breakers():
+    """Circuit breaker state of each LLM backend used since startup"""
+    return jsonify({
+        'llm_enabled': app.config['USE_LLM_PARSER'],
+        'hedge_seconds': LLM_HEDGE_SECONDS,
+        'breakers': circuit_breaker.get_states()
+    })
+
+@app.route('/api/llm/breakers/<path:name>/reset', methods=['POST'])
+def reset_llm_breaker(name):
+    """Close a breaker by hand, e.g. once the backend is known to be back"""
+    if name not in {breaker['name'] for breaker in circuit_breaker.get_states()}:
+        return jsonify({'error': 'Unknown backend'}), 404
+    breaker = circuit_breaker.get_breaker(name)
+    breaker.reset()
+    return jsonify(breaker.get_state())
+
+def collect_pool_and_cache_metrics():
+    """Connection pool, write queue, LLM cache and circuit breaker figures, read when /metrics is scraped"""
+    for stat, value in get_connection_stats().items():
+        if stat == 'pooled':
+            yield ('inventory_db_pooled_connections', 'gauge', 'Idle connections in the pool', {}, value)
+        else:
+            yield ('inventory_db_connections_total', 'counter', 'Connections opened, reused and closed',
+                   {'event': stat}, value)
+    write_stats = get_write_queue_stats()
+    yield ('inventory_db_queued_writes_total', 'counter', 'Writes run on the writer thread', {}, write_stats['writes'])
+    yield ('inventory_db_group_commits_total', 'counter', 'Commits of queued writes', {}, write_stats['commits'])
+    yield ('inventory_db_write_queue_depth', 'gauge', 'Writes waiting for the writer thread', {}, write_stats['queued'])
+    cache_stats = llm_cache.get_stats()
+    for stat in ('memory_hits', 'db_hits', 'misses', 'stores', 'evictions'):
+        yield ('inventory_llm_cache_events_total', 'counter', 'LLM result cache lookups and writes',
+               {'event': stat}, cache_stats[stat])
+    yield ('inventory_llm_cache_entries', 'gauge', 'Entries in the persistent LLM cache', {},
+           cache_stats['db_entries'])
+    for breaker in circuit_breaker.get_states():
+        yield ('inventory_llm_breaker_open', 'gauge', 'Whether calls to the LLM backend are cut off (1) or not (0)',
+               {'backend': breaker['name']}, int(breaker['state'] == circuit_breaker.OPEN))
+        yield ('inventory_llm_breaker_rejected_total', 'counter', 'LLM calls skipped because the breaker was open',
+               {'backend': breaker['name']}, breaker['rejected'])
+
+metrics.register_collector(collect_pool_and_cache_metrics)
+
+def collect_encoder_metrics():
+    """Which optional JSON encoder and compression this process uses (orjson and brotli are optional)"""
+    yield ('inventory_json_encoder_info', 'gauge', 'JSON encoder of large responses (1 for the active one)',
+           {'encoder': 'orjson' if orjson is not None else 'json'}, 1)
+    yield ('inventory_compression_info', 'gauge', 'Best response compression available (1 for the active one)',
+           {'encoding': 'br' if brotli is not None else 'gzip'}, 1)
+
+metrics.register_collector(collect_encoder_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request, database and LLM metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/db-stats', methods=['GET'])
+def db_stats():
+    """Report how many database connections were opened versus reused"""
+    return jsonify(get_connection_stats())
+
+# Streams wait this long for a change before re-checking the change log
+# (which also picks up changes made by other processes)
+CHANGE_STREAM_POLL_SECONDS = 2.0
+# A comment line is sent after this much quiet so proxies keep the stream open
+CHANGE_STREAM_KEEPALIVE_SECONDS = 15.0
+
+_change_streams_lock = threading.Lock()
+_open_change_streams = 0
+
+def _change_event(change):
+    payload = {
+        'revision': change['revision'],
+        'kind': change['kind'],
+        'component_id': change['component_id'],
+        'data': change['data']
+    }
+    return f"id: {change['id']}\nevent: change\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    """Server-Sent Events stream of inventory changes.
+
+    Each event carries the change kind, component id and the inventory
+    revision after the change; clients fetch the changed rows with
+    GET /api/components?since=<revision>. Reconnecting browsers resume
+    after their Last-Event-ID.
+    """
+    global _open_change_streams
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    last_id = last_event_id if last_event_id is not None else get_latest_change_id()
+
+    with _change_streams_lock:
+        if _open_change_streams >= app.config['MAX_CHANGE_STREAMS']:
+            return jsonify({"error": "Too many open change streams"}), 503
+        _open_change_streams += 1
+
+    def generate():
+        global _open_change_streams
+        nonlocal last_id
+        try:
+            yield 'retry: 3000\n\n'
+            quiet = 0.0
+            while True:
+                seen = get_change_counter()
+                changes = get_changes_after(last_id)
+                # Do not hold a pooled connection while waiting
+                release_db_connection()
+                if changes:
+                    for change in changes:
+                        yield _change_event(change)
+                    last_id = changes[-1]['id']
+                    quiet = 0.0
+                    continue
+                if not wait_for_changes(seen, CHANGE_STREAM_POLL_SECONDS):
+                    quiet += CHANGE_STREAM_POLL_SECONDS
+                    if quiet >= CHANGE_STREAM_KEEPALIVE_SECONDS:
+                        yield ': keep-alive\n\n'
+                        quiet = 0.0
+        finally:
+            release_db_connection()
+            with _change_streams_lock:
+                _open_change_streams -= 1
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+    })
+
+@app.route('/api/llm-cache', methods=['GET'])
+def llm_cache_stats():
+    """Report LLM result cache hits, misses and size"""
+    return jsonify(llm_cache.get_stats())
+
+@app.route('/api/llm-cache', methods=['DELETE'])
+def clear_llm_cache():
+    """Drop every cached LLM result"""
+    llm_cache.clear()
+    return jsonify({'message': 'LLM cache cleared'})
+
 @app.route('/api/components/<int:component_id>/similar', methods=['GET'])
 def get_similar_components(component_id):
     """Get components similar to the specified one"""
     similar_components = find_similar_components(component_id)
     return jsonify(similar_components)
 
+@app.route('/api/duplicates/clusters', methods=['GET'])
+def get_duplicate_clusters():
+    """Every cluster of likely duplicates in the inventory, largest first"""
+    try:
+        return jsonify({'clusters': find_duplicate_clusters(request.args.get('fields'))})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/summary', methods=['GET'])
+def get_summary():
+    """Inventory totals, per-category and per-location counts, zero-stock and duplicate group counts"""
+    return jsonify(get_inventory_summary())
+
 @app.route('/api/components/merge', methods=['POST'])
 def merge_component():
     """Merge two components"""
@@ -158,14 +507,27 @@ def update_quantity(component_id):
     else:
         return jsonify({'error': 'Failed to update quantity'}), 400
 
-@app.route('/api/components/search', methods=['POST'])
-def search_components_api():
-    """Search for components using query text and filters"""
-    data = request.json or {}
-    
-    query = data.get('query', '')
-    filters = data.get('filters', {})
-    
+@app.route('/api/components/batch', methods=['POST'])
+def batch_update_components():
+    """Apply many quantity, storage and field changes in one transaction.
+
+    Body: {"operations": [{"id": 1, "op": "set_quantity", "quantity": 5,
+    "revision": 42}, ...], "fields": optional projection}. Ops are
+    set_quantity, adjust_quantity (delta), set_storage and update (fields).
+    Returns the new inventory revision and only the components that changed;
+    a stale revision or missing component rejects the whole batch with 409.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        result = apply_component_operations(data.get('operations'), data.get('fields'))
+    except RevisionConflictError as e:
+        return jsonify({'error': str(e), 'conflicts': e.conflicts}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+def normalize_search_filters(filters):
+    """Convert the quantity bounds of search filters sent by the browser to integers"""
     # Convert string numbers to integers where needed
     if 'min_quantity' in filters and filters['min_quantity'] not in [None, '']:
         try:
@@ -178,10 +540,119 @@ def search_components_api():
             filters['max_quantity'] = int(filters['max_quantity'])
         except ValueError:
             filters['max_quantity'] = None
+    return filters
+
+def search_filters_from_args(args):
+    """Search filters given as query parameters (category and package may repeat)"""
+    filters = {
+        'categories': args.getlist('category'),
+        'min_quantity': args.get('min_quantity'),
+        'max_quantity': args.get('max_quantity'),
+        'storage': args.get('storage'),
+        'package': args.getlist('package')
+    }
+    for kind in SPEC_KINDS:
+        for bound in ('min', 'max'):
+            if args.get(f'{bound}_{kind}'):
+                filters[f'{bound}_{kind}'] = args[f'{bound}_{kind}']
+    show_zero_quantity = args.get('show_zero_quantity', '').lower()
+    if show_zero_quantity in ('1', 'true', 'yes'):
+        filters['show_zero_quantity'] = True
+    elif show_zero_quantity in ('0', 'false', 'no'):
+        filters['show_zero_quantity'] = False
+    return normalize_search_filters(filters)
+
+@app.route('/api/components/search', methods=['POST'])
+def search_components_api():
+    """Search for components using query text and filters"""
+    data = request.json or {}
+    
+    query = data.get('query', '')
+    filters = normalize_search_filters(data.get('filters', {}))
+    order = data.get('order')
     
-    results = search_components(query, filters)
+    try:
+        results = search_components(query, filters, order,
+                                    limit=get_page_limit(data.get('limit')),
+                                    cursor=data.get('cursor'),
+                                    fields=data.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(results)
 
+@app.route('/api/components/export', methods=['GET', 'POST'])
+def export_components_api():
+    """Download the inventory, or the components matching a search, as CSV or JSON lines.
+
+    GET takes format=csv|jsonl, q, fields and the search filters as query
+    parameters (category and package may repeat); POST takes the body of
+    /api/components/search plus 'format'. The file is streamed from a
+    database cursor, so it starts downloading at once and the server's
+    memory use does not grow with the inventory.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        fmt = data.get('format', 'csv')
+        query = data.get('query')
+        filters = normalize_search_filters(data.get('filters') or {})
+        order = data.get('order')
+        fields = data.get('fields')
+    else:
+        fmt = request.args.get('format', 'csv')
+        query = request.args.get('q')
+        filters = search_filters_from_args(request.args)
+        order = request.args.get('order')
+        fields = request.args.get('fields')
+
+    try:
+        chunks = export_components(fmt, query, filters, order, fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        # Runs after the request's connection was released; reads with its own
+        try:
+            yield from chunks
+        finally:
+            chunks.close()
+            release_db_connection()
+
+    return Response(generate(), mimetype=MIME_TYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="inventory.{fmt}"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx buffer the download
+    })
+
+@app.route('/api/components/import', methods=['POST'])
+def import_components_api():
+    """Bulk import components from a CSV or JSON-lines upload.
+
+    Send the file as multipart field 'file' or as the raw request body.
+    Query parameters: format=csv|jsonl, parse=1 to run free-text rows
+    through the regex parser.
+    """
+    upload = request.files.get('file')
+    if upload:
+        fmt = request.args.get('format') or detect_format(upload.filename)
+        raw_stream = upload.stream
+    else:
+        content_type = request.mimetype or ''
+        default_format = 'jsonl' if 'json' in content_type else 'csv'
+        fmt = request.args.get('format') or default_format
+        raw_stream = request.stream
+
+    use_parser = request.args.get('parse', '').lower() in ('1', 'true', 'yes')
+    stream = io.TextIOWrapper(raw_stream, encoding='utf-8-sig', newline='')
+
+    try:
+        report = import_components(stream, fmt, use_parser)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    print(f"Imported {report['imported']} components ({report['failed']} failed) "
+          f"at {report['rows_per_second']} rows/s")
+    return jsonify(report)
+
 @app.route('/api/components/<int:component_id>', methods=['PUT'])
 def update_component_api(component_id):
     """Update a component's details"""
@@ -221,8 +692,66 @@ def mark_not_similar(component_id, similar_id):
     else:
         return jsonify({'error': 'Failed to mark components as not similar'}), 400
 
+def process_image_job(job, report_progress):
+    """Background job: extract components from an uploaded image and add them"""
+    payload = job['payload']
+    image_path = payload['path']
+    try:
+        if 'content_hash' not in payload:
+            # Queued before uploads were hashed at upload time
+            payload = dict(payload, **images.inspect(image_path))
+        # The same file again reuses its extraction without decoding it
+        key = images.cache_key(payload['content_hash'], IMAGE_MODEL, IMAGE_PROMPT_VERSION)
+        extracted_components = llm_cache.get(key)
+        if extracted_components is None:
+            report_progress(5, 'Preparing image...')
+            prepared = images.prepare(image_path, payload['mime_type'])
+            # So can a resized or recompressed copy (opt-in, IMAGE_HASH_DISTANCE)
+            extracted_components = images.find_similar_extraction(prepared, IMAGE_MODEL, IMAGE_PROMPT_VERSION)
+            if extracted_components is None:
+                report_progress(10, 'Processing with Vision LLM...')
+                base64_image = base64.b64encode(prepared['data']).decode('utf-8')
+                extracted_components = process_image_with_llm(base64_image, prepared['mime_type'])
+            if extracted_components:
+                images.remember_extraction(key, prepared, extracted_components,
+                                           IMAGE_MODEL, IMAGE_PROMPT_VERSION)
+
+        if not extracted_components:
+            raise ValueError('Could not extract any components from the image.')
+
+        report_progress(80, 'Adding components to database...')
+        components = []
+        errors = []
+        for component_data in extracted_components:
+            if not isinstance(component_data, dict):
+                errors.append(f"Skipped unrecognized entry: {component_data!r}")
+                continue
+            # Ensure basic structure; LLM might miss fields
+            component_data.setdefault('name', 'Unknown Component')
+            component_data.setdefault('category', 'Uncategorized')
+            component_data.setdefault('specifications', '')
+            component_data.setdefault('source', '')
+            component_data.setdefault('quantity', 1)
+            components.append(component_data)
+
+        # All extracted components go in with a single transaction, which
+        # also checks that the job was not requeued in the meantime
+        added_count = jobs.write_if_leased(job, add_components_bulk, components)
+
+        return {
+            'message': f'Processed image. Added {added_count} component(s).',
+            'added_count': added_count,
+            'errors': errors
+        }
+    finally:
+        if os.path.exists(image_path):
+            os.remove(image_path)
+
+jobs.register_handler('image_upload', process_image_job)
+
 @app.route('/api/upload_image', methods=['POST'])
 def upload_image_api():
+    """Queue an image for component extraction; poll /api/jobs/<job_id> for the result"""
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
 
@@ -233,45 +762,100 @@ def upload_image_api():
 
     if file:
         try:
-            # Read image bytes
-            image_bytes = file.read()
-            # Encode image to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-
-            # Process image using LLM (implement this function in llm_parser.py)
-            extracted_components = process_image_with_llm(base64_image)
-
-            added_count = 0
-            errors = []
-
-            if not extracted_components:
-                 return jsonify({'error': 'Could not extract any components from the image.'}), 400
-
-            # Add extracted components to the database
-            for component_data in extracted_components:
-                try:
-                    # Ensure basic structure; LLM might miss fields
-                    component_data.setdefault('name', 'Unknown Component')
-                    component_data.setdefault('category', 'Uncategorized')
-                    component_data.setdefault('specifications', '')
-                    component_data.setdefault('source', '')
-                    component_data.setdefault('quantity', 1)
-                    add_component(component_data)
-                    added_count += 1
-                except Exception as e:
-                    errors.append(f"Error adding '{component_data.get('name', 'Unknown')}': {str(e)}")
+            # Spool the upload to disk for the worker, hashing it and
+            # detecting its real format on the way
+            job_id = uuid.uuid4().hex
+            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            image_path = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], job_id))
+            upload = images.spool(file.stream, image_path)
+            if upload['mime_type'] is None:
+                os.remove(image_path)
+                return jsonify({'error': 'Unsupported image format. Use JPEG, PNG, GIF, WebP or HEIC.'}), 400
+
+            try:
+                jobs.submit_job('image_upload', {
+                    'path': image_path,
+                    'filename': file.filename,
+                    'mime_type': upload['mime_type'],
+                    'content_hash': upload['content_hash']
+                }, job_id=job_id)
+            except jobs.QueueFullError:
+                os.remove(image_path)
+                return jsonify({'error': 'Too many images are being processed. Try again shortly.'}), 503
 
             return jsonify({
-                'message': f'Processed image. Added {added_count} component(s).',
-                'added_count': added_count,
-                'errors': errors
-            })
+                'message': 'Image queued for processing.',
+                'job_id': job_id,
+                'status_url': f'/api/jobs/{job_id}'
+            }), 202
 
         except Exception as e:
-            print(f"Error processing image: {str(e)}")
+            print(f"Error queueing image: {str(e)}")
             return jsonify({'error': f'Failed to process image: {str(e)}'}), 500
 
     return jsonify({'error': 'Invalid file'}), 400
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status and progress of a background job"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # The payload holds server-side paths; clients only need the outcome
+    job.pop('payload', None)
+    return jsonify(job)
+
+def process_spec_backfill_job(job, report_progress):
+    """Background job: extract spec values of components the extractor has not seen"""
+    return {'processed': backfill_component_specs(report_progress)}
+
+def process_similarity_backfill_job(job, report_progress):
+    """Background job: add components to the near-duplicate index"""
+    return {'processed': backfill_similarity_index(report_progress)}
+
+jobs.register_handler('spec_backfill', process_spec_backfill_job)
+jobs.register_handler('similarity_backfill', process_similarity_backfill_job)
+
+# Backfill job kind -> function counting the components it still has to process
+BACKFILLS = {
+    'spec_backfill': count_stale_specs,
+    'similarity_backfill': count_stale_similarity,
+}
+
+def queue_backfill(kind):
+    """Queue a backfill unless one is pending or nothing is stale; returns the job id"""
+    if jobs.has_pending_job(kind) or not BACKFILLS[kind]():
+        return None
+    return jobs.submit_job(kind, {})
+
+def backfill_response(kind):
+    try:
+        job_id = queue_backfill(kind)
+    except jobs.QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    if job_id is None:
+        return jsonify({'message': 'Nothing to backfill or a backfill is already queued.'})
+    return jsonify({'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}), 202
+
+@app.route('/api/specs/backfill', methods=['POST'])
+def spec_backfill_api():
+    """Re-extract spec values for components added before extraction existed"""
+    return backfill_response('spec_backfill')
+
+@app.route('/api/similarity/backfill', methods=['POST'])
+def similarity_backfill_api():
+    """Index components added before the near-duplicate index existed"""
+    return backfill_response('similarity_backfill')
+
+# Components from before spec extraction or the near-duplicate index (or an
+# older version of either) are processed in the background once the workers
+# start
+for kind in BACKFILLS:
+    try:
+        queue_backfill(kind)
+    except jobs.QueueFullError as e:
+        print(f"Backfill {kind} not queued: {e}")
+release_db_connection()
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
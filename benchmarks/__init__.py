@@ -0,0 +1,4 @@
+"""Performance benchmarks for the inventory database and parser.
+
+Run with `python -m benchmarks.run`; see benchmarks/run.py for options.
+"""
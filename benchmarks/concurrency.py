@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import database
+import metrics
+from benchmarks.generator import generate_component
+from benchmarks.run import build_inventory, _percentile, _git_commit
+
+DEFAULT_PROCESSES = [1, 4]
+DEFAULT_THREADS = 8
+DEFAULT_DURATION = 5.0
+DEFAULT_SIZE = 10000
+
+# Write mix: half adds, the rest quantity and storage changes on existing rows
+ADD_SHARE = 0.5
+QUANTITY_SHARE = 0.4
+
+def _write_loop(rng: random.Random, ids: List[int], deadline: float, latencies: List[float], errors: Dict[str, int]):
+    while time.perf_counter() < deadline:
+        choice = rng.random()
+        started = time.perf_counter()
+        try:
+            if choice < ADD_SHARE:
+                database.add_component(generate_component(rng))
+            elif choice < ADD_SHARE + QUANTITY_SHARE:
+                database.update_component_quantity(rng.choice(ids), rng.randint(0, 100))
+            else:
+                database.update_component_storage(rng.choice(ids), f'Bin {rng.randint(1, 50)}')
+        except Exception as e:
+            errors[str(e)] = errors.get(str(e), 0) + 1
+            continue
+        finally:
+            # Like a request: the connection goes back to the pool between writes
+            database.release_db_connection()
+        latencies.append(time.perf_counter() - started)
+
+def _run_process(path: str, write_queue: bool, threads: int, duration: float, seed: int, results):
+    """One server process: `threads` request threads writing for `duration` seconds"""
+    # Lock waits are what is measured here; don't print them as slow queries
+    metrics.SLOW_QUERY_MS = 0
+    database.use_database(path)
+    database.use_write_queue(write_queue)
+    conn = database.get_db_connection()
+    ids = [row[0] for row in conn.execute('SELECT id FROM components')]
+    database.release_db_connection()
+
+    latencies = []
+    errors = {}
+    deadline = time.perf_counter() + duration
+    workers = [threading.Thread(target=_write_loop,
+                                args=(random.Random(seed * 1000 + index), ids, deadline, latencies, errors))
+               for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put({'latencies': latencies, 'errors': errors, 'write_queue': database.get_write_queue_stats()})
+
+def run_scenario(path: str, processes: int, threads: int, write_queue: bool, duration: float,
+                 seed: int) -> Dict[str, Any]:
+    """Write throughput and latency of `processes` x `threads` concurrent writers"""
+    # Fresh processes, so no SQLite connection crosses a fork
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_run_process, args=(path, write_queue, threads, duration, seed + index, results))
+               for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+    errors = {}
+    for report in reports:
+        for error, count in report['errors'].items():
+            errors[error] = errors.get(error, 0) + count
+    commits = sum(report['write_queue']['commits'] for report in reports)
+    return {
+        'writes': len(latencies),
+        'writes_per_sec': round(len(latencies) / duration, 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'errors': errors,
+        # Writes per commit on the writer threads (group commit)
+        'writes_per_commit': round(len(latencies) / commits, 2) if write_queue and commits else None
+    }
+
+def run(process_counts: List[int], threads: int = DEFAULT_THREADS, duration: float = DEFAULT_DURATION,
+        size: int = DEFAULT_SIZE, seed: int = 0, workdir: str = None) -> Dict[str, Any]:
+    """Run every process count with the write queue off and on; returns the report"""
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': seed,
+            'size': size,
+            'threads_per_process': threads,
+            'duration_seconds': duration
+        },
+        'scenarios': {}
+    }
+
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        template = os.path.join(directory, 'template.db')
+        print(f"Building inventory of {size} components...", file=sys.stderr)
+        # Migration messages would end up in the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            build_inventory(template, size, seed)
+        database.close_all_connections()
+
+        for processes in process_counts:
+            for write_queue in (False, True):
+                name = f"{processes}x{threads} write_queue={'on' if write_queue else 'off'}"
+                # Every scenario starts from the same inventory
+                path = os.path.join(directory, 'inventory.db')
+                with sqlite3.connect(template) as source, sqlite3.connect(path) as target:
+                    source.backup(target)
+                print(f"Running {name}...", file=sys.stderr)
+                report['scenarios'][name] = run_scenario(path, processes, threads, write_queue, duration, seed)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+
+    return report
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Benchmark concurrent writes with the write queue (INVENTORY_DB_WRITE_QUEUE) off and on')
+    arg_parser.add_argument('--processes', type=int, nargs='+', default=DEFAULT_PROCESSES,
+                            help='Numbers of server processes to simulate')
+    arg_parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='Writer threads per process')
+    arg_parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Seconds per scenario')
+    arg_parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help='Components in the starting inventory')
+    arg_parser.add_argument('--seed', type=int, default=0, help='Seed for the generated inventory and writes')
+    arg_parser.add_argument('--workdir', help='Directory for the temporary databases')
+    arg_parser.add_argument('--output', help='Write the JSON report here instead of standard output')
+    args = arg_parser.parse_args()
+
+    report = run(args.processes, args.threads, args.duration, args.size, args.seed, args.workdir)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
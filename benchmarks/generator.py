@@ -0,0 +1,97 @@
+import random
+from collections import deque
+from typing import Any, Dict, Iterator, List
+
+from parser import CATEGORY_KEYWORDS
+from test_inputs import test_inputs
+
+# Share of generated components that reuse an earlier name, so duplicate
+# groups and find_similar_components have realistic work to do
+DUPLICATE_RATE = 0.05
+# Recent names kept around for reuse as duplicates
+_RECENT_NAMES = 1000
+
+PART_PREFIXES = ['LM', 'NE', 'BC', '2N', '1N', 'IRF', 'MCP', 'ATMEGA', 'STM32F', 'CD', 'TL', 'AMS', 'ESP', 'HC-SR']
+PACKAGES = ['0402', '0603', '0805', '1206', 'SOT-23', 'SOIC-8', 'SOIC-28', 'TQFP-32', 'DIP-16', 'TO-220', 'DO-35', 'MSOP8']
+VALUES = ['10k ohm', '4.7k ohm', '100 ohm', '100 nF', '10 µF', '22 pF', '10 µH', '3.3V', '5V', '12V', '50V', '200mA', '1.5A']
+SOURCES = ['', '', 'mouser.com:{part}', 'digikey.com:{part}', 'tme.eu:{part}', 'aliexpress:{part}']
+STORAGE = ['Drawer {letter}{number}', 'Box {number}', 'Shelf {letter}', '']
+
+def _vocabulary():
+    """Names and spec fragments taken from the sample inputs in test_inputs.py"""
+    names = []
+    specs = []
+    for line in test_inputs:
+        parts = [part.strip() for part in line.split(',') if part.strip()]
+        names.append(parts[0])
+        specs.extend(parts[1:])
+    return names, specs
+
+SAMPLE_NAMES, SPEC_FRAGMENTS = _vocabulary()
+# Category names as the regex parser stores them, with their keywords
+CATEGORIES = {category.capitalize(): keywords for category, keywords in CATEGORY_KEYWORDS.items()}
+CATEGORIES['Uncategorized'] = ['']
+
+def _part_number(rng):
+    return f"{rng.choice(PART_PREFIXES)}{rng.randint(1, 9999)}"
+
+def generate_component(rng: random.Random) -> Dict[str, Any]:
+    """One random component dict, as accepted by add_component"""
+    category = rng.choice(list(CATEGORIES))
+    keywords = CATEGORIES[category]
+    part = _part_number(rng)
+    if rng.random() < 0.2:
+        name = rng.choice(SAMPLE_NAMES)
+    else:
+        name = f"{part} {rng.choice(keywords)}".strip()
+
+    specs = [rng.choice(PACKAGES), rng.choice(VALUES)]
+    specs += rng.sample(SPEC_FRAGMENTS, rng.randint(0, 2))
+
+    return {
+        'name': name,
+        'category': category,
+        'specifications': ', '.join(specs),
+        'source': rng.choice(SOURCES).format(part=part),
+        'quantity': rng.randint(0, 500),
+        'storage': rng.choice(STORAGE).format(letter=rng.choice('ABCDEF'), number=rng.randint(1, 40))
+    }
+
+def generate_components(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield count components; the same seed always gives the same inventory"""
+    rng = random.Random(seed)
+    recent = deque(maxlen=_RECENT_NAMES)
+    for _ in range(count):
+        component = generate_component(rng)
+        if recent and rng.random() < DUPLICATE_RATE:
+            component['name'], component['category'] = rng.choice(recent)
+        recent.append((component['name'], component['category']))
+        yield component
+
+def generate_description(rng: random.Random) -> str:
+    """A free-text description in the style of test_inputs.py"""
+    component = generate_component(rng)
+    parts = [component['name'], component['specifications']]
+    if component['source']:
+        parts.append(component['source'])
+    quantity = rng.choice(['{n} pcs', '{n} pieces', 'qty: {n}', 'quantity: {n}', ''])
+    if quantity:
+        parts.append(quantity.format(n=component['quantity']))
+    return ', '.join(parts)
+
+def generate_descriptions(count: int, seed: int = 0) -> List[str]:
+    """Free-text inputs for the parser benchmark; the sample inputs come first"""
+    rng = random.Random(seed)
+    descriptions = list(test_inputs[:count])
+    while len(descriptions) < count:
+        descriptions.append(generate_description(rng))
+    return descriptions
+
+def search_terms(rng: random.Random) -> str:
+    """A search query a user might type: a keyword, part prefix or value"""
+    choice = rng.random()
+    if choice < 0.4:
+        return rng.choice(rng.choice(list(CATEGORY_KEYWORDS.values())))
+    if choice < 0.7:
+        return rng.choice(PART_PREFIXES).lower()
+    return rng.choice(PACKAGES + VALUES)
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+import database
+from parser import parse_component
+from benchmarks.generator import generate_components, generate_component, generate_descriptions, search_terms
+
+# 1,000,000 is left out: building it through add_components_bulk takes hours (see README)
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Each operation runs until this much time has passed (or MAX_ITERATIONS)
+DEFAULT_TIME_BUDGET = 2.0
+MIN_ITERATIONS = 3
+MAX_ITERATIONS = 2000
+# Components per insert transaction while building an inventory
+BUILD_CHUNK_SIZE = 5000
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+def measure(operation: Callable, arguments: Iterator[tuple], time_budget: float = DEFAULT_TIME_BUDGET) -> Dict[str, Any]:
+    """
+    Time operation(*args) for successive args until the time budget is spent
+
+    Peak memory is measured on one extra call with tracemalloc on, made
+    first so the tracing overhead does not skew the latencies.
+
+    Returns:
+        iterations, ops_per_sec, p50/p99/mean latency in ms and peak_memory_kb
+    """
+    tracemalloc.start()
+    try:
+        operation(*next(arguments))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies = []
+    started = time.perf_counter()
+    # Stops early if the arguments run out (e.g. no ids left to merge)
+    for args in arguments:
+        call_started = time.perf_counter()
+        operation(*args)
+        latencies.append(time.perf_counter() - call_started)
+        if len(latencies) >= MAX_ITERATIONS:
+            break
+        if len(latencies) >= MIN_ITERATIONS and time.perf_counter() - started >= time_budget:
+            break
+
+    if not latencies:
+        raise ValueError('No arguments left to time the operation with')
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'ops_per_sec': round(len(latencies) / total, 2) if total else None,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(total / len(latencies) * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+def build_inventory(path: str, size: int, seed: int = 0) -> float:
+    """Create a fresh database at path holding size generated components"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    database.use_database(path)
+    database.init_db()
+
+    started = time.perf_counter()
+    chunk = []
+    for component in generate_components(size, seed):
+        chunk.append(component)
+        if len(chunk) >= BUILD_CHUNK_SIZE:
+            database.add_components_bulk(chunk)
+            chunk = []
+    if chunk:
+        database.add_components_bulk(chunk)
+    return time.perf_counter() - started
+
+def _component_ids() -> List[int]:
+    conn = database.get_db_connection()
+    return [row[0] for row in conn.execute('SELECT id FROM components')]
+
+def run_database_benchmarks(seed: int, time_budget: float) -> Dict[str, Any]:
+    """Benchmark the database functions against the current inventory"""
+    rng = random.Random(seed)
+    ids = _component_ids()
+    results = {}
+
+    def search_args():
+        while True:
+            yield (search_terms(rng),)
+
+    def id_args():
+        while True:
+            yield (rng.choice(ids),)
+
+    def no_args():
+        while True:
+            yield ()
+
+    # Read-only operations first, so they all see the generated inventory
+    results['search_components'] = measure(database.search_components, search_args(), time_budget)
+    results['search_components_page'] = measure(
+        lambda query: database.search_components(query, limit=50), search_args(), time_budget)
+    results['get_all_components_with_similarity_info'] = measure(
+        database.get_all_components_with_similarity_info, no_args(), time_budget)
+    results['get_all_components_with_similarity_info_page'] = measure(
+        lambda: database.get_all_components_with_similarity_info(limit=50), no_args(), time_budget)
+    results['find_similar_components'] = measure(database.find_similar_components, id_args(), time_budget)
+
+    def component_args():
+        while True:
+            yield (generate_component(rng),)
+
+    results['add_component'] = measure(database.add_component, component_args(), time_budget)
+
+    # Every merge deletes its source, so each pair uses two unused ids
+    rng.shuffle(ids)
+    def merge_args():
+        while len(ids) >= 2:
+            yield (ids.pop(), ids.pop())
+
+    results['merge_components'] = measure(database.merge_components, merge_args(), time_budget)
+    return results
+
+def run_parser_benchmark(seed: int, time_budget: float) -> Dict[str, Any]:
+    descriptions = generate_descriptions(1000, seed)
+
+    def description_args():
+        while True:
+            for description in descriptions:
+                yield (description,)
+
+    return measure(lambda text: parse_component(text, use_llm=False), description_args(), time_budget)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(sizes: List[int], seed: int = 0, time_budget: float = DEFAULT_TIME_BUDGET,
+        workdir: str = None) -> Dict[str, Any]:
+    """Run every benchmark and return the report"""
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': seed,
+            'time_budget_seconds': time_budget
+        },
+        'parse_component': run_parser_benchmark(seed, time_budget),
+        'sizes': {}
+    }
+
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for size in sizes:
+            path = os.path.join(directory, f'inventory-{size}.db')
+            print(f"Building inventory of {size} components...", file=sys.stderr)
+            build_seconds = build_inventory(path, size, seed)
+            print(f"Running benchmarks on {size} components...", file=sys.stderr)
+            results = run_database_benchmarks(seed, time_budget)
+            results['build'] = {
+                'seconds': round(build_seconds, 3),
+                'rows_per_second': round(size / build_seconds, 1) if build_seconds else None
+            }
+            report['sizes'][str(size)] = results
+            database.close_all_connections()
+
+    return report
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Lines describing the ops/sec change of every operation present in both reports"""
+    def flatten(report):
+        rows = {'parse_component': report.get('parse_component', {})}
+        for size, results in report.get('sizes', {}).items():
+            for name, result in results.items():
+                rows[f'{name} @ {size}'] = result
+        return rows
+
+    old, new = flatten(baseline), flatten(current)
+    lines = []
+    for name in new:
+        before = old.get(name, {}).get('ops_per_sec')
+        after = new[name].get('ops_per_sec')
+        if before and after:
+            lines.append(f"{name}: {before} -> {after} ops/sec ({(after / before - 1) * 100:+.1f}%)")
+    return lines
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the inventory database and parser')
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                            help='Inventory sizes to benchmark (e.g. 1000 10000 100000 1000000)')
+    arg_parser.add_argument('--seed', type=int, default=0, help='Seed for the generated inventory')
+    arg_parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET,
+                            help='Seconds spent timing each operation')
+    arg_parser.add_argument('--workdir', help='Directory for the temporary databases')
+    arg_parser.add_argument('--output', help='Write the JSON report here instead of standard output')
+    arg_parser.add_argument('--compare', metavar='BASELINE',
+                            help='Print the ops/sec change against an earlier JSON report')
+    args = arg_parser.parse_args()
+
+    report = run(args.sizes, args.seed, args.time_budget, args.workdir)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare(baseline, report):
+            print(line, file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
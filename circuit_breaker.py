@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+# Consecutive failures that open a breaker, and how long it stays open before
+# one probe call is let through (half-open)
+FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose breaker is open"""
+    def __init__(self, name, retry_at):
+        super().__init__(f"{name} is unavailable (circuit open, retrying in {max(0, retry_at - time.time()):.0f}s)")
+        self.name = name
+        self.retry_at = retry_at
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after FAILURE_THRESHOLD consecutive failures
+
+    Closed: calls go through. Open: calls fail at once with CircuitOpenError
+    until RESET_SECONDS have passed. Half-open: a single probe call goes
+    through; its success closes the breaker, its failure opens it again.
+
+    before_call returns the breaker's generation, which the caller passes back
+    with the outcome. Opening the breaker, starting a probe and resetting it
+    start a new generation, so a slow call that was let through earlier
+    cannot close an open breaker or end the probe of another call.
+    """
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or RESET_SECONDS
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._generation = 0
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def before_call(self) -> int:
+        """
+        Reserve a call, or raise CircuitOpenError when the backend should not be called
+
+        Returns:
+            Generation to pass to record_success or record_failure
+        """
+        with self._lock:
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probing):
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(self.name, self._opened_at + self.reset_seconds)
+            if self._state == HALF_OPEN:
+                self._probing = True
+                self._generation += 1
+            self._stats['calls'] += 1
+            return self._generation
+
+    def record_success(self, generation: int):
+        with self._lock:
+            # Calls let through before the breaker opened say nothing about now
+            if generation != self._generation:
+                return
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self, generation: int):
+        with self._lock:
+            self._stats['failures'] += 1
+            if generation != self._generation:
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._stats['opened'] += 1
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._generation += 1
+            self._probing = False
+
+    def reset(self):
+        """Close the breaker by hand"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+            self._generation += 1
+
+    def get_state(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state
+            if state == OPEN and time.time() - self._opened_at >= self.reset_seconds:
+                state = HALF_OPEN
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_at': self._opened_at + self.reset_seconds if state == OPEN else None,
+                **self._stats
+            }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The breaker of a backend, created on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+def get_states() -> List[Dict[str, Any]]:
+    """State and counters of every breaker, by name"""
+    with _breakers_lock:
+        breakers = sorted(_breakers.values(), key=lambda breaker: breaker.name)
+    return [breaker.get_state() for breaker in breakers]
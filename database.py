@@ -1,277 +1,1233 @@
 import sqlite3
+import functools
+import itertools
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import json
+import re
+import base64
 
-def get_db_connection():
-    conn = sqlite3.connect('inventory.db')
+import metrics
+import similarity
+from specs import SPEC_EXTRACTOR_VERSION, SPEC_KINDS, extract_specs, parse_value, canonical_package
+
+DATABASE = os.environ.get('INVENTORY_DB', 'inventory.db')
+
+# Connection tuning, applied once when a connection is opened
+BUSY_TIMEOUT_MS = int(os.environ.get('INVENTORY_DB_BUSY_TIMEOUT_MS', 5000))
+MMAP_SIZE = int(os.environ.get('INVENTORY_DB_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get('INVENTORY_DB_CACHE_SIZE_KB', 20000))
+POOL_SIZE = int(os.environ.get('INVENTORY_DB_POOL_SIZE', 8))
+
+# Optional write serialization (see serialized_write): the write functions
+# hand their work to one writer thread per process, which runs whatever has
+# queued up in a single transaction
+WRITE_QUEUE_ENABLED = os.environ.get('INVENTORY_DB_WRITE_QUEUE', '0') == '1'
+# Most queued writes committed together
+GROUP_COMMIT_MAX = int(os.environ.get('INVENTORY_DB_GROUP_COMMIT_MAX', 64))
+
+# Idle connections waiting to be picked up by the next request/thread
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+# The connection currently checked out by this thread and its transaction depth
+_local = threading.local()
+
+_stats_lock = threading.Lock()
+_connection_stats = {'opened': 0, 'reused': 0, 'closed': 0}
+
+def _count(stat):
+    with _stats_lock:
+        _connection_stats[stat] += 1
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that records every statement and commit in metrics.py.
+
+    For SELECTs the time covers executing up to the first row; rows fetched
+    later are not included. Waiting for a lock counts, so contention shows up
+    on BEGIN IMMEDIATE, the writes and COMMIT.
+    """
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def commit(self):
+        if not self.in_transaction:
+            # transaction() commits after read-only blocks too; nothing to time
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            metrics.observe_query('COMMIT', time.perf_counter() - started)
+
+def _open_connection():
+    conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           factory=TimedConnection)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    _count('opened')
     return conn
 
-def init_db():
-    if not os.path.exists('inventory.db'):
-        conn = get_db_connection()
-        with open('schema.sql') as f:
-            conn.executescript(f.read())
-        conn.commit()
+def get_db_connection():
+    """Return the connection checked out by the current thread.
+
+    The first call in a thread takes an idle connection from the pool (or opens
+    a new one); later calls in the same thread get the same connection back, so
+    nested helpers share the caller's transaction. Call release_db_connection()
+    when the request or thread is done with it.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        # Not a checkout, so not counted
+        return conn
+
+    try:
+        conn = _pool.get_nowait()
+        _count('reused')
+    except queue.Empty:
+        conn = _open_connection()
+
+    _local.conn = conn
+    _local.depth = 0
+    return conn
+
+def release_db_connection():
+    """Hand the current thread's connection back to the pool"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+
+    _local.conn = None
+    _local.depth = 0
+    _local.changed = False
+
+    # Never hand out a connection with a half-finished transaction
+    if conn.in_transaction:
+        conn.rollback()
+    _publish_categories(committed=False)
+
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
         conn.close()
+        _count('closed')
 
-def get_or_create_category(category_name):
+def close_all_connections():
+    """Close the pooled connections and the current thread's connection"""
+    release_db_connection()
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        conn.close()
+        _count('closed')
+
+def use_database(path):
+    """Point the module at another database file.
+
+    Closes the pooled connections so later calls open the new file; used by
+    the benchmarks and maintenance scripts. Connections still checked out by
+    other threads keep using the old file.
+    """
+    global DATABASE, _schema_checked, _search_index_enabled, _categories_loaded
+    close_all_connections()
+    DATABASE = path
+    _schema_checked = False
+    _search_index_enabled = False
+    with _categories_lock:
+        _categories.clear()
+        _categories_loaded = False
+
+@contextmanager
+def transaction():
+    """Run a block inside the current thread's transaction.
+
+    Blocks can be nested; the work is committed when the outermost block exits
+    and rolled back if it raises.
+    """
     conn = get_db_connection()
-    category = conn.execute('SELECT id FROM categories WHERE name = ?', 
-                           (category_name,)).fetchone()
-    
-    if category is None:
-        cursor = conn.execute('INSERT INTO categories (name) VALUES (?)', 
-                             (category_name,))
-        category_id = cursor.lastrowid
+    _local.depth += 1
+    try:
+        yield conn
+    except Exception:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+            _local.changed = False
+            _publish_categories(committed=False)
+        elif _local.depth == getattr(_local, 'write_depth', None):
+            # The outermost block of a queued write: undo just that write
+            _rollback_queued_write(conn)
+        raise
     else:
-        category_id = category['id']
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.commit()
+            _publish_categories(committed=True)
+            if getattr(_local, 'changed', False):
+                _local.changed = False
+                _notify_changes()
+
+class _QueuedWrite:
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+_write_queue = queue.Queue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+_write_stats = {'writes': 0, 'commits': 0}
+
+def use_write_queue(enabled):
+    """Turn write serialization on or off for this process (benchmarks, tests)"""
+    global WRITE_QUEUE_ENABLED
+    WRITE_QUEUE_ENABLED = enabled
+
+def get_write_queue_stats():
+    """Writes run by the writer thread and the commits they took"""
+    with _writer_lock:
+        stats = dict(_write_stats)
+    stats['queued'] = _write_queue.qsize()
+    return stats
+
+def serialized_write(function):
+    """Run a write function on the writer thread while the write queue is on.
+
+    The caller waits until the write has committed and gets its result or
+    exception. Calls made inside an open transaction (or by the writer itself)
+    run directly, so they stay part of that transaction.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not WRITE_QUEUE_ENABLED or getattr(_local, 'writer', False) or getattr(_local, 'depth', 0):
+            return function(*args, **kwargs)
+        
+        _start_writer()
+        write = _QueuedWrite(function, args, kwargs)
+        _write_queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+    return wrapper
+
+def _start_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name='db-writer', daemon=True)
+            _writer_thread.start()
+
+def _writer_loop():
+    _local.writer = True
+    while True:
+        group = [_write_queue.get()]
+        while len(group) < GROUP_COMMIT_MAX:
+            try:
+                group.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        _commit_group(group)
+        # Idle writers hold no connection
+        release_db_connection()
+
+def _commit_group(group):
+    """Run queued writes in one transaction, each in its own savepoint
+
+    A write that raises is rolled back to its savepoint and gets the error;
+    the others still commit. Results are handed out after the commit.
+    """
+    try:
+        with transaction() as conn:
+            # Take the write lock up front, waiting for other processes
+            conn.execute('BEGIN IMMEDIATE')
+            _local.write_depth = _local.depth
+            for write in group:
+                _local.write_categories = dict(_pending_categories())
+                conn.execute('SAVEPOINT queued_write')
+                try:
+                    write.result = write.function(*write.args, **write.kwargs)
+                except Exception as e:
+                    _rollback_queued_write(conn)
+                    write.error = e
+                conn.execute('RELEASE queued_write')
+    except Exception as e:
+        for write in group:
+            if write.error is None:
+                write.error = e
+    finally:
+        _local.write_depth = None
     
-    conn.commit()
-    conn.close()
-    return category_id
+    with _writer_lock:
+        _write_stats['writes'] += len(group)
+        _write_stats['commits'] += 1
+    for write in group:
+        write.done.set()
 
-def add_component(parsed_data):
-    conn = get_db_connection()
+def _rollback_queued_write(conn):
+    conn.execute('ROLLBACK TO queued_write')
+    # Categories created by the rolled-back write do not exist
+    _local.new_categories = dict(_local.write_categories)
+
+# Category registry: case-folded name -> id, shared by every thread (see
+# get_or_create_category). Categories created in a transaction wait in
+# _local.new_categories until it commits.
+_categories = {}
+_categories_loaded = False
+_categories_lock = threading.Lock()
+
+def get_connection_stats():
+    """Report how many connections were newly opened versus checked out of the pool (reused)"""
+    with _stats_lock:
+        stats = dict(_connection_stats)
+    stats['pooled'] = _pool.qsize()
+    return stats
+
+# change_log entries older than this are removed by prune_change_log(), at
+# startup and then every CHANGE_LOG_PRUNE_EVERY entries this process logs,
+# along with the tombstones of the deletes they recorded
+CHANGE_LOG_RETENTION_SECONDS = int(os.environ.get('CHANGE_LOG_RETENTION_SECONDS', 7 * 24 * 3600))
+CHANGE_LOG_PRUNE_EVERY = int(os.environ.get('CHANGE_LOG_PRUNE_EVERY', 1000))
+_changes_logged = itertools.count(1)
+
+# Bumped after every commit that wrote to change_log, so change streams in
+# this process wake up at once instead of at their next poll
+_change_condition = threading.Condition()
+_change_counter = 0
+
+def _notify_changes():
+    global _change_counter
+    with _change_condition:
+        _change_counter += 1
+        _change_condition.notify_all()
+
+def _log_change(conn, kind, component_id=None, **data):
+    """Append a change_log entry in the caller's transaction.
+
+    Must run inside transaction(); streams are woken once it commits.
+    """
+    conn.execute('''
+        INSERT INTO change_log (revision, kind, component_id, data, created_at)
+        VALUES ((SELECT revision FROM inventory_revision WHERE id = 1), ?, ?, ?, ?)
+    ''', (kind, component_id, json.dumps(data) if data else None, time.time()))
+    _local.changed = True
+    # Long-running servers keep the log bounded without a restart
+    if next(_changes_logged) % CHANGE_LOG_PRUNE_EVERY == 0:
+        _delete_old_changes(conn)
+
+def get_change_counter():
+    """Opaque value to pass to wait_for_changes()"""
+    return _change_counter
+
+def wait_for_changes(seen_counter, timeout):
+    """Wait until this process commits a change after seen_counter was read.
+
+    Returns False on timeout. Changes made by other processes are not
+    signalled; callers should poll get_changes_after() on timeout as well.
+    """
+    with _change_condition:
+        return _change_condition.wait_for(lambda: _change_counter != seen_counter, timeout)
+
+def get_latest_change_id():
+    """Id of the newest change_log entry (0 if there is none)"""
+    row = get_db_connection().execute('SELECT MAX(id) FROM change_log').fetchone()
+    return row[0] or 0
+
+def get_changes_after(last_id, limit=100):
+    """change_log entries with an id above last_id, oldest first"""
+    rows = get_db_connection().execute(
+        'SELECT * FROM change_log WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit)
+    ).fetchall()
+    return [{
+        'id': row['id'],
+        'revision': row['revision'],
+        'kind': row['kind'],
+        'component_id': row['component_id'],
+        'data': json.loads(row['data']) if row['data'] else {},
+        'created_at': row['created_at']
+    } for row in rows]
+
+@serialized_write
+def prune_change_log():
+    """Drop change_log entries older than CHANGE_LOG_RETENTION_SECONDS"""
+    with transaction() as conn:
+        return _delete_old_changes(conn)
+
+def _delete_old_changes(conn):
+    cutoff = time.time() - CHANGE_LOG_RETENTION_SECONDS
+    pruned_revision = conn.execute('SELECT MAX(revision) FROM change_log WHERE created_at < ?',
+                                   (cutoff,)).fetchone()[0]
+    if pruned_revision is None:
+        return 0
+    deleted = conn.execute('DELETE FROM change_log WHERE created_at < ?', (cutoff,)).rowcount
+    # An entry is logged after the deletes of its transaction, so tombstones up
+    # to the newest pruned entry are past retention too. Clients that last
+    # synced before that revision get a full resync instead.
+    conn.execute('UPDATE inventory_revision SET sync_floor = MAX(sync_floor, ?) WHERE id = 1',
+                 (pruned_revision,))
+    conn.execute('DELETE FROM component_tombstones WHERE revision <= ?', (pruned_revision,))
+    return deleted
+
+# bm25 column weights: name, specifications, source, category, storage
+SEARCH_RANK = 'bm25(components_fts, 10.0, 4.0, 2.0, 3.0, 1.0)'
+
+# False until init_db() has found the search index, or if SQLite lacks FTS5
+_search_index_enabled = False
+_schema_checked = False
+
+def init_db():
+    """Create or upgrade the database schema (see migrations.py)"""
+    global _schema_checked, _search_index_enabled
+    if _schema_checked:
+        return
+    # Imported here because migrations.py builds on this module
+    from migrations import migrate
+    migrate()
+    _search_index_enabled = get_db_connection().execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='components_fts'"
+    ).fetchone() is not None
+    _schema_checked = True
+
+def rebuild_search_index():
+    """Repopulate the full-text index from the components table"""
+    with transaction() as conn:
+        conn.execute('DELETE FROM components_fts')
+        conn.execute('''
+            INSERT INTO components_fts (rowid, name, specifications, source, category, storage)
+            SELECT c.id, c.name, c.specifications, c.source, cat.name, c.storage
+            FROM components c
+            JOIN categories cat ON c.category_id = cat.id
+        ''')
+
+def normalize_name(name):
+    """Key used to detect duplicate names within a category"""
+    return (name or '').lower().strip()
+
+# Ids per statement when refreshing extracted specs (below SQLite's variable limit)
+SPEC_BATCH_SIZE = 500
+
+def refresh_component_specs(component_ids):
+    """Re-extract the spec values and package of the given components.
+
+    Runs in the caller's transaction; see specs.extract_specs.
+    """
+    component_ids = list(component_ids)
+    with transaction() as conn:
+        for start in range(0, len(component_ids), SPEC_BATCH_SIZE):
+            batch = component_ids[start:start + SPEC_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            rows = conn.execute(f'''
+                SELECT c.id, c.name, c.specifications, cat.name as category
+                FROM components c
+                JOIN categories cat ON c.category_id = cat.id
+                WHERE c.id IN ({placeholders})
+            ''', batch).fetchall()
+            
+            conn.execute(f'DELETE FROM component_values WHERE component_id IN ({placeholders})', batch)
+            conn.execute(f'DELETE FROM component_packages WHERE component_id IN ({placeholders})', batch)
+            
+            values = []
+            packages = []
+            for row in rows:
+                specs = extract_specs(f"{row['name']}, {row['specifications'] or ''}", row['category'])
+                values.extend((row['id'], kind, value) for kind, value in specs['values'])
+                if specs['package']:
+                    packages.append((row['id'], specs['package']))
+            
+            conn.executemany('INSERT INTO component_values (component_id, kind, value) VALUES (?, ?, ?)', values)
+            conn.executemany('INSERT INTO component_packages (component_id, package) VALUES (?, ?)', packages)
+            conn.execute(f'UPDATE components SET specs_version = ? WHERE id IN ({placeholders})',
+                         (SPEC_EXTRACTOR_VERSION, *batch))
+
+def _count_stale(version_column, version):
+    return get_db_connection().execute(
+        f'SELECT COUNT(*) FROM components WHERE {version_column} IS NULL OR {version_column} != ?',
+        (version,)
+    ).fetchone()[0]
+
+def _backfill(version_column, version, refresh, report_progress, batch_size, stage):
+    """
+    Run refresh(ids) over every component whose version_column is stale
+
+    Works through the table in id order with one short transaction per
+    batch, so writers are never blocked for long.
+
+    Returns:
+        Number of components processed
+    """
+    total = _count_stale(version_column, version)
+    processed = 0
+    last_id = 0
+    while True:
+        with transaction() as conn:
+            ids = [row['id'] for row in conn.execute(f'''
+                SELECT id FROM components
+                WHERE id > ? AND ({version_column} IS NULL OR {version_column} != ?)
+                ORDER BY id LIMIT ?
+            ''', (last_id, version, batch_size))]
+            if not ids:
+                break
+            refresh(ids)
+        last_id = ids[-1]
+        processed += len(ids)
+        if report_progress and total:
+            report_progress(min(99, processed * 100 // total), f"{stage} {processed}/{total} components")
+    return processed
+
+def count_stale_specs():
+    """Number of components not yet processed by the current spec extractor"""
+    return _count_stale('specs_version', SPEC_EXTRACTOR_VERSION)
+
+def backfill_component_specs(report_progress=None, batch_size=SPEC_BATCH_SIZE):
+    """Extract specs for every component the current extractor has not seen"""
+    return _backfill('specs_version', SPEC_EXTRACTOR_VERSION, refresh_component_specs,
+                     report_progress, batch_size, 'Extracted specs of')
+
+# Best-matching bucket neighbours scored per component, and the most pairs
+# kept for it
+SIMILARITY_CANDIDATES = 50
+MAX_SIMILAR = 20
+# Only the newest members of each bucket are read, so buckets shared by many
+# look-alike names ("part 1", "part 2", ...) do not make inserts quadratic
+BUCKET_SCAN_LIMIT = 200
+# Most candidate features remembered between the batches of one refresh
+MAX_KNOWN_FEATURES = 20000
+
+def refresh_similarity_index(component_ids):
+    """Re-index the given components for near-duplicate search.
+
+    Replaces their LSH buckets (which are per category) and recomputes their
+    near-duplicate pairs. Runs in the caller's transaction;
+    see similarity.py.
+    """
+    component_ids = list(component_ids)
+    # Features of the components seen so far, by id: the batches of a bulk
+    # insert are mostly each other's candidates
+    known_features = {}
+    with transaction() as conn:
+        for start in range(0, len(component_ids), SPEC_BATCH_SIZE):
+            batch = component_ids[start:start + SPEC_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            rows = conn.execute(f'''
+                SELECT id, category_id, name, specifications FROM components WHERE id IN ({placeholders})
+            ''', batch).fetchall()
+            
+            conn.execute(f'DELETE FROM similarity_buckets WHERE component_id IN ({placeholders})', batch)
+            conn.execute(f'''
+                DELETE FROM similar_components
+                WHERE component_id IN ({placeholders}) OR similar_id IN ({placeholders})
+            ''', batch + batch)
+            
+            if len(known_features) > MAX_KNOWN_FEATURES:
+                known_features.clear()
+            if len(rows) == 1:
+                _index_similarity_row(conn, rows[0])
+            elif rows:
+                _index_similarity_rows(conn, rows, placeholders, batch, known_features)
+            
+            conn.execute(f'UPDATE components SET similarity_version = ? WHERE id IN ({placeholders})',
+                         (similarity.SIMILARITY_INDEX_VERSION, *batch))
+
+def _index_similarity_row(conn, row):
+    """Bucket one component and pair it with its best-scoring bucket neighbours"""
+    features = similarity.shingles(row['name'], row['specifications'])
+    keys = similarity.buckets(features, row['category_id'])
+    if not keys:
+        return
+    conn.executemany('INSERT OR IGNORE INTO similarity_buckets (bucket, component_id) VALUES (?, ?)',
+                     [(key, row['id']) for key in keys])
     
-    category_id = get_or_create_category(parsed_data['category'])
+    bucket_scans = ' UNION ALL '.join(
+        'SELECT * FROM (SELECT component_id FROM similarity_buckets '
+        'WHERE bucket = ? AND component_id != ? ORDER BY component_id DESC LIMIT ?)'
+        for _ in keys)
+    scan_params = [value for key in keys for value in (key, row['id'], BUCKET_SCAN_LIMIT)]
+    candidates = conn.execute(f'''
+        SELECT c.id, c.name, c.specifications
+        FROM (
+            SELECT component_id, COUNT(*) as shared
+            FROM ({bucket_scans})
+            GROUP BY component_id
+            ORDER BY shared DESC
+            LIMIT ?
+        ) b
+        JOIN components c ON c.id = b.component_id
+    ''', (*scan_params, SIMILARITY_CANDIDATES)).fetchall()
+    conn.executemany(
+        'INSERT OR REPLACE INTO similar_components (component_id, similar_id, score) VALUES (?, ?, ?)',
+        _similar_pairs(row['id'], features, [
+            (candidate['id'], similarity.shingles(candidate['name'], candidate['specifications']))
+            for candidate in candidates]))
+
+def _index_similarity_rows(conn, rows, placeholders, ids, known_features):
+    """Same as _index_similarity_row for a batch of components, with set-wise queries.
+
+    All buckets go in first, so components of the batch find each other too.
+    Candidates come from one grouped query; each bucket is still only read
+    from its BUCKET_SCAN_LIMIT newest members.
+    """
+    bucket_rows = []
+    for row in rows:
+        features = known_features[row['id']] = similarity.shingles(row['name'], row['specifications'])
+        bucket_rows.extend((key, row['id']) for key in similarity.buckets(features, row['category_id']))
+    conn.executemany('INSERT OR IGNORE INTO similarity_buckets (bucket, component_id) VALUES (?, ?)', bucket_rows)
     
-    # Ensure specifications is a string
-    specifications = parsed_data['specifications']
-    if isinstance(specifications, dict):
-        specifications = json.dumps(specifications)
+    best = {}
+    for component_id, candidate_id in conn.execute(f'''
+        SELECT component_id, candidate_id
+        FROM (
+            SELECT component_id, candidate_id,
+                   ROW_NUMBER() OVER (PARTITION BY component_id ORDER BY shared DESC) as rank
+            FROM (
+                SELECT k.component_id, m.component_id as candidate_id, COUNT(*) as shared
+                FROM similarity_buckets k
+                JOIN similarity_buckets m ON m.bucket = k.bucket
+                WHERE k.component_id IN ({placeholders})
+                  AND m.component_id != k.component_id
+                  AND m.component_id > COALESCE((
+                      SELECT component_id FROM similarity_buckets WHERE bucket = k.bucket
+                      ORDER BY component_id DESC LIMIT 1 OFFSET ?
+                  ), 0)
+                GROUP BY k.component_id, m.component_id
+            )
+        )
+        WHERE rank <= ?
+    ''', (*ids, BUCKET_SCAN_LIMIT, SIMILARITY_CANDIDATES)):
+        best.setdefault(component_id, []).append(candidate_id)
     
-    # Get storage location if available, default to empty string
-    storage = parsed_data.get('storage', '')
+    # Read and shingle each other candidate once
+    candidate_ids = list({candidate_id for candidates in best.values() for candidate_id in candidates
+                          if candidate_id not in known_features})
+    for start in range(0, len(candidate_ids), SPEC_BATCH_SIZE):
+        chunk = candidate_ids[start:start + SPEC_BATCH_SIZE]
+        for candidate_id, name, specifications in conn.execute(f'''
+            SELECT id, name, specifications FROM components WHERE id IN ({', '.join('?' for _ in chunk)})
+        ''', chunk):
+            known_features[candidate_id] = similarity.shingles(name, specifications)
     
-    conn.execute('''
-        INSERT INTO components (category_id, name, specifications, source, quantity, storage)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        category_id,
-        parsed_data['name'],
-        specifications,
-        parsed_data['source'],
-        parsed_data['quantity'],
-        storage
-    ))
-    
-    conn.commit()
-    conn.close()
-
-def get_all_components():
+    pairs = []
+    for component_id, candidates in best.items():
+        pairs.extend(_similar_pairs(component_id, known_features[component_id],
+                                    [(candidate_id, known_features[candidate_id]) for candidate_id in candidates]))
+    conn.executemany(
+        'INSERT OR REPLACE INTO similar_components (component_id, similar_id, score) VALUES (?, ?, ?)',
+        pairs)
+
+def _similar_pairs(component_id, features, candidates):
+    """Both directions of the pairs with the MAX_SIMILAR (id, features) candidates scoring above the threshold"""
+    scored = []
+    for candidate_id, candidate_features in candidates:
+        score = similarity.jaccard(features, candidate_features)
+        if score >= similarity.SIMILARITY_THRESHOLD:
+            scored.append((score, candidate_id))
+    scored.sort(reverse=True)
+    
+    pairs = []
+    for score, similar_id in scored[:MAX_SIMILAR]:
+        pairs.append((component_id, similar_id, score))
+        pairs.append((similar_id, component_id, score))
+    return pairs
+
+def count_stale_similarity():
+    """Number of components not yet in the current near-duplicate index"""
+    return _count_stale('similarity_version', similarity.SIMILARITY_INDEX_VERSION)
+
+def backfill_similarity_index(report_progress=None, batch_size=SPEC_BATCH_SIZE):
+    """Index every component the current near-duplicate index has not seen"""
+    return _backfill('similarity_version', similarity.SIMILARITY_INDEX_VERSION, refresh_similarity_index,
+                     report_progress, batch_size, 'Indexed')
+
+def refresh_component_indexes(component_ids):
+    """Refresh everything derived from the text of components that were written"""
+    component_ids = list(component_ids)
+    refresh_component_specs(component_ids)
+    refresh_similarity_index(component_ids)
+
+def rebuild_duplicate_groups():
+    """Recount every duplicate group from the components table"""
+    with transaction() as conn:
+        conn.execute('DELETE FROM duplicate_groups')
+        conn.execute('''
+            INSERT INTO duplicate_groups (category_id, name_key, member_count)
+            SELECT category_id, name_key, COUNT(*)
+            FROM components
+            WHERE name_key IS NOT NULL
+            GROUP BY category_id, name_key
+        ''')
+
+def rebuild_inventory_summary():
+    """Recompute the materialized summary tables from the components table"""
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE inventory_summary SET
+                component_count = (SELECT COUNT(*) FROM components),
+                total_quantity = (SELECT COALESCE(SUM(quantity), 0) FROM components),
+                zero_stock_count = (SELECT COUNT(*) FROM components WHERE quantity = 0),
+                duplicate_group_count = (SELECT COUNT(*) FROM duplicate_groups WHERE member_count > 1)
+            WHERE id = 1
+        ''')
+        conn.execute('DELETE FROM category_summary')
+        conn.execute('''
+            INSERT INTO category_summary (category_id, component_count, total_quantity)
+            SELECT category_id, COUNT(*), COALESCE(SUM(quantity), 0)
+            FROM components
+            GROUP BY category_id
+        ''')
+        conn.execute('DELETE FROM storage_summary')
+        conn.execute('''
+            INSERT INTO storage_summary (storage, component_count, total_quantity)
+            SELECT COALESCE(storage, ''), COUNT(*), COALESCE(SUM(quantity), 0)
+            FROM components
+            GROUP BY COALESCE(storage, '')
+        ''')
+
+def build_match_expression(query):
+    """Turn free search text into an FTS5 query.
+
+    Every word must match (in any field) and the last characters of each word
+    are treated as a prefix, so "atmega 32" finds "ATMEGA328P, TQFP-32".
+    Returns None when the text contains no searchable words.
+    """
+    tokens = re.findall(r'\w+', query.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+# Fields a component row can be projected to, with the SQL that selects them
+COMPONENT_COLUMNS = {
+    'id': 'c.id',
+    'name': 'c.name',
+    'specifications': 'c.specifications',
+    'source': 'c.source',
+    'quantity': 'c.quantity',
+    'storage': 'c.storage',
+    'category': 'cat.name as category',
+    'created_at': 'c.created_at',
+    'revision': 'c.revision',
+}
+COMPONENT_FIELDS = tuple(COMPONENT_COLUMNS)
+
+# Lists are ordered (and paginated) by category, then name, then id
+SORT_KEY = ('category', 'name', 'id')
+
+# Rows fetched from the cursor at a time when streaming search results
+EXPORT_BATCH_SIZE = 500
+
+def parse_fields(fields, allowed=COMPONENT_FIELDS):
+    """Validate a field projection given as a list or comma-separated string.
+
+    Returns every allowed field when no projection is requested.
+    """
+    if not fields:
+        return list(allowed)
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(fields)
+
+def _select_columns(fields):
+    # The sort key is always selected so the next cursor can be built
+    wanted = set(fields) | set(SORT_KEY)
+    return ', '.join(COMPONENT_COLUMNS[field] for field in COMPONENT_FIELDS if field in wanted)
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after the given row in list order"""
+    key = [row[field] for field in SORT_KEY]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError, AttributeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, list) or len(key) != len(SORT_KEY):
+        raise ValueError('Invalid cursor')
+    return key
+
+def _paginate(sql_query, params, limit=None, cursor=None):
+    """Add the keyset condition, list ordering and page limit to a query"""
+    if cursor:
+        sql_query += " AND (cat.name, c.name, c.id) > (?, ?, ?)"
+        params.extend(decode_cursor(cursor))
+    sql_query += " ORDER BY cat.name, c.name, c.id"
+    if limit is not None:
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        # One extra row tells us whether there is a next page
+        sql_query += " LIMIT ?"
+        params.append(limit + 1)
+    return sql_query, params
+
+def _row_to_dict(row, fields):
+    component = {field: row[field] for field in fields}
+    if 'storage' in component and not component['storage']:
+        component['storage'] = ''
+    return component
+
+def _build_result(rows, fields, limit=None):
+    """Format rows as a list, or as a page with a next cursor when limit is set"""
+    if limit is None:
+        return [_row_to_dict(row, fields) for row in rows]
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {
+        'items': [_row_to_dict(row, fields) for row in rows[:limit]],
+        'next_cursor': next_cursor
+    }
+
+def category_key(category_name):
+    """Registry key of a category name, so "Resistor", "resistor " and "RESISTOR" are one category"""
+    return (category_name or '').strip().casefold()
+
+def _load_categories():
+    global _categories_loaded
+    rows = get_db_connection().execute('SELECT id, name FROM categories ORDER BY id').fetchall()
+    with _categories_lock:
+        if not _categories_loaded:
+            for row in rows:
+                _categories.setdefault(category_key(row['name']), row['id'])
+            _categories_loaded = True
+
+def _pending_categories():
+    pending = getattr(_local, 'new_categories', None)
+    if pending is None:
+        pending = _local.new_categories = {}
+    return pending
+
+def _publish_categories(committed):
+    pending = getattr(_local, 'new_categories', None)
+    if pending:
+        if committed:
+            with _categories_lock:
+                _categories.update(pending)
+        pending.clear()
+
+def get_or_create_category(category_name):
+    """Id of a category, created if needed; names match case-insensitively.
+
+    Known categories are answered from the in-process registry without a
+    query. A category created here joins the registry when the caller's
+    transaction commits, and is forgotten if it rolls back.
+    """
+    if not _categories_loaded:
+        _load_categories()
+    key = category_key(category_name)
+    category_id = _categories.get(key) or _pending_categories().get(key)
+    if category_id is not None:
+        return category_id
+    
+    name = category_name.strip()
+    with transaction() as conn:
+        # Another process may have created it since the registry was loaded
+        category = conn.execute('SELECT id FROM categories WHERE name = ? COLLATE NOCASE',
+                                (name,)).fetchone()
+        if category is None:
+            category_id = conn.execute('INSERT INTO categories (name) VALUES (?)', (name,)).lastrowid
+            _pending_categories()[key] = category_id
+        else:
+            category_id = category['id']
+            with _categories_lock:
+                _categories[key] = category_id
+    
+    return category_id
+
+@serialized_write
+def add_component(parsed_data):
+    with transaction() as conn:
+        category_id = get_or_create_category(parsed_data['category'])
+        
+        # Ensure specifications is a string
+        specifications = parsed_data['specifications']
+        if isinstance(specifications, dict):
+            specifications = json.dumps(specifications)
+        
+        # Get storage location if available, default to empty string
+        storage = parsed_data.get('storage', '')
+        
+        cursor = conn.execute('''
+            INSERT INTO components (category_id, name, name_key, specifications, source, quantity, storage)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            category_id,
+            parsed_data['name'],
+            normalize_name(parsed_data['name']),
+            specifications,
+            parsed_data['source'],
+            parsed_data['quantity'],
+            storage
+        ))
+        refresh_component_indexes([cursor.lastrowid])
+        _log_change(conn, 'add', cursor.lastrowid, name=parsed_data['name'],
+                    category=parsed_data['category'], quantity=parsed_data['quantity'])
+
+@serialized_write
+def add_components_bulk(components):
+    """Insert many components in a single transaction.
+
+    Args:
+        components: Parsed component dicts, as accepted by add_component
+
+    Returns:
+        Number of components inserted
+    """
+    rows = []
+    with transaction() as conn:
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM components').fetchone()[0]
+        for component in components:
+            category_id = get_or_create_category(component.get('category') or 'Uncategorized')
+            
+            specifications = component.get('specifications', '')
+            if isinstance(specifications, dict):
+                specifications = json.dumps(specifications)
+            
+            rows.append((
+                category_id,
+                component['name'],
+                normalize_name(component['name']),
+                specifications,
+                component.get('source', ''),
+                component.get('quantity', 1),
+                component.get('storage', '')
+            ))
+        
+        conn.executemany('''
+            INSERT INTO components (category_id, name, name_key, specifications, source, quantity, storage)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        if rows:
+            refresh_component_indexes(row['id'] for row in conn.execute(
+                'SELECT id FROM components WHERE id > ? AND specs_version IS NULL', (last_id,)))
+            # One entry for the whole batch; clients re-sync instead of
+            # receiving every row
+            _log_change(conn, 'bulk_add', count=len(rows))
+    
+    return len(rows)
+
+def get_all_components(limit=None, cursor=None, fields=None):
+    """Get components ordered by category and name.
+
+    Returns a list of every component, or a page
+    ({'items': [...], 'next_cursor': ...}) of at most `limit` components
+    following `cursor`. `fields` restricts each component to those keys.
+    """
+    fields = parse_fields(fields)
     conn = get_db_connection()
-    components = conn.execute('''
-        SELECT c.id, c.name, c.specifications, c.source, c.quantity, c.storage, c.created_at, 
-               cat.name as category
+    sql_query = f'''
+        SELECT {_select_columns(fields)}
         FROM components c
         JOIN categories cat ON c.category_id = cat.id
-        ORDER BY cat.name, c.name
-    ''').fetchall()
-    
-    conn.close()
-    
-    result = []
-    for component in components:
-        result.append({
-            'id': component['id'],
-            'name': component['name'],
-            'specifications': component['specifications'],
-            'source': component['source'],
-            'quantity': component['quantity'],
-            'storage': component['storage'] if component['storage'] else '',
-            'category': component['category'],
-            'created_at': component['created_at']
-        })
+        WHERE 1=1
+    '''
+    sql_query, params = _paginate(sql_query, [], limit, cursor)
+    components = conn.execute(sql_query, params).fetchall()
     
-    return result
+    return _build_result(components, fields, limit)
 
 def find_similar_components(component_id):
     """Find components that are similar to the given component,
-    excluding those that have been explicitly marked as not similar"""
+    excluding those that have been explicitly marked as not similar
+
+    Candidates are the other members of its duplicate group (same category
+    and normalized name) and its near-duplicate pairs from the similarity
+    index, which also catch typos and reordered words. Each result has a
+    'similarity' score from 0 to 1 (see similarity.score); best match first.
+    """
     conn = get_db_connection()
     
     # Get the component's details
     component = conn.execute('SELECT * FROM components WHERE id = ?', (component_id,)).fetchone()
     if not component:
-        conn.close()
         return []
     
-    # Check if excluded_similarities table exists
-    table_exists = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='excluded_similarities'"
-    ).fetchone()
-    
-    excluded_ids = []
+    similar_components = conn.execute('''
+        SELECT c.* FROM components c
+        WHERE c.id IN (
+            SELECT similar_id FROM similar_components WHERE component_id = ?
+            UNION
+            SELECT id FROM components WHERE category_id = ? AND name_key = ?
+        )
+        AND c.id != ?
+        AND c.id NOT IN (SELECT component2_id FROM excluded_similarities WHERE component1_id = ?)
+    ''', (component_id, component['category_id'], component['name_key'], component_id, component_id)).fetchall()
     
-    # Get excluded similarities if the table exists
-    if table_exists:
-        excluded = conn.execute('''
-            SELECT component2_id FROM excluded_similarities 
-            WHERE component1_id = ?
-        ''', (component_id,)).fetchall()
-        
-        excluded_ids = [row['component2_id'] for row in excluded]
-    
-    # Add the component itself to excluded list
-    excluded_ids.append(component_id)
+    results = []
+    for similar in similar_components:
+        result = dict(similar)
+        result['similarity'] = round(similarity.score(component, similar), 3)
+        results.append(result)
+    results.sort(key=lambda result: (-result['similarity'], result['id']))
+    return results
+
+def find_duplicate_clusters(fields=None):
+    """
+    Group the whole inventory into clusters of likely duplicates
+
+    Components are linked by their near-duplicate pairs and duplicate
+    groups, except pairs marked not similar; a cluster is everything linked
+    directly or through other members. Reads each pair once, so the cost
+    grows linearly with the inventory instead of comparing every pair.
+
+    Returns:
+        [{'size': n, 'components': [...]}], largest cluster first
+    """
+    fields = parse_fields(fields)
+    conn = get_db_connection()
     
-    # Build an exclusion string for the SQL query
-    exclusion_placeholders = ', '.join(['?' for _ in excluded_ids])
+    excluded = set(conn.execute('SELECT component1_id, component2_id FROM excluded_similarities').fetchall())
+    edges = [
+        (row[0], row[1]) for row in conn.execute(
+            'SELECT component_id, similar_id FROM similar_components WHERE component_id < similar_id')
+        if (row[0], row[1]) not in excluded
+    ]
     
-    # Check for similar components, excluding the marked ones
-    similar_components = conn.execute(f'''
-        SELECT * FROM components 
-        WHERE category_id = ? 
-        AND name LIKE ? 
-        AND id NOT IN ({exclusion_placeholders})
-    ''', (component['category_id'], f'%{component["name"]}%', *excluded_ids)).fetchall()
+    # Chain the members of each duplicate group, skipping excluded links
+    previous = None
+    for row in conn.execute('''
+        SELECT c.id, c.category_id, c.name_key
+        FROM duplicate_groups g
+        JOIN components c ON c.category_id = g.category_id AND c.name_key = g.name_key
+        WHERE g.member_count > 1
+        ORDER BY c.category_id, c.name_key, c.id
+    '''):
+        if previous and previous[1:] == tuple(row)[1:] and (previous[0], row[0]) not in excluded:
+            edges.append((previous[0], row[0]))
+        previous = tuple(row)
     
-    conn.close()
+    clusters = similarity.clusters(edges)
+    members = {component_id for cluster in clusters for component_id in cluster}
+    components = {}
+    for row in conn.execute(f'''
+        SELECT c.id as _id, {_select_columns(fields)}
+        FROM components c
+        JOIN categories cat ON c.category_id = cat.id
+    '''):
+        if row['_id'] in members:
+            components[row['_id']] = _row_to_dict(row, fields)
     
-    return [dict(c) for c in similar_components]
+    return [
+        {'size': len(cluster), 'components': [components[component_id] for component_id in cluster]}
+        for cluster in clusters
+    ]
 
+@serialized_write
 def merge_components(source_id, target_id):
     """Merge source component into target component and delete the source"""
-    conn = get_db_connection()
-    
-    # Get both components
-    source = conn.execute('SELECT * FROM components WHERE id = ?', (source_id,)).fetchone()
-    target = conn.execute('SELECT * FROM components WHERE id = ?', (target_id,)).fetchone()
-    
-    if not source or not target:
-        conn.close()
-        return False
-    
-    # Update target quantity (add source quantity)
-    new_quantity = target['quantity'] + source['quantity']
-    
-    # Merge specifications if they're different
-    target_specs = target['specifications']
-    source_specs = source['specifications']
-    
-    if target_specs != source_specs and source_specs.strip():
-        # Simple merge - could be made smarter
-        if target_specs and source_specs:
-            new_specs = f"{target_specs}; {source_specs}"
+    with transaction() as conn:
+        # Get both components
+        source = conn.execute('SELECT * FROM components WHERE id = ?', (source_id,)).fetchone()
+        target = conn.execute('SELECT * FROM components WHERE id = ?', (target_id,)).fetchone()
+        
+        if not source or not target:
+            return False
+        
+        # Update target quantity (add source quantity)
+        new_quantity = target['quantity'] + source['quantity']
+        
+        # Merge specifications if they're different
+        target_specs = target['specifications']
+        source_specs = source['specifications']
+        
+        if target_specs != source_specs and source_specs.strip():
+            # Simple merge - could be made smarter
+            if target_specs and source_specs:
+                new_specs = f"{target_specs}; {source_specs}"
+            else:
+                new_specs = source_specs or target_specs
         else:
-            new_specs = source_specs or target_specs
-    else:
-        new_specs = target_specs
+            new_specs = target_specs
+            
+        # Merge storage if different
+        target_storage = target['storage'] or ''
+        source_storage = source['storage'] or ''
         
-    # Merge storage if different
-    target_storage = target['storage'] or ''
-    source_storage = source['storage'] or ''
-    
-    if target_storage != source_storage and source_storage.strip():
-        # If target has no storage but source does, use source
-        if not target_storage and source_storage:
-            new_storage = source_storage
-        # If both have storage, combine them
-        elif target_storage and source_storage:
-            new_storage = f"{target_storage}; {source_storage}"
+        if target_storage != source_storage and source_storage.strip():
+            # If target has no storage but source does, use source
+            if not target_storage and source_storage:
+                new_storage = source_storage
+            # If both have storage, combine them
+            elif target_storage and source_storage:
+                new_storage = f"{target_storage}; {source_storage}"
+            else:
+                new_storage = target_storage
         else:
             new_storage = target_storage
-    else:
-        new_storage = target_storage
-    
-    # Update the target component
-    conn.execute('''
-        UPDATE components 
-        SET quantity = ?,
-            specifications = ?,
-            storage = ?
-        WHERE id = ?
-    ''', (new_quantity, new_specs, new_storage, target_id))
-    
-    # Delete the source component
-    conn.execute('DELETE FROM components WHERE id = ?', (source_id,))
+        
+        # Update the target component
+        conn.execute('''
+            UPDATE components 
+            SET quantity = ?,
+                specifications = ?,
+                storage = ?
+            WHERE id = ?
+        ''', (new_quantity, new_specs, new_storage, target_id))
+        
+        # Delete the source component
+        conn.execute('DELETE FROM components WHERE id = ?', (source_id,))
+        refresh_component_indexes([target_id])
+        _log_change(conn, 'merge', target_id, source_id=source_id, quantity=new_quantity)
     
-    conn.commit()
-    conn.close()
     return True
 
 def get_component_by_id(component_id):
     """Get a single component by ID"""
     conn = get_db_connection()
-    component = conn.execute('''
-        SELECT c.id, c.name, c.specifications, c.source, c.quantity, c.storage, c.created_at, 
-               cat.name as category
+    component = conn.execute(f'''
+        SELECT {_select_columns(COMPONENT_FIELDS)}
         FROM components c
         JOIN categories cat ON c.category_id = cat.id
         WHERE c.id = ?
     ''', (component_id,)).fetchone()
     
-    conn.close()
-    
     if not component:
         return None
         
-    return {
-        'id': component['id'],
-        'name': component['name'],
-        'specifications': component['specifications'],
-        'source': component['source'],
-        'quantity': component['quantity'],
-        'storage': component['storage'] if component['storage'] else '',
-        'category': component['category'],
-        'created_at': component['created_at']
-    }
+    return _row_to_dict(component, COMPONENT_FIELDS)
 
+@serialized_write
 def update_component_storage(component_id, storage):
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE components 
-        SET storage = ?
-        WHERE id = ?
-    ''', (storage, component_id))
+    with transaction() as conn:
+        updated = conn.execute('''
+            UPDATE components 
+            SET storage = ?
+            WHERE id = ?
+        ''', (storage, component_id)).rowcount
+        if updated:
+            _log_change(conn, 'storage', component_id, storage=storage)
     
-    conn.commit()
-    conn.close()
     return True
 
+@serialized_write
 def update_component_quantity(component_id, new_quantity):
     """Update the quantity of a component"""
     # Ensure quantity is not negative
     if new_quantity < 0:
         new_quantity = 0
         
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE components 
-        SET quantity = ?
-        WHERE id = ?
-    ''', (new_quantity, component_id))
+    with transaction() as conn:
+        updated = conn.execute('''
+            UPDATE components 
+            SET quantity = ?
+            WHERE id = ?
+        ''', (new_quantity, component_id)).rowcount
+        if updated:
+            _log_change(conn, 'quantity', component_id, quantity=new_quantity)
     
-    conn.commit()
-    conn.close()
     return True
 
-def search_components(query=None, filters=None):
+def search_components(query=None, filters=None, order=None, limit=None, cursor=None, fields=None):
     """
     Search components based on query string and filters
     
     Args:
-        query (str): Search text to find across name, specifications, source
+        query (str): Search text to find across name, specifications, source,
+            category and storage (full-text, prefix matching on every word)
         filters (dict): Filter criteria for categories, quantity, storage, etc.
+            min_<kind>/max_<kind> (kind in specs.SPEC_KINDS, e.g.
+            min_resistance="4.7k") and package ("0603" or a list) match
+            the values extracted from the specifications.
+        order (str): 'relevance' to rank text matches by bm25; by default
+            results are ordered by category and name. Paginated searches
+            always use the category and name order.
+        limit (int): Return a page of at most this many results
+        cursor (str): next_cursor of the previous page
+        fields (list): Only include these keys in each result
     """
-    conn = get_db_connection()
+    fields = parse_fields(fields)
+    sql_query, params, match_expression = _search_query(query, filters, fields)
+    
+    # Add ordering
+    if match_expression and order == 'relevance' and limit is None:
+        sql_query += f" ORDER BY {SEARCH_RANK}, c.id"
+    else:
+        sql_query, params = _paginate(sql_query, params, limit, cursor)
+    
+    # Execute the query
+    components = get_db_connection().execute(sql_query, params).fetchall()
+    
+    return _build_result(components, fields, limit)
+
+def iter_search_results(query=None, filters=None, order=None, fields=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Iterator over the components search_components would return
+
+    The search is checked at once (ValueError for bad fields or filters), but
+    nothing is queried until the first component is asked for. Rows are then
+    read from the open cursor batch_size at a time, so memory use stays flat
+    however many components match.
+    """
+    fields = parse_fields(fields)
+    sql_query, params, match_expression = _search_query(query, filters, fields)
+    if match_expression and order == 'relevance':
+        sql_query += f" ORDER BY {SEARCH_RANK}, c.id"
+    else:
+        sql_query, params = _paginate(sql_query, params)
+    
+    def generate():
+        rows = get_db_connection().execute(sql_query, params)
+        try:
+            while True:
+                batch = rows.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield _row_to_dict(row, fields)
+        finally:
+            rows.close()
+    
+    return generate()
+
+def _search_query(query, filters, fields):
+    """SELECT of the components matching a search, without ordering.
+    Returns the SQL, its parameters and the full-text match expression used (or None)."""
+    match_expression = None
+    if query and query.strip() and _search_index_enabled:
+        match_expression = build_match_expression(query)
     
     # Start building the query
-    sql_query = '''
-        SELECT c.id, c.name, c.specifications, c.source, c.quantity, c.storage, c.created_at, 
-               cat.name as category
-        FROM components c
-        JOIN categories cat ON c.category_id = cat.id
-        WHERE 1=1
-    '''
-    params = []
+    if match_expression:
+        sql_query = f'''
+            SELECT {_select_columns(fields)}
+            FROM components_fts
+            JOIN components c ON c.id = components_fts.rowid
+            JOIN categories cat ON c.category_id = cat.id
+            WHERE components_fts MATCH ?
+        '''
+        params = [match_expression]
+    else:
+        sql_query = f'''
+            SELECT {_select_columns(fields)}
+            FROM components c
+            JOIN categories cat ON c.category_id = cat.id
+            WHERE 1=1
+        '''
+        params = []
     
-    # Add search conditions if query is provided
-    if query and query.strip():
+    # Without a usable full-text index, fall back to substring matching
+    if query and query.strip() and not match_expression:
         search_term = f"%{query.strip()}%"
         sql_query += '''
             AND (
@@ -289,7 +1245,7 @@ def search_components(query=None, filters=None):
         # Filter by categories (list of category names)
         if 'categories' in filters and filters['categories']:
             placeholders = ','.join(['?' for _ in filters['categories']])
-            sql_query += f" AND cat.name IN ({placeholders})"
+            sql_query += f" AND cat.name COLLATE NOCASE IN ({placeholders})"
             params.extend(filters['categories'])
         
         # Filter by quantity range
@@ -315,6 +1271,32 @@ def search_components(query=None, filters=None):
             sql_query += " AND c.created_at <= ?"
             params.append(filters['max_date'])
             
+        # Filter by extracted values: min_resistance, max_voltage, ... given
+        # as numbers or with SI prefixes ("4.7k", "100nF")
+        for kind in SPEC_KINDS:
+            low = filters.get(f'min_{kind}')
+            high = filters.get(f'max_{kind}')
+            if low in (None, '') and high in (None, ''):
+                continue
+            sql_query += " AND c.id IN (SELECT component_id FROM component_values WHERE kind = ?"
+            params.append(kind)
+            if low not in (None, ''):
+                sql_query += " AND value >= ?"
+                params.append(parse_value(low, kind))
+            if high not in (None, ''):
+                sql_query += " AND value <= ?"
+                params.append(parse_value(high, kind))
+            sql_query += ")"
+        
+        # Filter by package code(s), e.g. "0603" or ["SOIC-8", "DIP-8"]
+        if filters.get('package'):
+            packages = filters['package']
+            if isinstance(packages, str):
+                packages = [packages]
+            placeholders = ','.join(['?' for _ in packages])
+            sql_query += f" AND c.id IN (SELECT component_id FROM component_packages WHERE package IN ({placeholders}))"
+            params.extend(canonical_package(str(package)) for package in packages)
+        
         # Filter by zero quantity
         if 'show_zero_quantity' in filters:
             if filters['show_zero_quantity'] is True:
@@ -322,194 +1304,429 @@ def search_components(query=None, filters=None):
             elif filters['show_zero_quantity'] is False:
                 sql_query += " AND c.quantity > 0"
     
-    # Add ordering
-    sql_query += " ORDER BY cat.name, c.name"
+    return sql_query, params, match_expression
+
+def _similarity_query(fields):
+    """SELECT of components with has_similar, ending in an open WHERE clause"""
+    return f'''
+        SELECT {_select_columns(fields)},
+               (COALESCE(g.member_count, 1) - 1 - COALESCE(x.excluded_count, 0) > 0
+                OR EXISTS (
+                    -- Near-duplicate pairs not marked as not similar
+                    SELECT 1 FROM similar_components s
+                    WHERE s.component_id = c.id
+                      AND NOT EXISTS (
+                          SELECT 1 FROM excluded_similarities e
+                          WHERE e.component1_id = c.id AND e.component2_id = s.similar_id
+                      )
+                )) as has_similar
+        FROM components c
+        JOIN categories cat ON c.category_id = cat.id
+        LEFT JOIN duplicate_groups g
+            ON g.category_id = c.category_id AND g.name_key = c.name_key
+        LEFT JOIN (
+            -- Group members each component has been marked not similar to
+            SELECT e.component1_id as component_id, COUNT(*) as excluded_count
+            FROM excluded_similarities e
+            JOIN components a ON a.id = e.component1_id
+            JOIN components b ON b.id = e.component2_id
+            WHERE a.id != b.id
+              AND a.category_id = b.category_id
+              AND a.name_key = b.name_key
+            GROUP BY e.component1_id
+        ) x ON x.component_id = c.id
+        WHERE 1=1
+    '''
+
+def _convert_has_similar(components):
+    # SQLite returns the comparison as 0/1
+    for component in components:
+        if 'has_similar' in component:
+            component['has_similar'] = bool(component['has_similar'])
+    return components
+
+def get_all_components_with_similarity_info(limit=None, cursor=None, fields=None):
+    """Get all components with information about whether they have similar items
+    while respecting excluded similarity relationships
+
+    A component has similar items when its duplicate group (same category and
+    normalized name) has other members, or it has near-duplicate pairs, that
+    it has not been marked dissimilar from.
+    Takes the same pagination and projection arguments as get_all_components.
+    """
+    fields = parse_fields(fields, COMPONENT_FIELDS + ('has_similar',))
+    conn = get_db_connection()
     
-    # Execute the query
+    sql_query, params = _paginate(_similarity_query(fields), [], limit, cursor)
     components = conn.execute(sql_query, params).fetchall()
-    conn.close()
     
-    # Format results
-    result = []
-    for component in components:
-        result.append({
-            'id': component['id'],
-            'name': component['name'],
-            'specifications': component['specifications'],
-            'source': component['source'],
-            'quantity': component['quantity'],
-            'storage': component['storage'] if component['storage'] else '',
-            'category': component['category'],
-            'created_at': component['created_at']
-        })
+    result = _build_result(components, fields, limit)
+    _convert_has_similar(result if limit is None else result['items'])
     
     return result
 
-def get_all_components_with_similarity_info():
-    """Get all components with information about whether they have similar items
-    while respecting excluded similarity relationships"""
+def get_all_components_columnar(limit=None, cursor=None, fields=None):
+    """Same components as get_all_components_with_similarity_info, as columns
+
+    Instead of one dict per component the result holds one list per field
+    ('columns'), so key names are not repeated for every row. Categories are
+    sent once in 'categories' and the category column holds indexes into it.
+    Rows are fetched as plain tuples and transposed in one go, which is much
+    cheaper than building a dict per row.
+    """
+    fields = parse_fields(fields, COMPONENT_FIELDS + ('has_similar',))
     conn = get_db_connection()
     
-    # First, get all components
-    components = conn.execute('''
-        SELECT c.id, c.name, c.specifications, c.source, c.quantity, c.storage, c.created_at, 
-               cat.name as category, c.category_id
-        FROM components c
-        JOIN categories cat ON c.category_id = cat.id
-        ORDER BY cat.name, c.name
-    ''').fetchall()
+    sql_query, params = _paginate(_similarity_query(fields), [], limit, cursor)
+    rows = conn.execute(sql_query, params)
+    rows.row_factory = None
+    names = [description[0] for description in rows.description]
+    components = rows.fetchall()
+    
+    next_cursor = None
+    if limit is not None and len(components) > limit:
+        components = components[:limit]
+        next_cursor = encode_cursor(dict(zip(names, components[-1])))
+    
+    columns = {name: list(values) for name, values in zip(names, zip(*components))}
+    result = {
+        'format': 'columnar',
+        'count': len(components),
+        'fields': fields,
+        'columns': {field: columns.get(field, []) for field in fields}
+    }
+    if 'storage' in fields:
+        result['columns']['storage'] = [storage or '' for storage in result['columns']['storage']]
+    if 'has_similar' in fields:
+        result['columns']['has_similar'] = [bool(value) for value in result['columns']['has_similar']]
+    if 'category' in fields:
+        categories = {}
+        result['columns']['category'] = [categories.setdefault(name, len(categories))
+                                         for name in result['columns']['category']]
+        result['categories'] = list(categories)
+    if limit is not None:
+        result['next_cursor'] = next_cursor
     
-    # Check if the excluded_similarities table exists
-    table_exists = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='excluded_similarities'"
+    return result
+
+def get_inventory_revision():
+    """Current inventory revision; it grows with every change to the inventory"""
+    row = get_db_connection().execute(
+        'SELECT revision FROM inventory_revision WHERE id = 1'
     ).fetchone()
+    return row['revision'] if row else 0
+
+def get_inventory_summary():
+    """
+    Dashboard figures from the trigger-maintained summary tables
+
+    Returns:
+        Dict with the inventory revision, component_count, total_quantity,
+        zero_stock_count, duplicate_group_count (groups of components with the
+        same normalized name in a category, whether or not they were marked
+        not similar; the duplicate warning counts has_similar rows instead),
+        and categories and storage lists
+        of {name, component_count, total_quantity} sorted by name. Storage ''
+        stands for components without a location.
+    """
+    # One statement, so every figure comes from the same snapshot
+    row = get_db_connection().execute('''
+        SELECT s.component_count, s.total_quantity, s.zero_stock_count, s.duplicate_group_count,
+               (SELECT revision FROM inventory_revision WHERE id = 1) as revision,
+               (SELECT json_group_array(json_object(
+                    'name', name, 'component_count', component_count, 'total_quantity', total_quantity))
+                FROM (SELECT cat.name, cs.component_count, cs.total_quantity
+                      FROM category_summary cs
+                      JOIN categories cat ON cat.id = cs.category_id
+                      ORDER BY cat.name)) as categories,
+               (SELECT json_group_array(json_object(
+                    'name', storage, 'component_count', component_count, 'total_quantity', total_quantity))
+                FROM (SELECT * FROM storage_summary ORDER BY storage)) as storage
+        FROM inventory_summary s
+        WHERE s.id = 1
+    ''').fetchone()
     
-    # Get all excluded similarity relationships if the table exists
-    excluded_pairs = set()
-    if table_exists:
-        excluded = conn.execute('''
-            SELECT component1_id, component2_id FROM excluded_similarities
-        ''').fetchall()
-        
-        for row in excluded:
-            excluded_pairs.add((row['component1_id'], row['component2_id']))
-            excluded_pairs.add((row['component2_id'], row['component1_id']))  # Add both directions
+    summary = dict(row)
+    summary['categories'] = json.loads(summary['categories'])
+    summary['storage'] = json.loads(summary['storage'])
+    return summary
+
+def get_component_changes(since, fields=None):
+    """
+    Components changed or deleted after revision `since`
     
-    # Format results and check for similarity
-    result = []
+    Returns:
+        {'revision': current revision, 'upserted': [components with
+        has_similar], 'deleted': [ids]}. The revision is read first, so a
+        change committed meanwhile can show up again in the next call;
+        applying the upserts and then the deletes is idempotent. When the
+        tombstones after `since` have been pruned, every component is
+        returned with 'reset': True instead.
+    """
+    fields = parse_fields(fields, COMPONENT_FIELDS + ('has_similar',))
+    conn = get_db_connection()
     
-    # Group components by category for more accurate similarity detection
-    for component in components:
-        has_similar = False
-        component_id = component['id']
-        
-        # Compare with other components in the same category
-        for other in components:
-            if component_id == other['id']:
-                continue  # Skip self comparison
-                
-            # Skip if this pair is in the excluded list
-            if (component_id, other['id']) in excluded_pairs:
-                continue
-                
-            # Check if names are similar and in the same category
-            if (component['category_id'] == other['category_id'] and 
-                component['name'].lower().strip() == other['name'].lower().strip()):
-                has_similar = True
-                break
-        
-        result.append({
-            'id': component['id'],
-            'name': component['name'],
-            'specifications': component['specifications'],
-            'source': component['source'],
-            'quantity': component['quantity'],
-            'storage': component['storage'] if component['storage'] else '',
-            'category': component['category'],
-            'created_at': component['created_at'],
-            'has_similar': has_similar
-        })
-    
-    conn.close()
-    return result
+    revision, sync_floor = conn.execute(
+        'SELECT revision, sync_floor FROM inventory_revision WHERE id = 1'
+    ).fetchone()
+    reset = since < sync_floor
+    if reset:
+        since = 0
+    rows = conn.execute(
+        _similarity_query(fields) + ' AND c.revision > ? ORDER BY cat.name, c.name, c.id',
+        (since,)
+    ).fetchall()
+    deleted = conn.execute(
+        'SELECT component_id FROM component_tombstones WHERE revision > ? ORDER BY component_id',
+        (since,)
+    ).fetchall()
+    
+    changes = {
+        'revision': revision,
+        'upserted': _convert_has_similar(_build_result(rows, fields)),
+        'deleted': [row['component_id'] for row in deleted]
+    }
+    if reset:
+        changes['reset'] = True
+    return changes
 
+def _write_component_update(conn, component, updated_data):
+    """Apply updated_data to a component row; returns False when nothing changed"""
+    # Get or create category if needed
+    category_id = component['category_id']
+    if 'category' in updated_data:
+        category_id = get_or_create_category(updated_data['category'])
+    
+    # Handle specifications format (could be dict or string)
+    specifications = updated_data.get('specifications', component['specifications'])
+    if isinstance(specifications, dict):
+        specifications = json.dumps(specifications)
+    
+    name = updated_data.get('name', component['name'])
+    values = {
+        'category_id': category_id,
+        'name': name,
+        'name_key': normalize_name(name),
+        'specifications': specifications,
+        'source': updated_data.get('source', component['source']),
+        'quantity': updated_data.get('quantity', component['quantity']),
+        'storage': updated_data.get('storage', component['storage'])
+    }
+    if all(component[column] == value for column, value in values.items()):
+        return False
+    
+    # Prepare the update query
+    conn.execute('''
+        UPDATE components 
+        SET category_id = ?, 
+            name = ?, 
+            name_key = ?,
+            specifications = ?, 
+            source = ?, 
+            quantity = ?,
+            storage = ?
+        WHERE id = ?
+    ''', (*values.values(), component['id']))
+    # Specs and near-duplicates only depend on these
+    if any(component[column] != values[column] for column in ('category_id', 'name', 'specifications')):
+        refresh_component_indexes([component['id']])
+    return True
+
+@serialized_write
 def update_component(component_id, updated_data):
     """Update all details of a component"""
-    conn = get_db_connection()
-    
     try:
-        # Get the current component data
-        component = conn.execute('SELECT * FROM components WHERE id = ?', (component_id,)).fetchone()
-        if not component:
-            conn.close()
-            return False
-        
-        # Get or create category if needed
-        category_id = component['category_id']
-        if 'category' in updated_data:
-            category_id = get_or_create_category(updated_data['category'])
-        
-        # Handle specifications format (could be dict or string)
-        specifications = updated_data.get('specifications', component['specifications'])
-        if isinstance(specifications, dict):
-            specifications = json.dumps(specifications)
-        
-        # Prepare the update query
-        conn.execute('''
-            UPDATE components 
-            SET category_id = ?, 
-                name = ?, 
-                specifications = ?, 
-                source = ?, 
-                quantity = ?,
-                storage = ?
-            WHERE id = ?
-        ''', (
-            category_id,
-            updated_data.get('name', component['name']),
-            specifications,
-            updated_data.get('source', component['source']),
-            updated_data.get('quantity', component['quantity']),
-            updated_data.get('storage', component['storage']),
-            component_id
-        ))
+        with transaction() as conn:
+            # Get the current component data
+            component = conn.execute('SELECT * FROM components WHERE id = ?', (component_id,)).fetchone()
+            if not component:
+                return False
+            
+            if _write_component_update(conn, component, updated_data):
+                _log_change(conn, 'update', component_id, fields=sorted(updated_data))
         
-        conn.commit()
-        conn.close()
         return True
     except Exception as e:
         print(f"Error updating component: {e}")
-        conn.close()
         return False 
 
+# Most operations apply_component_operations accepts in one call
+MAX_BATCH_OPERATIONS = 1000
+# Keys an 'update' operation may set
+UPDATABLE_FIELDS = ('name', 'category', 'specifications', 'source', 'quantity', 'storage')
+
+class RevisionConflictError(Exception):
+    """Raised when components changed or were deleted after the revision a client read"""
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} components changed since they were read")
+        self.conflicts = conflicts
+
+def _integer(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+def _parse_operation(operation):
+    """Validate one batch operation; returns (id, op, argument, expected revision)"""
+    if not isinstance(operation, dict):
+        raise ValueError('Each operation must be an object')
+    component_id = _integer(operation.get('id'), 'id')
+    revision = operation.get('revision')
+    if revision is not None:
+        revision = _integer(revision, 'revision')
+    
+    op = operation.get('op')
+    if op == 'set_quantity':
+        argument = max(0, _integer(operation.get('quantity'), 'quantity'))
+    elif op == 'adjust_quantity':
+        argument = _integer(operation.get('delta'), 'delta')
+    elif op == 'set_storage':
+        argument = operation.get('storage') or ''
+        if not isinstance(argument, str):
+            raise ValueError('storage must be a string')
+    elif op == 'update':
+        argument = operation.get('fields')
+        if not isinstance(argument, dict) or not argument:
+            raise ValueError('update needs a fields object')
+        unknown = [field for field in argument if field not in UPDATABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        if 'quantity' in argument:
+            argument = dict(argument, quantity=max(0, _integer(argument['quantity'], 'quantity')))
+    else:
+        raise ValueError(f"Unknown op: {op!r}")
+    return component_id, op, argument, revision
+
+@serialized_write
+def apply_component_operations(operations, fields=None):
+    """
+    Apply a list of component edits in one transaction, e.g. a stock take
+    
+    Each operation is {'id', 'op', ..., 'revision' (optional)} where op is
+    set_quantity (with 'quantity'), adjust_quantity ('delta'), set_storage
+    ('storage') or update ('fields': any of UPDATABLE_FIELDS). Quantities
+    never go below zero. Operations run in order, so later ones see earlier
+    ones' effects.
+    
+    'revision' is the component revision the client last read. Every
+    revision is checked under the write lock before anything is written; if
+    one is stale or its component is gone, nothing is applied.
+    
+    Raises:
+        ValueError: a malformed operation or too many operations
+        RevisionConflictError: with .conflicts = [{'id', 'expected_revision', 'revision'}]
+    
+    Returns:
+        {'revision': inventory revision after the batch, 'components': the
+        components that actually changed, with has_similar, in id order}
+    """
+    if not isinstance(operations, list):
+        raise ValueError('operations must be a list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    operations = [_parse_operation(operation) for operation in operations]
+    fields = parse_fields(fields, COMPONENT_FIELDS + ('has_similar',))
+    
+    with transaction() as conn:
+        if not conn.in_transaction:
+            # Hold the write lock from the revision check to the commit
+            conn.execute('BEGIN IMMEDIATE')
+        
+        ids = sorted({operation[0] for operation in operations})
+        current = {}
+        for start in range(0, len(ids), SPEC_BATCH_SIZE):
+            batch = ids[start:start + SPEC_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in batch)
+            current.update(conn.execute(
+                f'SELECT id, revision FROM components WHERE id IN ({placeholders})', batch).fetchall())
+        
+        conflicts = [
+            {'id': component_id, 'expected_revision': revision, 'revision': current.get(component_id)}
+            for component_id, _, _, revision in operations
+            if component_id not in current or (revision is not None and revision != current[component_id])
+        ]
+        if conflicts:
+            raise RevisionConflictError(conflicts)
+        
+        changed = set()
+        for component_id, op, argument, _ in operations:
+            if op == 'set_quantity':
+                updated = conn.execute(
+                    'UPDATE components SET quantity = ? WHERE id = ? AND quantity IS NOT ?',
+                    (argument, component_id, argument)).rowcount
+            elif op == 'adjust_quantity':
+                updated = conn.execute(
+                    'UPDATE components SET quantity = MAX(0, quantity + ?) WHERE id = ? AND MAX(0, quantity + ?) != quantity',
+                    (argument, component_id, argument)).rowcount
+            elif op == 'set_storage':
+                updated = conn.execute(
+                    'UPDATE components SET storage = ? WHERE id = ? AND storage IS NOT ?',
+                    (argument, component_id, argument)).rowcount
+            else:
+                component = conn.execute('SELECT * FROM components WHERE id = ?', (component_id,)).fetchone()
+                updated = _write_component_update(conn, component, argument)
+            if updated:
+                changed.add(component_id)
+        
+        rows = []
+        if changed:
+            # One entry for the batch; clients re-sync the changed rows
+            changed_ids = sorted(changed)
+            _log_change(conn, 'batch', ids=changed_ids, operations=len(operations))
+            for start in range(0, len(changed_ids), SPEC_BATCH_SIZE):
+                batch = changed_ids[start:start + SPEC_BATCH_SIZE]
+                placeholders = ', '.join('?' for _ in batch)
+                rows.extend(conn.execute(
+                    _similarity_query(fields) + f' AND c.id IN ({placeholders}) ORDER BY c.id', batch).fetchall())
+        revision = get_inventory_revision()
+    
+    return {'revision': revision, 'components': _convert_has_similar(_build_result(rows, fields))}
+
+@serialized_write
 def delete_component(component_id):
     """Delete a component from the database"""
-    conn = get_db_connection()
-    
     try:
-        # Check if component exists
-        component = conn.execute('SELECT id FROM components WHERE id = ?', (component_id,)).fetchone()
-        if not component:
-            conn.close()
-            return False
-        
-        # Delete the component
-        conn.execute('DELETE FROM components WHERE id = ?', (component_id,))
+        with transaction() as conn:
+            # Check if component exists
+            component = conn.execute('SELECT id FROM components WHERE id = ?', (component_id,)).fetchone()
+            if not component:
+                return False
+            
+            # Delete the component
+            conn.execute('DELETE FROM components WHERE id = ?', (component_id,))
+            _log_change(conn, 'delete', component_id)
         
-        conn.commit()
-        conn.close()
         return True
     except Exception as e:
         print(f"Error deleting component: {e}")
-        conn.close()
         return False 
 
+@serialized_write
 def mark_components_not_similar(component_id, similar_id):
     """Mark two components as not similar to avoid future duplicate detection"""
-    conn = get_db_connection()
-    
     try:
-        # Check if components exist
-        component1 = conn.execute('SELECT id FROM components WHERE id = ?', (component_id,)).fetchone()
-        component2 = conn.execute('SELECT id FROM components WHERE id = ?', (similar_id,)).fetchone()
-        
-        if not component1 or not component2:
-            conn.close()
-            return False
-        
-        # Add to excluded_similarities table (create this table if it doesn't exist)
-        conn.execute('INSERT OR IGNORE INTO excluded_similarities (component1_id, component2_id) VALUES (?, ?)', 
-                    (component_id, similar_id))
-        
-        # Also add the reverse relationship
-        conn.execute('INSERT OR IGNORE INTO excluded_similarities (component1_id, component2_id) VALUES (?, ?)', 
-                    (similar_id, component_id))
+        with transaction() as conn:
+            # Check if components exist
+            component1 = conn.execute('SELECT id FROM components WHERE id = ?', (component_id,)).fetchone()
+            component2 = conn.execute('SELECT id FROM components WHERE id = ?', (similar_id,)).fetchone()
+            
+            if not component1 or not component2:
+                return False
+            
+            # Add to excluded_similarities table (create this table if it doesn't exist)
+            conn.execute('INSERT OR IGNORE INTO excluded_similarities (component1_id, component2_id) VALUES (?, ?)', 
+                        (component_id, similar_id))
+            
+            # Also add the reverse relationship
+            conn.execute('INSERT OR IGNORE INTO excluded_similarities (component1_id, component2_id) VALUES (?, ?)', 
+                        (similar_id, component_id))
+            _log_change(conn, 'not_similar', component_id, similar_id=similar_id)
         
-        conn.commit()
-        conn.close()
         return True
         
     except Exception as e:
         print(f"Error marking components as not similar: {e}")
-        conn.close()
-        return False 
\ No newline at end of file
+        return False 
@@ -0,0 +1,104 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from database import init_db, release_db_connection, iter_search_results, parse_fields
+from specs import SPEC_KINDS
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+MIME_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+# Rows serialized into each chunk that is written or sent
+ROWS_PER_CHUNK = 200
+
+def iter_csv_chunks(components: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    """Yield CSV text, starting with the header row, a few hundred rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator='\n')
+    writer.writeheader()
+    rows = 0
+    for component in components:
+        writer.writerow(component)
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_jsonl_chunks(components: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Yield JSON lines, a few hundred rows at a time"""
+    lines = []
+    for component in components:
+        lines.append(json.dumps(component) + '\n')
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+def export_components(fmt: str = 'csv', query: Optional[str] = None, filters: Optional[Dict[str, Any]] = None,
+                      order: Optional[str] = None, fields=None) -> Iterator[str]:
+    """
+    Stream the components matching a search (see search_components) as CSV or JSON lines
+
+    Components are read from a database cursor while the text is produced,
+    so an export of any size uses the same memory. Bad formats, fields or
+    filters raise ValueError at once; the database is only read once the
+    first chunk is asked for. The CSV columns are the ones importer.py reads,
+    so an export can be imported again.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    fields = parse_fields(fields)
+    components = iter_search_results(query, filters, order, fields)
+    if fmt == 'csv':
+        return iter_csv_chunks(components, fields)
+    return iter_jsonl_chunks(components)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Export components as CSV or JSON lines')
+    arg_parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format')
+    arg_parser.add_argument('--output', help='File to write (default: standard output)')
+    arg_parser.add_argument('--query', help='Search text, as in the search bar')
+    arg_parser.add_argument('--category', action='append', dest='categories',
+                            help='Only export this category (repeatable)')
+    arg_parser.add_argument('--min-quantity', type=int)
+    arg_parser.add_argument('--max-quantity', type=int)
+    arg_parser.add_argument('--storage', help='Storage location containing this text')
+    arg_parser.add_argument('--package', action='append', help='Package code, e.g. 0603 (repeatable)')
+    arg_parser.add_argument('--spec', action='append', default=[], metavar='min_<kind>=VALUE',
+                            help=f"Spec value filter, kinds: {', '.join(SPEC_KINDS)} (e.g. min_resistance=4.7k)")
+    arg_parser.add_argument('--fields', help='Comma-separated columns to export (default: all)')
+    args = arg_parser.parse_args()
+
+    filters = {
+        'categories': args.categories,
+        'min_quantity': args.min_quantity,
+        'max_quantity': args.max_quantity,
+        'storage': args.storage,
+        'package': args.package
+    }
+    for spec in args.spec:
+        key, _, value = spec.partition('=')
+        key = key.strip()
+        if key.partition('_')[0] not in ('min', 'max') or key.partition('_')[2] not in SPEC_KINDS:
+            arg_parser.error(f"Unknown spec filter: {key}")
+        filters[key] = value.strip()
+
+    init_db()
+    try:
+        chunks = export_components(args.format, args.query, filters, fields=args.fields)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(chunks)
+    else:
+        sys.stdout.writelines(chunks)
+    release_db_connection()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import hashlib
+import io
+import os
+import time
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import llm_cache
+from database import init_db, transaction, get_db_connection, serialized_write
+
+# Pillow is optional: without it images are sent as uploaded (HEIC is refused)
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+else:
+    try:
+        # HEIC support for Pillow, also optional
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+# The vision model fits images within 2048x2048 and then scales the short side
+# down to 768 pixels, so larger images only cost upload time
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 2048))
+IMAGE_MAX_SHORT_SIDE = int(os.getenv('IMAGE_MAX_SHORT_SIDE', 768))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+# Opt-in: uploads of the same prepared size whose perceptual hashes differ in
+# at most this many of 4096 bits reuse an earlier extraction. Off (-1) by
+# default, so only identical files reuse one: pages of text, like two order
+# slips, can look alike to any image hash.
+IMAGE_HASH_DISTANCE = int(os.getenv('IMAGE_HASH_DISTANCE', -1))
+
+CHUNK_SIZE = 64 * 1024
+# Side of the perceptual hash grid; HASH_SIZE ** 2 bits
+HASH_SIZE = 64
+
+# Formats the vision model accepts as they are
+VISION_FORMATS = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+_HEIC_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1'}
+_ORIENTATION_TAG = 0x0112
+
+def detect_format(header: bytes) -> Optional[str]:
+    """Mime type of an image from its first bytes, or None when it is not a supported image"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:8] == b'ftyp' and header[8:12] in _HEIC_BRANDS:
+        return 'image/heic'
+    return None
+
+def spool(stream: BinaryIO, path: str) -> Dict[str, Any]:
+    """
+    Copy an upload to path in chunks, hashing it on the way
+
+    Returns:
+        Dict with the detected mime_type (None for unsupported files),
+        the sha256 content_hash and the size in bytes
+    """
+    digest = hashlib.sha256()
+    header = b''
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(header) < 16:
+                header += chunk[:16]
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return {'mime_type': detect_format(header), 'content_hash': digest.hexdigest(), 'size': size}
+
+def inspect(path: str) -> Dict[str, Any]:
+    """Same as spool for a file already on disk"""
+    with open(path, 'rb') as f:
+        return spool(f, os.devnull)
+
+def _target_size(width: int, height: int):
+    scale = min(1.0, IMAGE_MAX_DIMENSION / max(width, height), IMAGE_MAX_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def perceptual_hash(image) -> str:
+    """
+    4096-bit difference hash of a Pillow image, as hex
+
+    Each bit says whether a pixel of a 65x64 grayscale thumbnail is brighter
+    than its right neighbour, so recompressed, resized or re-sent copies of a
+    photo get nearly the same hash. The grid is fine enough to tell most
+    printed pages apart, which a 16x16 one cannot.
+    """
+    pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            index = row * (HASH_SIZE + 1) + column
+            bits = bits << 1 | (pixels[index] > pixels[index + 1])
+    return f'{bits:0{HASH_SIZE * HASH_SIZE // 4}x}'
+
+def prepare(path: str, mime_type: str) -> Dict[str, Any]:
+    """
+    Image to send to the vision model
+
+    With Pillow the image is turned upright from its EXIF orientation,
+    downscaled to what the model looks at and recompressed as JPEG. Without
+    it the file is sent unchanged.
+
+    Returns:
+        Dict with data (bytes), mime_type, perceptual_hash and the prepared
+        width and height (both None without Pillow)
+    """
+    if Image is None:
+        if mime_type not in VISION_FORMATS:
+            raise ValueError('Converting this image format requires Pillow (pip install Pillow pillow-heif).')
+        with open(path, 'rb') as f:
+            return {'data': f.read(), 'mime_type': mime_type, 'perceptual_hash': None, 'width': None, 'height': None}
+
+    with Image.open(path) as original:
+        uploaded_size = original.size
+        rotated = original.getexif().get(_ORIENTATION_TAG, 1) != 1
+        # JPEGs are decoded at a reduced scale directly, which is much faster
+        original.draft('RGB', _target_size(*uploaded_size))
+        image = ImageOps.exif_transpose(original)
+        size = _target_size(*image.size)
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        hash_value = perceptual_hash(image)
+
+        unchanged = size == uploaded_size and not rotated and not getattr(original, 'is_animated', False)
+        if unchanged and mime_type in VISION_FORMATS:
+            with open(path, 'rb') as f:
+                return {'data': f.read(), 'mime_type': mime_type, 'perceptual_hash': hash_value,
+                        'width': size[0], 'height': size[1]}
+
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+        return {'data': buffer.getvalue(), 'mime_type': 'image/jpeg', 'perceptual_hash': hash_value,
+                'width': size[0], 'height': size[1]}
+
+def cache_key(content_hash: str, model: str, prompt_version: str) -> str:
+    """LLM cache key of the extraction for an image file"""
+    return llm_cache.cache_key(f'image:{content_hash}', model, prompt_version)
+
+def _distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def find_similar_extraction(prepared: Dict[str, Any], model: str,
+                            prompt_version: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Cached extraction of an earlier image that looks the same, or None
+
+    Only used when IMAGE_HASH_DISTANCE is set. A match must also have been
+    prepared at exactly the same size, i.e. have the same aspect ratio.
+    """
+    hash_value = prepared['perceptual_hash']
+    if hash_value is None or IMAGE_HASH_DISTANCE < 0:
+        return None
+    init_db()
+    rows = get_db_connection().execute('''
+        SELECT h.key, h.perceptual_hash
+        FROM image_hashes h
+        JOIN llm_cache c ON c.key = h.key
+        WHERE c.model = ? AND c.prompt_version = ? AND h.width = ? AND h.height = ?
+    ''', (model, prompt_version, prepared['width'], prepared['height'])).fetchall()
+    matches = sorted((_distance(hash_value, row['perceptual_hash']), row['key']) for row in rows)
+    for distance, key in matches:
+        if distance > IMAGE_HASH_DISTANCE:
+            break
+        result = llm_cache.get(key)
+        if result is not None:
+            return result
+        # The extraction expired from the LLM cache
+        _forget_hash(key)
+    return None
+
+@serialized_write
+def _forget_hash(key):
+    with transaction() as conn:
+        conn.execute('DELETE FROM image_hashes WHERE key = ?', (key,))
+
+def remember_extraction(key: str, prepared: Dict[str, Any], components: List[Dict[str, Any]],
+                        model: str, prompt_version: str):
+    """Cache an extraction under the file's key and, when known, the prepared image's perceptual hash"""
+    llm_cache.put(key, components, model, prompt_version)
+    if prepared['perceptual_hash'] is not None:
+        _store_hash(key, prepared)
+
+@serialized_write
+def _store_hash(key, prepared):
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO image_hashes (key, perceptual_hash, width, height, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (key, prepared['perceptual_hash'], prepared['width'], prepared['height'], time.time()))
+        # Drop hashes whose extraction the cache has evicted
+        conn.execute('DELETE FROM image_hashes WHERE key NOT IN (SELECT key FROM llm_cache)')
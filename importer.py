@@ -0,0 +1,169 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+from database import init_db, add_components_bulk
+from parser import parse_component
+
+DEFAULT_CHUNK_SIZE = 500
+# Only the first errors are kept in the report; the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+def detect_format(filename: Optional[str], default: str = 'csv') -> str:
+    """Guess the import format from a file name"""
+    if filename:
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in ('.jsonl', '.ndjson', '.json'):
+            return 'jsonl'
+        if extension in ('.csv', '.txt'):
+            return 'csv'
+    return default
+
+def iter_csv_rows(stream: TextIO) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, row dict) from a CSV stream with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def iter_jsonl_rows(stream: TextIO) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, value) from a JSON-lines stream, skipping blank lines"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+def row_to_component(row: Any, use_parser: bool = False) -> Dict[str, Any]:
+    """
+    Turn one imported row into a component dict for add_components_bulk
+
+    Rows are either structured (name, category, specifications, source,
+    quantity, storage) or free text, given as a plain JSON string or an
+    'input' column. Free text is run through the regex parser when use_parser
+    is set.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if isinstance(row, str):
+        row = {'input': row}
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object or a string')
+
+    text = (row.get('input') or '').strip()
+    if text and not row.get('name'):
+        if not use_parser:
+            raise ValueError('Free-text row requires parsing to be enabled')
+        component = parse_component(text, use_llm=False)
+        if row.get('storage'):
+            component['storage'] = row['storage']
+        return component
+
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('Missing component name')
+
+    quantity = row.get('quantity')
+    if quantity in (None, ''):
+        quantity = 1
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid quantity: {quantity!r}")
+    if quantity < 0:
+        raise ValueError(f"Invalid quantity: {quantity}")
+
+    specifications = row.get('specifications') or ''
+    if isinstance(specifications, dict):
+        specifications = json.dumps(specifications)
+
+    return {
+        'name': name,
+        'category': (row.get('category') or '').strip() or 'Uncategorized',
+        'specifications': specifications,
+        'source': row.get('source') or '',
+        'quantity': quantity,
+        'storage': row.get('storage') or ''
+    }
+
+def import_components(stream: TextIO, fmt: str = 'csv', use_parser: bool = False,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Stream components from a CSV or JSON-lines file into the database
+
+    Rows are inserted in transactions of chunk_size rows, so memory use does
+    not grow with the size of the file. If a chunk fails, its rows are retried
+    one by one so that only the bad rows are reported.
+
+    Returns:
+        Report with imported/failed counts, per-row errors and throughput
+    """
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Unsupported import format: {fmt}")
+    rows = iter_csv_rows(stream) if fmt == 'csv' else iter_jsonl_rows(stream)
+
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    started = time.perf_counter()
+
+    def record_error(line_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_number, 'error': str(error)})
+
+    def flush(chunk):
+        try:
+            report['imported'] += add_components_bulk([c for _, c in chunk])
+        except Exception:
+            for line_number, component in chunk:
+                try:
+                    report['imported'] += add_components_bulk([component])
+                except Exception as e:
+                    record_error(line_number, e)
+
+    chunk = []
+    for line_number, row in rows:
+        try:
+            chunk.append((line_number, row_to_component(row, use_parser)))
+        except Exception as e:
+            record_error(line_number, e)
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round((report['imported'] + report['failed']) / elapsed, 1) if elapsed else None
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    return report
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Bulk import components from CSV or JSON lines')
+    arg_parser.add_argument('file', help="File to import, or '-' for standard input")
+    arg_parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file name)')
+    arg_parser.add_argument('--parse', action='store_true',
+                            help='Run free-text rows through the regex parser')
+    arg_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows per insert transaction')
+    args = arg_parser.parse_args()
+
+    init_db()
+    fmt = args.format or detect_format(args.file)
+    if args.file == '-':
+        report = import_components(sys.stdin, fmt, args.parse, args.chunk_size)
+    else:
+        with open(args.file, encoding='utf-8-sig', newline='') as stream:
+            report = import_components(stream, fmt, args.parse, args.chunk_size)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from database import init_db, transaction, get_db_connection, release_db_connection, serialized_write
+
+# Number of background worker threads in this process
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# Submissions are refused once this many jobs are waiting
+MAX_PENDING_JOBS = int(os.getenv('MAX_PENDING_JOBS', 50))
+# How long idle workers sleep before re-checking the table (other processes may enqueue)
+POLL_INTERVAL_SECONDS = 2.0
+# Finished jobs are removed after this long
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+# A running job whose process has not renewed its lease (updated_at) for this
+# long is presumed dead and queued again; leases are renewed three times as often
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+class LeaseLostError(Exception):
+    """Raised when a job was given to another worker before this one saved its results"""
+
+# kind -> handler(job, report_progress) returning a JSON-serializable result
+_handlers = {}
+_wakeup = threading.Condition()
+_workers = []
+_started = False
+_start_lock = threading.Lock()
+# Identifies this process's claims (claimed_by); set by start_workers
+_process_id = None
+
+def register_handler(kind: str, handler: Callable[[Dict[str, Any], Callable], Any]):
+    """Register the function that processes jobs of the given kind"""
+    _handlers[kind] = handler
+
+def _job_to_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'progress': row['progress'],
+        'stage': row['stage'],
+        'payload': json.loads(row['payload']) if row['payload'] else None,
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'claimed_by': row['claimed_by']
+    }
+
+def submit_job(kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+    """Queue a job and return its id; raises QueueFullError when the queue is full"""
+    init_db()
+    job_id = job_id or uuid.uuid4().hex
+    _insert_job(job_id, kind, payload)
+
+    # After the commit, so the woken worker finds the job
+    with _wakeup:
+        _wakeup.notify()
+    return job_id
+
+@serialized_write
+def _insert_job(job_id, kind, payload):
+    now = time.time()
+    with transaction() as conn:
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+        if pending >= MAX_PENDING_JOBS:
+            raise QueueFullError(f"{pending} jobs are already waiting")
+
+        conn.execute('''
+            INSERT INTO jobs (id, kind, status, progress, stage, payload, created_at, updated_at)
+            VALUES (?, ?, 'queued', 0, 'Queued', ?, ?, ?)
+        ''', (job_id, kind, json.dumps(payload), now, now))
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Current status, progress and result of a job"""
+    init_db()
+    row = get_db_connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_to_dict(row) if row else None
+
+def has_pending_job(kind: str) -> bool:
+    """Whether a job of this kind is queued or running"""
+    init_db()
+    return get_db_connection().execute(
+        "SELECT 1 FROM jobs WHERE kind = ? AND status IN ('queued', 'running') LIMIT 1", (kind,)
+    ).fetchone() is not None
+
+def update_job(job_id: str, **fields):
+    """Set status/progress/stage/result/error on a job"""
+    _update_job(job_id, None, fields)
+
+@serialized_write
+def _update_job(job_id, owner, fields):
+    # With an owner, only while that process still holds the job's lease
+    if 'result' in fields:
+        fields['result'] = json.dumps(fields['result'])
+    fields['updated_at'] = time.time()
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    sql = f'UPDATE jobs SET {assignments} WHERE id = ?'
+    params = [*fields.values(), job_id]
+    if owner is not None:
+        sql += ' AND claimed_by = ?'
+        params.append(owner)
+    with transaction() as conn:
+        conn.execute(sql, params)
+
+def _renew_leases():
+    """Heartbeat: renew this process's running jobs and requeue jobs whose lease expired"""
+    requeued = _update_leases()
+    if requeued:
+        print(f"Requeued {requeued} job(s) whose worker stopped renewing its lease")
+        with _wakeup:
+            _wakeup.notify_all()
+
+@serialized_write
+def _update_leases():
+    now = time.time()
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE status = 'running' AND claimed_by = ?",
+                     (now, _process_id))
+        return conn.execute(
+            "UPDATE jobs SET status = 'queued', progress = 0, stage = 'Queued', claimed_by = NULL "
+            "WHERE status = 'running' AND updated_at < ?", (now - JOB_LEASE_SECONDS,)
+        ).rowcount
+
+def _heartbeat_loop():
+    while True:
+        try:
+            _renew_leases()
+        except Exception as e:
+            print(f"Job heartbeat error: {e}")
+        finally:
+            release_db_connection()
+        time.sleep(JOB_LEASE_SECONDS / 3)
+
+@serialized_write
+def _claim_next_job():
+    """Atomically move the oldest queued job to running, leased to this process"""
+    conn = get_db_connection()
+    while True:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        with transaction() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', claimed_by = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (_process_id, time.time(), row['id'])
+            ).rowcount
+        # Another worker may have taken it first
+        if claimed:
+            job = _job_to_dict(row)
+            job['claimed_by'] = _process_id
+            return job
+
+@serialized_write
+def write_if_leased(job: Dict[str, Any], write: Callable, *args) -> Any:
+    """
+    Run write(*args) in one transaction with a check that this process still
+    holds the job's lease
+
+    Handlers save their results with this, so a job that was requeued while
+    its worker was stalled is not saved twice. Raises LeaseLostError, writing
+    nothing, when the lease has passed on.
+    """
+    with transaction() as conn:
+        owned = conn.execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND claimed_by = ? AND status = 'running'",
+            (time.time(), job['id'], _process_id)
+        ).rowcount
+        if not owned:
+            raise LeaseLostError(f"Job {job['id']} is no longer leased to this process")
+        return write(*args)
+
+def _run_job(job):
+    handler = _handlers.get(job['kind'])
+    if handler is None:
+        _update_job(job['id'], _process_id, {'status': 'failed',
+                                             'error': f"No handler for job kind '{job['kind']}'"})
+        return
+
+    def report_progress(progress, stage=None):
+        _update_job(job['id'], _process_id, {'progress': int(progress), 'stage': stage})
+
+    try:
+        result = handler(job, report_progress)
+        _update_job(job['id'], _process_id, {'status': 'done', 'progress': 100, 'stage': 'Done', 'result': result})
+    except LeaseLostError as e:
+        # The worker that took the job over reports its outcome
+        print(f"Job {job['id']} abandoned: {e}")
+    except Exception as e:
+        print(f"Job {job['id']} failed: {e}")
+        traceback.print_exc()
+        _update_job(job['id'], _process_id, {'status': 'failed', 'stage': 'Failed', 'error': str(e)})
+
+def _worker_loop():
+    while True:
+        try:
+            job = _claim_next_job()
+            if job is not None:
+                _run_job(job)
+                continue
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        finally:
+            release_db_connection()
+
+        with _wakeup:
+            _wakeup.wait(timeout=POLL_INTERVAL_SECONDS)
+
+@serialized_write
+def _prune_finished_jobs():
+    with transaction() as conn:
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                     (time.time() - JOB_RETENTION_SECONDS,))
+
+def start_workers():
+    """Start the worker pool once per process and resume interrupted jobs
+
+    Jobs are only taken back from processes that stopped renewing their lease,
+    so workers in other live processes keep theirs.
+    """
+    global _started, _process_id
+    with _start_lock:
+        if _started:
+            return
+        init_db()
+        # Set here, not at import, so forked server processes each get their own
+        _process_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        _prune_finished_jobs()
+        # Jobs that were running when their server stopped are started over
+        _renew_leases()
+
+        threading.Thread(target=_heartbeat_loop, name='job-heartbeat', daemon=True).start()
+
+        for index in range(JOB_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f'job-worker-{index}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+        _started = True
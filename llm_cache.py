@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from database import init_db, transaction, get_db_connection, serialized_write
+
+# Bounds for the persistent cache (shared by every worker using inventory.db)
+CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 10000))
+CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+# Size of the in-process LRU in front of the SQLite table
+FRONT_CACHE_SIZE = int(os.getenv('LLM_CACHE_FRONT_SIZE', 256))
+
+_lock = threading.Lock()
+# key -> (result JSON, created_at), most recently used last
+_front_cache = OrderedDict()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+def _bump(stat, amount=1):
+    with _lock:
+        _stats[stat] += amount
+
+def normalize_input(text: str) -> str:
+    """Canonical form of an input text: NFC, trimmed, whitespace collapsed"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+def cache_key(text: str, model: str, prompt_version: str) -> str:
+    """Content address of an LLM request"""
+    payload = json.dumps([normalize_input(text), model, prompt_version])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _remember(key, result_json, created_at):
+    with _lock:
+        _front_cache[key] = (result_json, created_at)
+        _front_cache.move_to_end(key)
+        while len(_front_cache) > FRONT_CACHE_SIZE:
+            _front_cache.popitem(last=False)
+
+def get(key: str) -> Optional[Any]:
+    """Return the cached result for key, or None on a miss or expired entry"""
+    now = time.time()
+
+    with _lock:
+        entry = _front_cache.get(key)
+        if entry is not None:
+            if now - entry[1] < CACHE_TTL_SECONDS:
+                _front_cache.move_to_end(key)
+                _stats['memory_hits'] += 1
+                return json.loads(entry[0])
+            del _front_cache[key]
+
+    init_db()
+    row = get_db_connection().execute(
+        'SELECT result, created_at FROM llm_cache WHERE key = ?', (key,)
+    ).fetchone()
+
+    if row is None or now - row['created_at'] >= CACHE_TTL_SECONDS:
+        if row is not None:
+            _delete(key)
+        _bump('misses')
+        return None
+
+    _touch(key, now)
+    _remember(key, row['result'], row['created_at'])
+    _bump('db_hits')
+    return json.loads(row['result'])
+
+@serialized_write
+def _delete(key):
+    with transaction() as conn:
+        conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+
+@serialized_write
+def _touch(key, now):
+    with transaction() as conn:
+        conn.execute('UPDATE llm_cache SET last_used_at = ? WHERE key = ?', (now, key))
+
+def put(key: str, result: Any, model: str, prompt_version: str):
+    """Store a result, evicting expired and least recently used entries"""
+    now = time.time()
+    result_json = json.dumps(result)
+
+    init_db()
+    evicted = _store(key, model, prompt_version, result_json, now)
+
+    _remember(key, result_json, now)
+    _bump('stores')
+    if evicted:
+        _bump('evictions', evicted)
+
+@serialized_write
+def _store(key, model, prompt_version, result_json, now):
+    """Insert an entry and evict; returns the number of entries evicted"""
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO llm_cache (key, model, prompt_version, result, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (key, model, prompt_version, result_json, now, now))
+
+        evicted = conn.execute('DELETE FROM llm_cache WHERE created_at <= ?',
+                               (now - CACHE_TTL_SECONDS,)).rowcount
+        overflow = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0] - CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted += conn.execute('''
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used_at LIMIT ?
+                )
+            ''', (overflow,)).rowcount
+    return evicted
+
+@serialized_write
+def clear():
+    """Drop every cached result"""
+    init_db()
+    with transaction() as conn:
+        conn.execute('DELETE FROM llm_cache')
+    with _lock:
+        _front_cache.clear()
+
+def get_stats() -> Dict[str, Any]:
+    """Hit/miss counters for this process plus the size of both cache levels"""
+    init_db()
+    entries = get_db_connection().execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_entries'] = len(_front_cache)
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 3) if lookups else None
+    stats['db_entries'] = entries
+    return stats
@@ -1,39 +1,165 @@
 import os
 import json
+import re
 import requests
 import base64
-from typing import Dict, Any, Optional, List
+import time
+from typing import Dict, Any, Iterator, Optional, List
 from openai import OpenAI
 from dotenv import load_dotenv
+import llm_cache
+import metrics
+from circuit_breaker import get_breaker, CircuitOpenError
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Deadlines for one completion, in seconds. The client does not retry by
+# default (LLM_MAX_RETRIES), so a call never takes much longer than this.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 10))
+LLM_BATCH_TIMEOUT_SECONDS = float(os.getenv("LLM_BATCH_TIMEOUT_SECONDS", 30))
+LLM_IMAGE_TIMEOUT_SECONDS = float(os.getenv("LLM_IMAGE_TIMEOUT_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 0))
+
+TIMEOUTS = {
+    'parse': LLM_TIMEOUT_SECONDS,
+    'parse_stream': LLM_TIMEOUT_SECONDS,
+    'parse_batch': LLM_BATCH_TIMEOUT_SECONDS,
+    'image': LLM_IMAGE_TIMEOUT_SECONDS,
+}
+
 # Configure OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=LLM_MAX_RETRIES)
 
-def parse_with_llm(input_text: str) -> Dict[str, Any]:
-    """
-    Use an LLM to parse hardware component descriptions into structured data
-    
-    Args:
-        input_text: Natural language description of a hardware component
+# Model used for text parsing
+LLM_MODEL = "gpt-3.5-turbo"
+# Bump whenever the parsing prompt changes so cached results are not reused
+PROMPT_VERSION = "1"
+# Vision model for image uploads, and the version of its prompt
+IMAGE_MODEL = "gpt-4-turbo"
+IMAGE_PROMPT_VERSION = "1"
+
+# Batch requests are sized so the expected answer fits in this many tokens
+BATCH_MAX_TOKENS = 3000
+# Rough cost of one parsed object in the answer, on top of echoing its input
+BATCH_TOKENS_PER_ITEM = 60
+
+SYSTEM_PROMPT = "You are a hardware inventory assistant that extracts structured data from natural language descriptions."
+
+REQUIRED_FIELDS = ['name', 'category', 'specifications', 'source', 'quantity']
+
+# Default fallback values
+DEFAULT_RESULT = {
+    'name': '',
+    'category': 'Uncategorized',
+    'specifications': '',
+    'source': '',
+    'quantity': 1
+}
+
+def _extract_json_text(result_text: str) -> str:
+    """Strip the markdown code fences LLMs sometimes wrap JSON in"""
+    if "```json" in result_text:
+        # Extract JSON from code block
+        json_start = result_text.find("```json") + 7
+        json_end = result_text.find("```", json_start)
+        result_text = result_text[json_start:json_end].strip()
+    elif "```" in result_text:
+        # Extract JSON from generic code block
+        json_start = result_text.find("```") + 3
+        json_end = result_text.find("```", json_start)
+        result_text = result_text[json_start:json_end].strip()
+    return result_text
+
+def _normalize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in missing fields and coerce the LLM's values to the stored types"""
+    # Validate and ensure all required fields are present
+    for field in REQUIRED_FIELDS:
+        if field not in result:
+            result[field] = DEFAULT_RESULT[field]
+            
+    # Make sure quantity is an integer
+    try:
+        result['quantity'] = int(result['quantity'])
+    except (ValueError, TypeError):
+        result['quantity'] = 1
         
-    Returns:
-        Dictionary containing parsed component data
-    """
-    # Default fallback values
-    default_result = {
-        'name': '',
-        'category': 'Uncategorized',
-        'specifications': '',
-        'source': '',
-        'quantity': 1
-    }
+    # Convert any dictionary fields to strings
+    for field in ['name', 'specifications', 'source', 'category']:
+        if isinstance(result[field], dict):
+            # Convert dictionary to a JSON string
+            result[field] = json.dumps(result[field])
+        elif not isinstance(result[field], str):
+            # Convert any non-string values to strings
+            result[field] = str(result[field])
     
+    return result
+
+def _create_completion(operation: str, **kwargs):
+    """
+    client.chat.completions.create, recording latency and token usage under operation
+
+    Each model has a circuit breaker: while it is open this raises
+    CircuitOpenError without calling OpenAI. The operation's deadline from
+    TIMEOUTS applies unless a timeout is passed.
+    """
+    breaker = get_breaker(f"openai:{kwargs['model']}")
+    generation = breaker.before_call()
+    kwargs.setdefault('timeout', TIMEOUTS[operation])
+    started = time.perf_counter()
     try:
-        # Create a prompt for the LLM
-        prompt = f"""
+        response = client.chat.completions.create(**kwargs)
+    except Exception:
+        breaker.record_failure(generation)
+        metrics.observe_llm(operation, kwargs['model'], time.perf_counter() - started, 'error')
+        raise
+    breaker.record_success(generation)
+    metrics.observe_llm(operation, kwargs['model'], time.perf_counter() - started, 'ok',
+                        getattr(response, 'usage', None))
+    return response
+
+def _stream_completion(operation: str, **kwargs) -> Iterator[str]:
+    """
+    Streaming version of _create_completion, yielding the answer text piece by piece
+
+    The whole answer must arrive within the operation's deadline. Closing the
+    generator (e.g. when the browser goes away) closes the OpenAI stream, so
+    generation stops.
+    """
+    breaker = get_breaker(f"openai:{kwargs['model']}")
+    generation = breaker.before_call()
+    deadline = TIMEOUTS[operation]
+    kwargs.setdefault('timeout', deadline)
+    started = time.perf_counter()
+    outcome = 'error'
+    usage = None
+    response = None
+    try:
+        response = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+        for chunk in response:
+            if time.perf_counter() - started > deadline:
+                raise TimeoutError(f"LLM answer not complete after {deadline}s")
+            usage = getattr(chunk, 'usage', None) or usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        outcome = 'ok'
+    except GeneratorExit:
+        # Cancelled by the caller; the backend itself was answering
+        outcome = 'cancelled'
+        raise
+    finally:
+        if response is not None:
+            response.close()
+        if outcome == 'error':
+            breaker.record_failure(generation)
+        else:
+            breaker.record_success(generation)
+        metrics.observe_llm(operation, kwargs['model'], time.perf_counter() - started, outcome, usage)
+
+def _parse_messages(input_text: str) -> List[Dict[str, str]]:
+    """Chat messages asking the LLM to parse one description"""
+    # Create a prompt for the LLM
+    prompt = f"""
         Parse the following hardware component description into a structured format.
         Extract the following information:
         - Component name
@@ -47,65 +173,222 @@ def parse_with_llm(input_text: str) -> Dict[str, Any]:
         Return ONLY a valid JSON object with these keys: name, category, specifications, source, quantity.
         The quantity should be an integer. If any information is missing, provide reasonable defaults.
         """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_with_llm(input_text: str) -> Dict[str, Any]:
+    """
+    Use an LLM to parse hardware component descriptions into structured data
+    
+    Args:
+        input_text: Natural language description of a hardware component
         
+    Returns:
+        Dictionary containing parsed component data
+    """
+    # Identical requests (e.g. preview, then add) are answered from the cache
+    key = llm_cache.cache_key(input_text, LLM_MODEL, PROMPT_VERSION)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    try:
         # Call the OpenAI API using the new interface
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # Use a more capable model if needed
-            messages=[
-                {"role": "system", "content": "You are a hardware inventory assistant that extracts structured data from natural language descriptions."},
-                {"role": "user", "content": prompt}
-            ],
+        response = _create_completion(
+            'parse',
+            model=LLM_MODEL,  # Use a more capable model if needed
+            messages=_parse_messages(input_text),
             temperature=0.2,  # Lower temperature for more consistent results
             max_tokens=500
         )
         
         # Extract the response content using the new interface
         result_text = response.choices[0].message.content.strip()
+        result = _normalize_result(json.loads(_extract_json_text(result_text)))
         
-        # Parse the JSON response
-        # Sometimes LLMs add markdown code blocks, so we need to clean that up
-        if "```json" in result_text:
-            # Extract JSON from code block
-            json_start = result_text.find("```json") + 7
-            json_end = result_text.find("```", json_start)
-            result_text = result_text[json_start:json_end].strip()
-        elif "```" in result_text:
-            # Extract JSON from generic code block
-            json_start = result_text.find("```") + 3
-            json_end = result_text.find("```", json_start)
-            result_text = result_text[json_start:json_end].strip()
-            
-        result = json.loads(result_text)
-        
-        # Validate and ensure all required fields are present
-        required_fields = ['name', 'category', 'specifications', 'source', 'quantity']
-        for field in required_fields:
-            if field not in result:
-                result[field] = default_result[field]
-                
-        # Make sure quantity is an integer
-        try:
-            result['quantity'] = int(result['quantity'])
-        except (ValueError, TypeError):
-            result['quantity'] = 1
-            
-        # Convert any dictionary fields to strings
-        for field in ['name', 'specifications', 'source', 'category']:
-            if isinstance(result[field], dict):
-                # Convert dictionary to a JSON string
-                result[field] = json.dumps(result[field])
-            elif not isinstance(result[field], str):
-                # Convert any non-string values to strings
-                result[field] = str(result[field])
-            
+        llm_cache.put(key, result, LLM_MODEL, PROMPT_VERSION)
         return result
         
+    except CircuitOpenError:
+        # OpenAI has been failing; go straight to the regex parser
+        from parser import parse_component
+        return parse_component(input_text, use_llm=False)
     except Exception as e:
         print(f"Error using LLM to parse input: {str(e)}")
         # Fallback to basic parsing if LLM fails
         from parser import parse_component
         return parse_component(input_text, use_llm=False)
 
+def _estimate_tokens(text: str) -> int:
+    # About four characters per token for English text and part numbers
+    return len(text) // 4 + 1
+
+# A "key": value pair whose value is complete: a JSON string or a number
+_FIELD_REGEX = re.compile(r'"(\w+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?)\s*[,}\n]')
+
+def stream_parse_with_llm(input_text: str) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a description with the streaming API, reporting fields as they arrive
+
+    Yields {'fields': {...}} each time more fields of the answer are complete,
+    then {'result': parsed component, 'cached': bool} with the full result,
+    which is cached like parse_with_llm's. Errors (including CircuitOpenError)
+    are raised to the caller.
+    """
+    key = llm_cache.cache_key(input_text, LLM_MODEL, PROMPT_VERSION)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        yield {'result': cached, 'cached': True}
+        return
+    
+    text = ''
+    seen = {}
+    for piece in _stream_completion('parse_stream', model=LLM_MODEL, messages=_parse_messages(input_text),
+                                    temperature=0.2, max_tokens=500):
+        text += piece
+        fields = {}
+        for match in _FIELD_REGEX.finditer(text):
+            name, value = match.group(1), json.loads(match.group(2))
+            if name in REQUIRED_FIELDS and seen.get(name) != value:
+                fields[name] = seen[name] = value
+        if fields:
+            yield {'fields': _normalize_partial(fields)}
+    
+    result = _normalize_result(json.loads(_extract_json_text(text.strip())))
+    llm_cache.put(key, result, LLM_MODEL, PROMPT_VERSION)
+    yield {'result': result, 'cached': False}
+
+def _normalize_partial(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """The same coercions as _normalize_result, for the fields that arrived so far"""
+    normalized = {}
+    for name, value in fields.items():
+        if name == 'quantity':
+            try:
+                value = int(value)
+            except (ValueError, TypeError):
+                value = 1
+        elif not isinstance(value, str):
+            value = str(value)
+        normalized[name] = value
+    return normalized
+
+def plan_batches(input_texts: List[str], max_tokens: int = BATCH_MAX_TOKENS) -> List[List[int]]:
+    """
+    Group inputs (by index) into batches whose expected answer fits max_tokens
+    """
+    batches = []
+    current = []
+    budget = 0
+    for index, text in enumerate(input_texts):
+        cost = BATCH_TOKENS_PER_ITEM + _estimate_tokens(text)
+        if current and budget + cost > max_tokens:
+            batches.append(current)
+            current = []
+            budget = 0
+        current.append(index)
+        budget += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _parse_batch_with_llm(input_texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Parse several descriptions with one completion
+
+    Raises ValueError if the answer is not a JSON array matching the inputs.
+    """
+    numbered = '\n'.join(f"{index}. {json.dumps(text)}" for index, text in enumerate(input_texts))
+    prompt = f"""
+        Parse each of the following hardware component descriptions into a structured format.
+        For each one extract the component name, category (resistor, capacitor, IC, connector, etc.),
+        specifications (values, ratings, package type, etc.), source/vendor information and quantity.
+        
+        Inputs:
+        {numbered}
+        
+        Return ONLY a valid JSON array with exactly {len(input_texts)} objects, in the same order as the inputs.
+        Each object has these keys: index (the input number), name, category, specifications, source, quantity.
+        The quantity should be an integer. If any information is missing, provide reasonable defaults.
+        """
+    expected_tokens = sum(BATCH_TOKENS_PER_ITEM + _estimate_tokens(text) for text in input_texts)
+    
+    response = _create_completion(
+        'parse_batch',
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.2,
+        max_tokens=min(BATCH_MAX_TOKENS, expected_tokens * 2)
+    )
+    
+    results = json.loads(_extract_json_text(response.choices[0].message.content.strip()))
+    if not isinstance(results, list) or len(results) != len(input_texts):
+        raise ValueError(f"Expected a JSON array of {len(input_texts)} objects")
+    if not all(isinstance(result, dict) for result in results):
+        raise ValueError("Batch answer contains non-object entries")
+    
+    # Trust explicit indexes over array order when the model provides them all
+    indexes = [result.get('index') for result in results]
+    if all(isinstance(index, int) for index in indexes) and sorted(indexes) == list(range(len(input_texts))):
+        results = sorted(results, key=lambda result: result['index'])
+    
+    parsed = []
+    for result in results:
+        result.pop('index', None)
+        parsed.append(_normalize_result(result))
+    return parsed
+
+def parse_many_with_llm(input_texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Parse a list of descriptions, packing them into as few completions as possible
+    
+    Cached inputs are answered without a call, duplicates are parsed once, and a
+    batch whose answer cannot be used is retried one description at a time.
+    
+    Returns:
+        Parsed component dicts in the same order as input_texts
+    """
+    results = [None] * len(input_texts)
+    keys = [llm_cache.cache_key(text, LLM_MODEL, PROMPT_VERSION) for text in input_texts]
+    
+    # key -> positions still waiting for a result
+    pending = {}
+    for position, key in enumerate(keys):
+        if key in pending:
+            pending[key].append(position)
+            continue
+        cached = llm_cache.get(key)
+        if cached is not None:
+            results[position] = cached
+        else:
+            pending[key] = [position]
+    
+    pending_keys = list(pending)
+    pending_texts = [input_texts[pending[key][0]] for key in pending_keys]
+    
+    for batch in plan_batches(pending_texts):
+        batch_texts = [pending_texts[index] for index in batch]
+        if len(batch_texts) == 1:
+            parsed = [parse_with_llm(batch_texts[0])]
+        else:
+            try:
+                parsed = _parse_batch_with_llm(batch_texts)
+                for index, result in zip(batch, parsed):
+                    llm_cache.put(pending_keys[index], result, LLM_MODEL, PROMPT_VERSION)
+            except Exception as e:
+                print(f"Batch LLM parsing failed, parsing {len(batch_texts)} items one by one: {str(e)}")
+                parsed = [parse_with_llm(text) for text in batch_texts]
+        
+        for index, result in zip(batch, parsed):
+            for position in pending[pending_keys[index]]:
+                results[position] = dict(result)
+    
+    return results
+
 # Alternative implementation using a local LLM or different API
 def parse_with_alternative_llm(input_text: str) -> Optional[Dict[str, Any]]:
     """
@@ -115,20 +398,22 @@ def parse_with_alternative_llm(input_text: str) -> Optional[Dict[str, Any]]:
     # This is just a placeholder 
 
 # New function to process images
-def process_image_with_llm(base64_image: str) -> List[Dict[str, Any]]:
+def process_image_with_llm(base64_image: str, mime_type: str = "image/jpeg") -> List[Dict[str, Any]]:
     """
     Use a vision LLM to analyze an image and extract component details.
 
     Args:
         base64_image: Base64 encoded string of the image.
+        mime_type: Format of the image, e.g. image/png.
 
     Returns:
         A list of dictionaries, each representing an extracted component.
     """
     extracted_components = []
     try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo", # Use the latest general vision model
+        response = _create_completion(
+            'image',
+            model=IMAGE_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -152,7 +437,7 @@ If no components are found, return an empty JSON array []."""
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}" # Assuming JPEG, adjust if needed or let model infer
+                                "url": f"data:{mime_type};base64,{base64_image}"
                             }
                         }
                     ]
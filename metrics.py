@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+# Statements taking at least this long are printed; 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 500))
+
+# Histogram bucket upper bounds, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+# name -> (type, help, histogram buckets or None)
+METRICS = {
+    'inventory_http_request_duration_seconds': (
+        'histogram', 'Time to produce a response (streams: until the first byte), by route', REQUEST_BUCKETS),
+    'inventory_db_query_duration_seconds': (
+        'histogram', 'SQLite statement execution time by statement fingerprint (SELECTs: until the first row)',
+        QUERY_BUCKETS),
+    'inventory_db_slow_queries_total': (
+        'counter', 'Statements slower than SLOW_QUERY_MS', None),
+    'inventory_llm_request_duration_seconds': (
+        'histogram', 'OpenAI chat completion latency', LLM_BUCKETS),
+    'inventory_llm_tokens_total': (
+        'counter', 'Tokens reported by OpenAI chat completions', None),
+}
+
+_lock = threading.Lock()
+# name -> {label tuple: counter value, or [bucket counts..., +Inf count, sum]}
+_series = {name: {} for name in METRICS}
+# Functions returning extra samples when /metrics is scraped
+_collectors = []
+
+def _labels(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def increment(name: str, amount: float = 1, **labels):
+    """Add amount to a counter"""
+    key = _labels(labels)
+    with _lock:
+        series = _series[name]
+        series[key] = series.get(key, 0) + amount
+
+def observe(name: str, value: float, **labels):
+    """Record one value in a histogram"""
+    _observe(name, _labels(labels), value)
+
+def _observe(name, key, value):
+    buckets = METRICS[name][2]
+    index = bisect_left(buckets, value)
+    with _lock:
+        counts = _series[name].get(key)
+        if counts is None:
+            counts = _series[name][key] = [0] * (len(buckets) + 2)
+        counts[index] += 1
+        counts[-1] += value
+
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]):
+    """
+    Add samples computed at scrape time, e.g. pool or cache statistics
+
+    The collector returns (name, type, help, labels, value) tuples.
+    """
+    _collectors.append(collector)
+
+# Comments, string and number literals, and IN lists of any length
+_COMMENT_REGEX = re.compile(r'--[^\n]*')
+_STRING_REGEX = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_REGEX = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_REGEX = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+def fingerprint(sql: str) -> str:
+    """Statement with literals replaced by ? and whitespace collapsed, so calls group by shape"""
+    text = _COMMENT_REGEX.sub(' ', sql)
+    text = _STRING_REGEX.sub('?', text)
+    text = _NUMBER_REGEX.sub('?', text)
+    text = _IN_LIST_REGEX.sub('IN (...)', text)
+    return ' '.join(text.split())
+
+@lru_cache(maxsize=1024)
+def _statement_labels(sql):
+    # Runs for every statement, so the label tuple is cached per SQL text
+    return (('statement', fingerprint(sql)),)
+
+def observe_query(sql: str, seconds: float):
+    """Record a database statement and print it when it was slow"""
+    key = _statement_labels(sql)
+    _observe('inventory_db_query_duration_seconds', key, seconds)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        increment('inventory_db_slow_queries_total', statement=key[0][1])
+        print(f"Slow query ({seconds * 1000:.1f} ms): {key[0][1]}")
+
+def observe_llm(operation: str, model: str, seconds: float, outcome: str, usage: Any = None):
+    """Record an LLM call and the tokens from its usage field, when present"""
+    observe('inventory_llm_request_duration_seconds', seconds, operation=operation, model=model, outcome=outcome)
+    for kind in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{kind}_tokens', None)
+        if tokens:
+            increment('inventory_llm_tokens_total', tokens, operation=operation, model=model, type=kind)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    with _lock:
+        snapshot = {name: {key: (list(value) if isinstance(value, list) else value)
+                           for key, value in series.items()}
+                    for name, series in _series.items()}
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(snapshot[name].items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    described = set()
+    for collector in _collectors:
+        for name, kind, help_text, labels, value in collector():
+            if name not in described:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                described.add(name)
+            lines.append(f'{name}{_format_labels(_labels(labels))} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
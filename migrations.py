@@ -0,0 +1,666 @@
+import argparse
+import sqlite3
+import time
+
+from database import transaction, get_db_connection, normalize_name, rebuild_search_index, rebuild_duplicate_groups, rebuild_inventory_summary
+
+# Every schema change is a numbered migration. The number of the last one
+# applied is stored in the database header (PRAGMA user_version), so each
+# migration runs exactly once per database. Migrations 1-5 use IF NOT EXISTS
+# and column checks because databases created before versioning already have
+# some or all of their tables. Never edit a released migration; add a new one.
+
+BASE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS components (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    specifications TEXT,
+    source TEXT,
+    quantity INTEGER DEFAULT 1,
+    storage TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (category_id) REFERENCES categories (id)
+);
+
+CREATE TABLE IF NOT EXISTS excluded_similarities (
+    component1_id INTEGER NOT NULL,
+    component2_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (component1_id, component2_id),
+    FOREIGN KEY (component1_id) REFERENCES components (id),
+    FOREIGN KEY (component2_id) REFERENCES components (id)
+);
+'''
+
+# Full-text index over the searchable component fields. Rows are keyed by
+# component id and kept in sync by triggers, so every write path is covered.
+SEARCH_INDEX_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS components_fts USING fts5(
+    name, specifications, source, category, storage,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS components_fts_insert AFTER INSERT ON components BEGIN
+    INSERT INTO components_fts (rowid, name, specifications, source, category, storage)
+    SELECT NEW.id, NEW.name, NEW.specifications, NEW.source, cat.name, NEW.storage
+    FROM categories cat WHERE cat.id = NEW.category_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS components_fts_delete AFTER DELETE ON components BEGIN
+    DELETE FROM components_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS components_fts_update
+AFTER UPDATE OF name, specifications, source, storage, category_id ON components BEGIN
+    DELETE FROM components_fts WHERE rowid = OLD.id;
+    INSERT INTO components_fts (rowid, name, specifications, source, category, storage)
+    SELECT NEW.id, NEW.name, NEW.specifications, NEW.source, cat.name, NEW.storage
+    FROM categories cat WHERE cat.id = NEW.category_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS categories_fts_update AFTER UPDATE OF name ON categories BEGIN
+    UPDATE components_fts SET category = NEW.name
+    WHERE rowid IN (SELECT id FROM components WHERE category_id = NEW.id);
+END;
+'''
+
+# Components whose normalized names match within a category form a duplicate
+# group. The member counts are kept current by triggers, so has_similar is a
+# join instead of a pairwise comparison.
+DUPLICATE_INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS duplicate_groups (
+    category_id INTEGER NOT NULL,
+    name_key TEXT NOT NULL,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category_id, name_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_components_name_key ON components (category_id, name_key);
+
+CREATE TRIGGER IF NOT EXISTS duplicate_groups_insert AFTER INSERT ON components
+WHEN NEW.name_key IS NOT NULL BEGIN
+    INSERT INTO duplicate_groups (category_id, name_key, member_count)
+    VALUES (NEW.category_id, NEW.name_key, 1)
+    ON CONFLICT (category_id, name_key) DO UPDATE SET member_count = member_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS duplicate_groups_delete AFTER DELETE ON components
+WHEN OLD.name_key IS NOT NULL BEGIN
+    UPDATE duplicate_groups SET member_count = member_count - 1
+    WHERE category_id = OLD.category_id AND name_key = OLD.name_key;
+    DELETE FROM duplicate_groups
+    WHERE category_id = OLD.category_id AND name_key = OLD.name_key AND member_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS duplicate_groups_update
+AFTER UPDATE OF category_id, name_key ON components
+WHEN OLD.category_id IS NOT NEW.category_id OR OLD.name_key IS NOT NEW.name_key BEGIN
+    UPDATE duplicate_groups SET member_count = member_count - 1
+    WHERE category_id = OLD.category_id AND name_key = OLD.name_key;
+    DELETE FROM duplicate_groups
+    WHERE category_id = OLD.category_id AND name_key = OLD.name_key AND member_count <= 0;
+    INSERT INTO duplicate_groups (category_id, name_key, member_count)
+    SELECT NEW.category_id, NEW.name_key, 1 WHERE NEW.name_key IS NOT NULL
+    ON CONFLICT (category_id, name_key) DO UPDATE SET member_count = member_count + 1;
+END;
+'''
+
+LLM_CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at);
+'''
+
+JOBS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    payload TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+'''
+
+# Indexes for the filters and orderings the list and search queries use
+QUERY_INDEXES = '''
+-- Lists are ordered by cat.name, c.name, c.id: walking categories in name
+-- order (their UNIQUE index), this yields each category's rows already sorted,
+-- so pages stop after `limit` rows instead of sorting the whole table. It also
+-- narrows find_similar_components to one category.
+CREATE INDEX IF NOT EXISTS idx_components_category_name ON components (category_id, name);
+
+-- min_quantity / max_quantity / show_zero_quantity filters
+CREATE INDEX IF NOT EXISTS idx_components_quantity ON components (quantity);
+
+-- min_date / max_date filters
+CREATE INDEX IF NOT EXISTS idx_components_created_at ON components (created_at);
+
+-- The primary key covers lookups by component1_id; this covers the reverse
+CREATE INDEX IF NOT EXISTS idx_excluded_similarities_component2
+ON excluded_similarities (component2_id, component1_id);
+'''
+
+# A single counter bumped by every change to the visible inventory. Changed
+# rows are stamped with the new value and deleted ids are kept as tombstones,
+# so clients can ask for everything after the revision they last saw. Each
+# trigger bumps before stamping, so the stamp is always newer than any
+# revision a client could have read before the change. The column lists keep
+# the stamping UPDATEs from re-firing these (or the search index) triggers.
+REVISION_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventory_revision (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO inventory_revision (id, revision) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS component_tombstones (
+    component_id INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_component_tombstones_revision ON component_tombstones (revision);
+CREATE INDEX IF NOT EXISTS idx_components_revision ON components (revision);
+
+CREATE TRIGGER IF NOT EXISTS components_revision_insert AFTER INSERT ON components BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS components_revision_update
+AFTER UPDATE OF category_id, name, specifications, source, quantity, storage ON components BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS components_revision_delete AFTER DELETE ON components BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    INSERT OR REPLACE INTO component_tombstones (component_id, revision)
+    SELECT OLD.id, revision FROM inventory_revision WHERE id = 1;
+END;
+
+-- Renaming a category changes the category field of all its components
+CREATE TRIGGER IF NOT EXISTS categories_revision_update AFTER UPDATE OF name ON categories BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE category_id = NEW.id;
+END;
+
+-- has_similar of every group member depends on the group size...
+CREATE TRIGGER IF NOT EXISTS duplicate_groups_revision AFTER UPDATE OF member_count ON duplicate_groups BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE category_id = NEW.category_id AND name_key = NEW.name_key;
+END;
+
+-- ...and on the exclusions of both components
+CREATE TRIGGER IF NOT EXISTS excluded_similarities_revision_insert AFTER INSERT ON excluded_similarities BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id IN (NEW.component1_id, NEW.component2_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS excluded_similarities_revision_delete AFTER DELETE ON excluded_similarities BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id IN (OLD.component1_id, OLD.component2_id);
+END;
+'''
+
+# Append-only record of every mutation made through database.py, streamed to
+# browsers by /api/changes/stream
+CHANGE_LOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    revision INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    component_id INTEGER,
+    data TEXT,
+    created_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_created_at ON change_log (created_at);
+'''
+
+# Values and package codes extracted from the free-text specifications (see
+# specs.py), so range filters are index range scans. Rows are refreshed by the
+# database.py write paths and the spec backfill job.
+SPEC_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS component_values (
+    component_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_component_values_kind_value ON component_values (kind, value, component_id);
+CREATE INDEX IF NOT EXISTS idx_component_values_component ON component_values (component_id);
+
+CREATE TABLE IF NOT EXISTS component_packages (
+    component_id INTEGER PRIMARY KEY,
+    package TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_component_packages_package ON component_packages (package);
+
+CREATE TRIGGER IF NOT EXISTS component_specs_delete AFTER DELETE ON components BEGIN
+    DELETE FROM component_values WHERE component_id = OLD.id;
+    DELETE FROM component_packages WHERE component_id = OLD.id;
+END;
+'''
+
+# Near-duplicate index (see similarity.py): the LSH buckets of every component
+# and the pairs scoring above the similarity threshold, stored in both
+# directions. Rows are refreshed by the database.py write paths and the
+# similarity backfill job; deleting a component drops its rows here.
+SIMILARITY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS similarity_buckets (
+    bucket INTEGER NOT NULL,
+    component_id INTEGER NOT NULL,
+    PRIMARY KEY (bucket, component_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_similarity_buckets_component ON similarity_buckets (component_id);
+
+CREATE TABLE IF NOT EXISTS similar_components (
+    component_id INTEGER NOT NULL,
+    similar_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (component_id, similar_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_similar_components_similar ON similar_components (similar_id);
+
+CREATE TRIGGER IF NOT EXISTS similarity_index_delete AFTER DELETE ON components BEGIN
+    DELETE FROM similarity_buckets WHERE component_id = OLD.id;
+    DELETE FROM similar_components WHERE component_id = OLD.id OR similar_id = OLD.id;
+END;
+
+-- has_similar now also depends on the near-duplicate pairs
+CREATE TRIGGER IF NOT EXISTS similar_components_revision_insert AFTER INSERT ON similar_components BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id = NEW.component_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS similar_components_revision_delete AFTER DELETE ON similar_components BEGIN
+    UPDATE inventory_revision SET revision = revision + 1 WHERE id = 1;
+    UPDATE components SET revision = (SELECT revision FROM inventory_revision WHERE id = 1)
+    WHERE id = OLD.component_id;
+END;
+'''
+
+IMAGE_HASH_SCHEMA = '''
+-- Perceptual hashes of processed images; key is their extraction in llm_cache
+CREATE TABLE IF NOT EXISTS image_hashes (
+    key TEXT PRIMARY KEY,
+    perceptual_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+'''
+
+# Materialized dashboard figures: totals, per category and per storage
+# location, kept current by triggers so /api/summary reads a handful of rows
+# instead of the components table. Rows of categories and locations without
+# components are removed. duplicate_group_count counts duplicate groups with
+# more than one member.
+SUMMARY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventory_summary (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    component_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    zero_stock_count INTEGER NOT NULL DEFAULT 0,
+    duplicate_group_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO inventory_summary (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS category_summary (
+    category_id INTEGER PRIMARY KEY,
+    component_count INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL
+);
+
+-- Components without a storage location are counted under ''
+CREATE TABLE IF NOT EXISTS storage_summary (
+    storage TEXT PRIMARY KEY,
+    component_count INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS summary_insert AFTER INSERT ON components BEGIN
+    UPDATE inventory_summary SET
+        component_count = component_count + 1,
+        total_quantity = total_quantity + COALESCE(NEW.quantity, 0),
+        zero_stock_count = zero_stock_count + (NEW.quantity IS 0)
+    WHERE id = 1;
+    INSERT INTO category_summary (category_id, component_count, total_quantity)
+    VALUES (NEW.category_id, 1, COALESCE(NEW.quantity, 0))
+    ON CONFLICT (category_id) DO UPDATE SET
+        component_count = component_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity;
+    INSERT INTO storage_summary (storage, component_count, total_quantity)
+    VALUES (COALESCE(NEW.storage, ''), 1, COALESCE(NEW.quantity, 0))
+    ON CONFLICT (storage) DO UPDATE SET
+        component_count = component_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity;
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_delete AFTER DELETE ON components BEGIN
+    UPDATE inventory_summary SET
+        component_count = component_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+        zero_stock_count = zero_stock_count - (OLD.quantity IS 0)
+    WHERE id = 1;
+    UPDATE category_summary SET
+        component_count = component_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0)
+    WHERE category_id = OLD.category_id;
+    DELETE FROM category_summary WHERE category_id = OLD.category_id AND component_count <= 0;
+    UPDATE storage_summary SET
+        component_count = component_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0)
+    WHERE storage = COALESCE(OLD.storage, '');
+    DELETE FROM storage_summary WHERE storage = COALESCE(OLD.storage, '') AND component_count <= 0;
+END;
+
+-- Moves a component out of its old category and location and into the new
+-- ones (the same ones when only the quantity changed)
+CREATE TRIGGER IF NOT EXISTS summary_update
+AFTER UPDATE OF category_id, quantity, storage ON components
+WHEN OLD.category_id IS NOT NEW.category_id OR OLD.quantity IS NOT NEW.quantity
+  OR OLD.storage IS NOT NEW.storage BEGIN
+    UPDATE inventory_summary SET
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0) + COALESCE(NEW.quantity, 0),
+        zero_stock_count = zero_stock_count - (OLD.quantity IS 0) + (NEW.quantity IS 0)
+    WHERE id = 1;
+    UPDATE category_summary SET
+        component_count = component_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0)
+    WHERE category_id = OLD.category_id;
+    DELETE FROM category_summary WHERE category_id = OLD.category_id AND component_count <= 0;
+    INSERT INTO category_summary (category_id, component_count, total_quantity)
+    VALUES (NEW.category_id, 1, COALESCE(NEW.quantity, 0))
+    ON CONFLICT (category_id) DO UPDATE SET
+        component_count = component_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity;
+    UPDATE storage_summary SET
+        component_count = component_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0)
+    WHERE storage = COALESCE(OLD.storage, '');
+    DELETE FROM storage_summary WHERE storage = COALESCE(OLD.storage, '') AND component_count <= 0;
+    INSERT INTO storage_summary (storage, component_count, total_quantity)
+    VALUES (COALESCE(NEW.storage, ''), 1, COALESCE(NEW.quantity, 0))
+    ON CONFLICT (storage) DO UPDATE SET
+        component_count = component_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity;
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_duplicate_groups_insert AFTER INSERT ON duplicate_groups
+WHEN NEW.member_count > 1 BEGIN
+    UPDATE inventory_summary SET duplicate_group_count = duplicate_group_count + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_duplicate_groups_update AFTER UPDATE OF member_count ON duplicate_groups
+WHEN (OLD.member_count > 1) != (NEW.member_count > 1) BEGIN
+    UPDATE inventory_summary
+    SET duplicate_group_count = duplicate_group_count + (NEW.member_count > 1) - (OLD.member_count > 1)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS summary_duplicate_groups_delete AFTER DELETE ON duplicate_groups
+WHEN OLD.member_count > 1 BEGIN
+    UPDATE inventory_summary SET duplicate_group_count = duplicate_group_count - 1 WHERE id = 1;
+END;
+'''
+
+def execute_script(conn, script):
+    """Run each statement of a SQL script inside the current transaction.
+
+    Unlike executescript(), this never commits on its own, so a failing
+    migration is rolled back completely.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        if line.lstrip().startswith('--') and not statement.strip():
+            continue
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+    if statement.strip():
+        conn.execute(statement)
+
+def _columns(conn, table):
+    return [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (name,)
+    ).fetchone() is not None
+
+def migrate_base_schema(conn):
+    """Categories, components and excluded similarities (formerly schema.sql and update_schema.py)"""
+    execute_script(conn, BASE_SCHEMA)
+    if 'storage' not in _columns(conn, 'components'):
+        conn.execute('ALTER TABLE components ADD COLUMN storage TEXT')
+
+def migrate_search_index(conn):
+    """Full-text search index; skipped when SQLite is built without FTS5"""
+    existed = _table_exists(conn, 'components_fts')
+    conn.execute('SAVEPOINT search_index')
+    try:
+        execute_script(conn, SEARCH_INDEX_SCHEMA)
+    except sqlite3.OperationalError as e:
+        conn.execute('ROLLBACK TO search_index')
+        conn.execute('RELEASE search_index')
+        print(f"Full-text search unavailable, using LIKE search: {e}")
+        return
+    conn.execute('RELEASE search_index')
+    if not existed:
+        rebuild_search_index()
+
+def migrate_duplicate_index(conn):
+    """Normalized-name key and trigger-maintained duplicate groups"""
+    if 'name_key' not in _columns(conn, 'components'):
+        conn.execute('ALTER TABLE components ADD COLUMN name_key TEXT')
+    execute_script(conn, DUPLICATE_INDEX_SCHEMA)
+
+    missing = conn.execute('SELECT id, name FROM components WHERE name_key IS NULL').fetchall()
+    conn.executemany('UPDATE components SET name_key = ? WHERE id = ?',
+                     [(normalize_name(row['name']), row['id']) for row in missing])
+    rebuild_duplicate_groups()
+
+def migrate_llm_cache(conn):
+    """Persistent cache of LLM parse results (see llm_cache.py)"""
+    execute_script(conn, LLM_CACHE_SCHEMA)
+
+def migrate_jobs(conn):
+    """Background job queue (see jobs.py)"""
+    execute_script(conn, JOBS_SCHEMA)
+
+def migrate_query_indexes(conn):
+    """Indexes for the list ordering and the search filters"""
+    execute_script(conn, QUERY_INDEXES)
+
+def migrate_revisions(conn):
+    """Inventory revision counter, per-row revision stamps and delete tombstones"""
+    if 'revision' not in _columns(conn, 'components'):
+        conn.execute('ALTER TABLE components ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+    execute_script(conn, REVISION_SCHEMA)
+    # Existing rows become revision 1, so "changes since 0" is the whole inventory
+    conn.execute('UPDATE components SET revision = 1')
+    conn.execute('UPDATE inventory_revision SET revision = 1 WHERE id = 1')
+
+def migrate_change_log(conn):
+    """Change log behind the live update stream"""
+    execute_script(conn, CHANGE_LOG_SCHEMA)
+
+def migrate_spec_values(conn):
+    """Side tables for extracted spec values; filled by the spec backfill job"""
+    if 'specs_version' not in _columns(conn, 'components'):
+        conn.execute('ALTER TABLE components ADD COLUMN specs_version INTEGER')
+    execute_script(conn, SPEC_SCHEMA)
+
+def migrate_similarity_index(conn):
+    """Near-duplicate buckets and pairs; filled by the similarity backfill job"""
+    if 'similarity_version' not in _columns(conn, 'components'):
+        conn.execute('ALTER TABLE components ADD COLUMN similarity_version INTEGER')
+    execute_script(conn, SIMILARITY_SCHEMA)
+
+def migrate_category_case(conn):
+    """Merge categories whose names differ only in case or surrounding spaces
+
+    The category with the most components keeps its name and takes over the
+    others' components; a NOCASE unique index then keeps new duplicates out.
+    """
+    keys = [row[0] for row in conn.execute(
+        'SELECT lower(trim(name)) as key FROM categories GROUP BY key HAVING COUNT(*) > 1')]
+    for key in keys:
+        ids = [row['id'] for row in conn.execute('''
+            SELECT cat.id, COUNT(c.id) as members
+            FROM categories cat
+            LEFT JOIN components c ON c.category_id = cat.id
+            WHERE lower(trim(cat.name)) = ?
+            GROUP BY cat.id
+            ORDER BY members DESC, cat.id
+        ''', (key,))]
+        keep, merged = ids[0], ids[1:]
+        placeholders = ', '.join('?' for _ in merged)
+        # Near-duplicate buckets are per category; the backfill re-indexes these
+        conn.execute(f'''
+            UPDATE components SET category_id = ?, similarity_version = NULL
+            WHERE category_id IN ({placeholders})
+        ''', (keep, *merged))
+        conn.execute(f'DELETE FROM categories WHERE id IN ({placeholders})', merged)
+        print(f"Merged {len(merged)} duplicate categories into category {keep}")
+    
+    conn.execute('UPDATE categories SET name = trim(name) WHERE name != trim(name)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_name_nocase ON categories (name COLLATE NOCASE)')
+
+def migrate_image_hashes(conn):
+    """Perceptual hashes of uploaded images (see images.py)"""
+    execute_script(conn, IMAGE_HASH_SCHEMA)
+
+def migrate_image_hash_size(conn):
+    """Finer (4096-bit) image hashes stored with the prepared image size"""
+    for column in ('width', 'height'):
+        if column not in _columns(conn, 'image_hashes'):
+            conn.execute(f'ALTER TABLE image_hashes ADD COLUMN {column} INTEGER')
+    # 256-bit hashes cannot be compared with the new ones; the extractions stay cached by file
+    conn.execute('DELETE FROM image_hashes')
+
+def migrate_job_leases(conn):
+    """Record which process runs a job, so only expired leases are requeued"""
+    if 'claimed_by' not in _columns(conn, 'jobs'):
+        conn.execute('ALTER TABLE jobs ADD COLUMN claimed_by TEXT')
+
+def migrate_sync_floor(conn):
+    """Oldest revision clients can sync from once old tombstones are pruned"""
+    if 'sync_floor' not in _columns(conn, 'inventory_revision'):
+        conn.execute('ALTER TABLE inventory_revision ADD COLUMN sync_floor INTEGER NOT NULL DEFAULT 0')
+
+def migrate_inventory_summary(conn):
+    """Materialized dashboard totals (see get_inventory_summary)"""
+    execute_script(conn, SUMMARY_SCHEMA)
+    rebuild_inventory_summary()
+
+# (version, migration), in the order they are applied
+MIGRATIONS = [
+    (1, migrate_base_schema),
+    (2, migrate_search_index),
+    (3, migrate_duplicate_index),
+    (4, migrate_llm_cache),
+    (5, migrate_jobs),
+    (6, migrate_query_indexes),
+    (7, migrate_revisions),
+    (8, migrate_change_log),
+    (9, migrate_spec_values),
+    (10, migrate_similarity_index),
+    (11, migrate_category_case),
+    (12, migrate_image_hashes),
+    (13, migrate_inventory_summary),
+    (14, migrate_image_hash_size),
+    (15, migrate_job_leases),
+    (16, migrate_sync_floor),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn=None):
+    """Schema version recorded in the database"""
+    conn = conn or get_db_connection()
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate():
+    """
+    Apply every pending migration, each in its own transaction
+
+    The write lock is taken before re-reading the version, so when several
+    processes start at once each migration still runs only once. Statistics
+    are refreshed with ANALYZE after anything was applied.
+
+    Returns:
+        Versions that were applied by this call
+    """
+    conn = get_db_connection()
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+    if conn.in_transaction:
+        raise RuntimeError('Migrations must not run inside an open transaction')
+
+    applied = []
+    for version, migration in MIGRATIONS:
+        # transaction() makes helpers such as rebuild_search_index() join
+        # this transaction instead of committing part of a migration
+        with transaction() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if get_version(conn) >= version:
+                continue
+            started = time.perf_counter()
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        print(f"Applied migration {version} ({migration.__name__}) in {time.perf_counter() - started:.2f}s")
+        applied.append(version)
+
+    if applied:
+        conn.execute('ANALYZE')
+        conn.commit()
+    return applied
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Show or upgrade the inventory database schema version')
+    arg_parser.add_argument('--status', action='store_true', help='Only print the current and latest version')
+    args = arg_parser.parse_args()
+
+    version = get_version()
+    if args.status:
+        print(f"Schema version {version} (latest {LATEST_VERSION})")
+        return
+    applied = migrate()
+    print(f"Schema version {get_version()}" + ("" if applied else " (up to date)"))
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,124 @@
+import os
 import re
-from typing import Dict, Any
-from llm_parser import parse_with_llm
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Iterator, List
+from llm_parser import parse_with_llm, parse_many_with_llm, stream_parse_with_llm
+from database import release_db_connection
+from circuit_breaker import CircuitOpenError
 
-def parse_component(input_text: str, use_llm: bool = True) -> Dict[str, Any]:
+# Hedged parsing (off with 0): when the LLM has not answered after this many
+# seconds, parse_component returns the regex result. The LLM call carries on
+# in the background and caches its answer for the next request.
+LLM_HEDGE_SECONDS = float(os.getenv('LLM_HEDGE_SECONDS', 0))
+LLM_HEDGE_WORKERS = int(os.getenv('LLM_HEDGE_WORKERS', 4))
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+# One slot per hedge worker, taken until the LLM call ends (also after the
+# regex answer was returned), so no calls queue up behind a slow LLM
+_hedge_slots = threading.BoundedSemaphore(LLM_HEDGE_WORKERS)
+
+# Quantity patterns, in priority order: the first pattern that matches anywhere wins
+QUANTITY_PATTERNS = [
+    r'(\d+)\s*(?:pieces|pcs|pc|qty:?|quantity:?)',
+    r'qty:?\s*(\d+)',
+    r'quantity:?\s*(\d+)'
+]
+
+# Common hardware categories to detect, in priority order
+CATEGORY_KEYWORDS = {
+    'resistor': ['resistor', 'ohm'],
+    'capacitor': ['capacitor', 'farad', 'µF', 'nF', 'pF'],
+    'inductor': ['inductor', 'coil', 'choke', 'henry', 'µH', 'mH'],
+    'diode': ['diode', 'rectifier', 'LED'],
+    'transistor': ['transistor', 'MOSFET', 'BJT', 'FET'],
+    'IC': ['IC', 'integrated circuit', 'microcontroller', 'MCU', 'EEPROM', 'memory'],
+    'connector': ['connector', 'jack', 'plug', 'socket', 'header', 'terminal'],
+    'switch': ['switch', 'button', 'toggle'],
+    'battery': ['battery', '18650'],
+    'module': ['module', 'board', 'shield']
+}
+
+# Everything below is compiled once at import.
+
+# The quantity patterns are combined into one alternation wrapped in a
+# lookahead, so a single scan sees every start position; each alternative is a
+# named group whose number is its priority.
+_QUANTITY_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in QUANTITY_PATTERNS]
+_QUANTITY_SCAN = re.compile(
+    '(?=' + '|'.join(f'(?P<q{index}>{pattern})' for index, pattern in enumerate(QUANTITY_PATTERNS)) + ')',
+    re.IGNORECASE
+)
+
+# A keyword bounded by \b on both sides matches exactly one whole \w+ run, so
+# category detection is a single pass over the words of the input with a dict
+# lookup per word. Keywords spanning several words (e.g. "integrated circuit")
+# are indexed by their first word and confirmed with a regex at that position.
+_WORD_REGEX = re.compile(r'\w+')
+_CATEGORY_NAMES = list(CATEGORY_KEYWORDS)
+
+def _build_keyword_tables():
+    keyword_priority = {}
+    phrase_keywords = {}
+    for index, keywords in enumerate(CATEGORY_KEYWORDS.values()):
+        for keyword in keywords:
+            if _WORD_REGEX.fullmatch(keyword):
+                keyword_priority.setdefault(keyword.casefold(), index)
+            else:
+                first_word = _WORD_REGEX.match(keyword).group().casefold()
+                phrase = re.compile(re.escape(keyword) + r'\b', re.IGNORECASE)
+                phrase_keywords.setdefault(first_word, []).append((index, phrase))
+    return keyword_priority, phrase_keywords
+
+_KEYWORD_PRIORITY, _PHRASE_KEYWORDS = _build_keyword_tables()
+
+_SOURCE_REGEX = re.compile(r'([a-zA-Z0-9._-]+\.[a-z]{2,})[:/]([^,\s]+)')
+_NAME_REGEX = re.compile(r'^([^,]+?)(?:,|\s+\d+|\s+\d+\.\d+\s*[a-zA-Z]+)')
+
+def _find_quantity(input_text: str):
+    """Return (pattern index, match) for the highest-priority quantity pattern, or None"""
+    best = None
+    position = None
+    for scan in _QUANTITY_SCAN.finditer(input_text):
+        index = int(scan.lastgroup[1:])
+        if best is None or index < best:
+            best, position = index, scan.start()
+            if index == 0:
+                break
+    if best is None:
+        return None
+    # Re-match at the found position to get the pattern's own capture group
+    return best, _QUANTITY_REGEXES[best].match(input_text, position)
+
+def _find_category(input_text: str):
+    """Return the highest-priority category with a keyword in the text, or None"""
+    best = None
+    for word_match in _WORD_REGEX.finditer(input_text):
+        # casefold() also folds the micro sign into Greek mu, as re.IGNORECASE does
+        word = word_match.group().casefold()
+        index = _KEYWORD_PRIORITY.get(word)
+        if index is not None and (best is None or index < best):
+            best = index
+            if index == 0:
+                break
+        for index, phrase in _PHRASE_KEYWORDS.get(word, ()):
+            if (best is None or index < best) and phrase.match(input_text, word_match.start()):
+                best = index
+    return _CATEGORY_NAMES[best] if best is not None else None
+
+def parse_with_regex(input_text: str) -> Dict[str, Any]:
     """
-    Parse natural language input for hardware components
-    
+    Parse a component description with the precompiled regex rules
+
     Args:
         input_text: Natural language description of a component
-        use_llm: Whether to use LLM for parsing (falls back to regex if False or LLM fails)
-        
+
     Returns:
         Dictionary with extracted information
     """
-    if use_llm:
-        try:
-            # Try using the LLM parser first
-            return parse_with_llm(input_text)
-        except Exception as e:
-            print(f"LLM parsing failed, falling back to regex parsing: {str(e)}")
-            # Fall back to regex parsing if LLM fails
-            pass
-    
-    # Existing regex-based parsing logic as fallback
     input_text = input_text.strip()
-    
+
     # Default values
     parsed_data = {
         'name': '',
@@ -33,60 +127,30 @@ def parse_component(input_text: str, use_llm: bool = True) -> Dict[str, Any]:
         'source': '',
         'quantity': 1
     }
-    
+
     # Extract quantity
-    qty_patterns = [
-        r'(\d+)\s*(?:pieces|pcs|pc|qty:?|quantity:?)',
-        r'qty:?\s*(\d+)',
-        r'quantity:?\s*(\d+)'
-    ]
-    
-    for pattern in qty_patterns:
-        qty_match = re.search(pattern, input_text, re.IGNORECASE)
-        if qty_match:
-            parsed_data['quantity'] = int(qty_match.group(1))
-            # Remove the quantity part from further processing
-            input_text = re.sub(pattern, '', input_text, flags=re.IGNORECASE)
-            break
-    
+    quantity = _find_quantity(input_text)
+    if quantity:
+        index, qty_match = quantity
+        parsed_data['quantity'] = int(qty_match.group(1))
+        # Remove the quantity part from further processing
+        input_text = _QUANTITY_REGEXES[index].sub('', input_text)
+
     # Extract source/vendor (anything with .com, .net, etc., or containing ':')
-    source_match = re.search(r'([a-zA-Z0-9._-]+\.[a-z]{2,})[:/]([^,\s]+)', input_text)
+    source_match = _SOURCE_REGEX.search(input_text)
     if source_match:
         parsed_data['source'] = source_match.group(0)
         # Remove the source part from further processing
         input_text = input_text.replace(source_match.group(0), '')
-    
-    # Extract category and component name
-    # Common hardware categories to detect
-    categories = {
-        'resistor': ['resistor', 'ohm'],
-        'capacitor': ['capacitor', 'farad', 'µF', 'nF', 'pF'],
-        'inductor': ['inductor', 'coil', 'choke', 'henry', 'µH', 'mH'],
-        'diode': ['diode', 'rectifier', 'LED'],
-        'transistor': ['transistor', 'MOSFET', 'BJT', 'FET'],
-        'IC': ['IC', 'integrated circuit', 'microcontroller', 'MCU', 'EEPROM', 'memory'],
-        'connector': ['connector', 'jack', 'plug', 'socket', 'header', 'terminal'],
-        'switch': ['switch', 'button', 'toggle'],
-        'battery': ['battery', '18650'],
-        'module': ['module', 'board', 'shield']
-    }
-    
-    # Try to identify the category
-    detected_category = None
-    for category, keywords in categories.items():
-        for keyword in keywords:
-            if re.search(r'\b' + re.escape(keyword) + r'\b', input_text, re.IGNORECASE):
-                detected_category = category
-                break
-        if detected_category:
-            break
-    
+
+    # Extract category
+    detected_category = _find_category(input_text)
     if detected_category:
         parsed_data['category'] = detected_category.capitalize()
-    
+
     # Extract name - this is a bit tricky and may need refinement
     # For now, let's assume the first part before a comma or specific measurement is the name
-    name_match = re.match(r'^([^,]+?)(?:,|\s+\d+|\s+\d+\.\d+\s*[a-zA-Z]+)', input_text)
+    name_match = _NAME_REGEX.match(input_text)
     if name_match:
         parsed_data['name'] = name_match.group(1).strip()
     else:
@@ -96,13 +160,120 @@ def parse_component(input_text: str, use_llm: bool = True) -> Dict[str, Any]:
             parsed_data['name'] = ' '.join(words[:3])
         else:
             parsed_data['name'] = input_text.strip()
-    
+
     # The rest goes into specifications
     # Remove name and already processed parts
     specs_text = input_text.replace(parsed_data['name'], '', 1).strip()
     if specs_text.startswith(','):
         specs_text = specs_text[1:].strip()
-    
+
     parsed_data['specifications'] = specs_text
+
+    return parsed_data
+
+def parse_component(input_text: str, use_llm: bool = True) -> Dict[str, Any]:
+    """
+    Parse natural language input for hardware components
+
+    Args:
+        input_text: Natural language description of a component
+        use_llm: Whether to use LLM for parsing (falls back to regex if False or LLM fails)
+
+    Returns:
+        Dictionary with extracted information
+    """
+    if use_llm and LLM_HEDGE_SECONDS > 0:
+        return _parse_hedged(input_text)
+
+    if use_llm:
+        try:
+            # Try using the LLM parser first
+            return parse_with_llm(input_text)
+        except Exception as e:
+            print(f"LLM parsing failed, falling back to regex parsing: {str(e)}")
+            # Fall back to regex parsing if LLM fails
+            pass
+
+    return parse_with_regex(input_text)
+
+def parse_component_stream(input_text: str, use_llm: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a description in two phases, for previews
+
+    Yields events: {'type': 'regex', 'result': ...} at once; then with use_llm
+    {'type': 'diff', 'fields': {...}} whenever LLM fields that differ from what
+    was sent so far arrive, and finally {'type': 'llm', 'result': ...,
+    'cached': bool}, or {'type': 'error', 'error': ...} when the LLM failed
+    and the regex result stands.
+    """
+    current = parse_with_regex(input_text)
+    yield {'type': 'regex', 'result': dict(current)}
+    if not use_llm:
+        return
     
-    return parsed_data 
\ No newline at end of file
+    try:
+        for event in stream_parse_with_llm(input_text):
+            if 'result' in event:
+                yield {'type': 'llm', 'result': event['result'], 'cached': event['cached']}
+                continue
+            changed = {name: value for name, value in event['fields'].items() if current.get(name) != value}
+            if changed:
+                current.update(changed)
+                yield {'type': 'diff', 'fields': changed}
+    except CircuitOpenError as e:
+        yield {'type': 'error', 'error': str(e)}
+    except Exception as e:
+        print(f"LLM parsing failed, keeping the regex result: {str(e)}")
+        yield {'type': 'error', 'error': str(e)}
+
+def _parse_in_background(input_text):
+    try:
+        return parse_with_llm(input_text)
+    finally:
+        release_db_connection()
+        _hedge_slots.release()
+
+def _parse_hedged(input_text: str) -> Dict[str, Any]:
+    """The LLM result if it arrives within LLM_HEDGE_SECONDS, else the regex result
+
+    When all LLM_HEDGE_WORKERS are still busy with earlier calls the LLM is
+    skipped and the regex result returned at once.
+    """
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+    
+    if not _hedge_slots.acquire(blocking=False):
+        print(f"All {LLM_HEDGE_WORKERS} hedged LLM calls are still running, using the regex result")
+        return parse_with_regex(input_text)
+    try:
+        future = _hedge_executor.submit(_parse_in_background, input_text)
+    except Exception:
+        _hedge_slots.release()
+        raise
+    try:
+        return future.result(timeout=LLM_HEDGE_SECONDS)
+    except FutureTimeoutError:
+        print(f"LLM missed the {LLM_HEDGE_SECONDS}s hedge deadline, using the regex result")
+    except Exception as e:
+        print(f"LLM parsing failed, falling back to regex parsing: {str(e)}")
+    return parse_with_regex(input_text)
+
+def parse_many(input_texts: List[str], use_llm: bool = True) -> List[Dict[str, Any]]:
+    """
+    Parse a list of component descriptions
+
+    With use_llm the descriptions are sent to the LLM in batches (see
+    parse_many_with_llm); otherwise each one goes through the regex parser.
+
+    Returns:
+        List of extracted information, in the same order as input_texts
+    """
+    if use_llm:
+        try:
+            return parse_many_with_llm(input_texts)
+        except Exception as e:
+            print(f"Batch LLM parsing failed, falling back to regex parsing: {str(e)}")
+
+    return [parse_with_regex(input_text) for input_text in input_texts]
@@ -0,0 +1,109 @@
+import hashlib
+import re
+import struct
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+# Bump whenever shingling or hashing changes so the backfill re-indexes old rows
+SIMILARITY_INDEX_VERSION = 1
+
+# MinHash signature of NUM_BANDS * ROWS_PER_BAND values. Two components share
+# a bucket when one band of their signatures matches, which happens with
+# probability 1 - (1 - s^2)^8 for Jaccard similarity s: about 0.75 at s=0.4,
+# 0.97 at s=0.6 and above 0.99 from s=0.7. Few bands keep writes cheap (one
+# bucket row per band); the extra low-similarity candidates are filtered by
+# their exact score.
+NUM_BANDS = 8
+ROWS_PER_BAND = 2
+NUM_HASHES = NUM_BANDS * ROWS_PER_BAND
+
+# Candidates scoring at least this are kept as near-duplicate pairs
+SIMILARITY_THRESHOLD = 0.6
+
+# Words and numbers, keeping decimals such as "4.7" together
+_TOKEN_REGEX = re.compile(r'[^\W_]+(?:[.,][^\W_]+)*')
+_unpack_hashes = struct.Struct(f'<{NUM_HASHES}I').unpack
+_BUCKET_MASK = (1 << 59) - 1
+
+@lru_cache(maxsize=4096)
+def shingles(name: str, specifications: str = '') -> FrozenSet[str]:
+    """
+    Features compared between components
+
+    Each word of the name contributes its character trigrams, so typos
+    ("LM7805" / "LM7850") still share most features and word order does not
+    matter. Specification words are compared whole ("0603", "10k", "ohm").
+    Cached, since the same components keep coming back as candidates.
+    """
+    features = set()
+    for token in _TOKEN_REGEX.findall((name or '').lower()):
+        padded = f' {token} '
+        features.update(map(''.join, zip(padded, padded[1:], padded[2:])))
+    features.update('#' + token for token in _TOKEN_REGEX.findall((specifications or '').lower()))
+    return frozenset(features)
+
+@lru_cache(maxsize=65536)
+def _feature_hashes(feature: str) -> Tuple[int, ...]:
+    # Trigrams repeat across the whole inventory, so most lookups are cached
+    return _unpack_hashes(hashlib.shake_128(feature.encode()).digest(NUM_HASHES * 4))
+
+def signature(features: Iterable[str]) -> List[int]:
+    """MinHash signature: the smallest value of each hash function over the features"""
+    return list(map(min, zip(*map(_feature_hashes, features))))
+
+def buckets(features: Iterable[str], category_id: int = 0) -> List[int]:
+    """
+    LSH bucket keys of the features, one per band; empty when there are no features
+
+    The category is part of every key, so components of different categories
+    never share a bucket and common names do not pile up in one.
+    """
+    values = signature(features)
+    if not values:
+        return []
+    keys = []
+    for band in range(NUM_BANDS):
+        a, b = values[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        # Band number in the top bits; fits a signed 64-bit SQLite integer
+        keys.append(band << 59 | (a << 27 ^ b ^ category_id * 0x9E3779B1) & _BUCKET_MASK)
+    return keys
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Share of features two components have in common (0 to 1)"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def score(first: Dict[str, str], second: Dict[str, str]) -> float:
+    """Similarity of two components given as dicts with name and specifications"""
+    return jaccard(shingles(first['name'], first['specifications']),
+                   shingles(second['name'], second['specifications']))
+
+def clusters(edges: Iterable[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Group ids connected by edges (union-find, linear in the number of edges)
+
+    Returns:
+        Clusters of two or more ids, largest first, each sorted by id
+    """
+    parent = {}
+
+    def find(item):
+        root = parent.setdefault(item, item)
+        while root != parent[root]:
+            root = parent[root]
+        # Path compression keeps later lookups short
+        while item != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    for a, b in edges:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for item in parent:
+        groups.setdefault(find(item), []).append(item)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
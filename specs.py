@@ -0,0 +1,140 @@
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump whenever extraction changes so the backfill re-processes old rows
+SPEC_EXTRACTOR_VERSION = 1
+
+# Quantity kinds that can be range-filtered, with the units that map to them
+UNIT_KINDS = {
+    'ohm': 'resistance',
+    'ohms': 'resistance',
+    'Ω': 'resistance',
+    'F': 'capacitance',
+    'H': 'inductance',
+    'V': 'voltage',
+    'v': 'voltage',
+    'VAC': 'voltage',
+    'VDC': 'voltage',
+    'A': 'current',
+    'W': 'power',
+    'Hz': 'frequency',
+    'hz': 'frequency',
+    'HZ': 'frequency',
+}
+SPEC_KINDS = ('resistance', 'capacitance', 'inductance', 'voltage', 'current', 'power', 'frequency')
+
+SI_PREFIXES = {
+    'p': Decimal('1e-12'),
+    'n': Decimal('1e-9'),
+    'u': Decimal('1e-6'),
+    'µ': Decimal('1e-6'),  # micro sign
+    'μ': Decimal('1e-6'),  # Greek mu
+    'm': Decimal('1e-3'),
+    '': Decimal(1),
+    'k': Decimal(1000),
+    'K': Decimal(1000),
+    'M': Decimal(1000000),
+    'G': Decimal(1000000000),
+}
+
+# Everything below is compiled once at import.
+
+_NUMBER = r'\d+(?:[.,]\d+)?'
+_PREFIX = '[pnuµμmkKMG]?'
+# Longest units first so "VAC" wins over "V"
+_UNIT = '|'.join(sorted((re.escape(unit) for unit in UNIT_KINDS), key=len, reverse=True))
+
+# "100 nF", "10k ohm", "2.5-5.5V", "10A/250VAC". The value must not continue a word
+# (ATMEGA328P, IP65) and the unit must not run into one (5 pcs, 5mm).
+_VALUE_REGEX = re.compile(
+    rf'(?<![\w.])(?P<low>{_NUMBER})(?:\s*-\s*(?P<high>{_NUMBER}))?\s*'
+    rf'(?P<prefix>{_PREFIX})\s?(?P<unit>{_UNIT})(?![A-Za-z0-9])'
+)
+# Resistor shorthand: "10k", "1M", "4k7", "4R7"
+_RESISTOR_REGEX = re.compile(r'(?<![\w.])(?P<whole>\d+)(?P<prefix>[kKMR])(?P<fraction>\d*)(?![\w.])')
+
+# Imperial chip sizes and the common package families with a pin count
+_CHIP_PACKAGE_REGEX = re.compile(r'(?<![\w.])(0201|0402|0603|0805|1206|1210|1812|2010|2512)(?![\w.])')
+_PACKAGE_REGEX = re.compile(
+    r'(?<![\w.])(SOT|SOIC|SOP|SSOP|TSSOP|MSOP|QFN|DFN|TQFP|LQFP|QFP|PDIP|DIP|TO|DO|SOD|BGA)'
+    r'-?(\d{1,3}[A-Z]?)(?![\w.])',
+    re.IGNORECASE
+)
+
+def _to_number(text: str) -> Decimal:
+    return Decimal(text.replace(',', '.'))
+
+def _scaled(number: Decimal, prefix: str) -> float:
+    # Decimal keeps 4.7k at exactly 4700 so equality and range bounds behave
+    return float(number * SI_PREFIXES[prefix])
+
+def parse_value(text: Any, kind: Optional[str] = None) -> float:
+    """
+    Parse a filter bound such as 4700, "4.7k", "4k7", "100nF" or "16 MHz"
+
+    Raises ValueError if the text is not a number with an optional SI prefix
+    and unit (the unit must match kind when both are given).
+    """
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text)
+    text = str(text).strip()
+    match = re.fullmatch(rf'({_NUMBER})\s*({_PREFIX})({_UNIT})?', text)
+    if match:
+        if match.group(3) and kind and UNIT_KINDS[match.group(3)] != kind:
+            raise ValueError(f"{text!r} is not a {kind}")
+        return _scaled(_to_number(match.group(1)), match.group(2))
+    match = _RESISTOR_REGEX.fullmatch(text)
+    if match and kind in (None, 'resistance'):
+        return _resistor_value(match)
+    raise ValueError(f"Invalid value: {text!r}")
+
+def _resistor_value(match) -> float:
+    prefix = match.group('prefix')
+    number = Decimal(f"{match.group('whole')}.{match.group('fraction') or 0}")
+    return _scaled(number, '' if prefix == 'R' else prefix)
+
+def normalize_package(family: str, size: str) -> str:
+    return f"{family.upper()}-{size.upper()}"
+
+def canonical_package(text: str) -> str:
+    """Package code as stored by extract_specs, e.g. "soic8" -> "SOIC-8"""
+    text = text.strip()
+    family = _PACKAGE_REGEX.fullmatch(text)
+    if family:
+        return normalize_package(family.group(1), family.group(2))
+    return text.upper()
+
+def extract_specs(text: str, category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pull typed values and a package code out of a component description
+
+    Args:
+        text: Name and specifications, e.g. "10k ohm, 0603, 100 mW"
+        category: Component category; bare values such as "10k" count as
+            resistances for resistors
+
+    Returns:
+        {'values': [(kind, value in base units), ...], 'package': str or None}
+    """
+    values: List[Tuple[str, float]] = []
+    for match in _VALUE_REGEX.finditer(text):
+        kind = UNIT_KINDS[match.group('unit')]
+        for number in (match.group('low'), match.group('high')):
+            if number is not None:
+                values.append((kind, _scaled(_to_number(number), match.group('prefix'))))
+
+    if (category or '').lower() == 'resistor' and not any(kind == 'resistance' for kind, _ in values):
+        values.extend(('resistance', _resistor_value(match)) for match in _RESISTOR_REGEX.finditer(text))
+
+    package = None
+    chip = _CHIP_PACKAGE_REGEX.search(text)
+    if chip:
+        package = chip.group(1)
+    else:
+        family = _PACKAGE_REGEX.search(text)
+        if family:
+            package = normalize_package(family.group(1), family.group(2))
+
+    # Drop repeats ("5V ... 5V") while keeping the original order
+    return {'values': list(dict.fromkeys(values)), 'package': package}
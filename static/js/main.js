@@ -111,6 +111,16 @@ function initApp() {
             addComponent();
         }
     });
+    // Once a preview is shown it follows the input; typing cancels the
+    // preview still waiting for the LLM
+    componentInput.addEventListener('input', function() {
+        if (parsePreview.classList.contains('d-none')) return;
+        if (previewController) previewController.abort();
+        clearTimeout(previewTimer);
+        previewTimer = setTimeout(() => {
+            if (componentInput.value.trim()) previewParse();
+        }, 400);
+    });
     categoryFilter.addEventListener('change', loadComponents);
     searchBtn.addEventListener('click', performSearch);
     clearSearchBtn.addEventListener('click', clearSearch);
@@ -187,18 +197,27 @@ function initApp() {
             imageProcessingText.textContent = 'Uploading image...';
             uploadImageBtn.disabled = true;
 
-            // Simulate progress (replace with actual progress if backend supports it)
-            let progress = 0;
-            const progressInterval = setInterval(() => {
-                progress += 10;
-                if (progress <= 100) {
-                    imageProcessingProgress.style.width = `${progress}%`;
-                    if (progress > 50 && progress < 90) imageProcessingText.textContent = 'Processing with Vision LLM...';
-                    else if (progress >= 90) imageProcessingText.textContent = 'Adding components to database...';
-                } else {
-                    clearInterval(progressInterval);
-                }
-            }, 300);
+            // Poll the background job until it finishes, showing its real progress
+            function pollJob(statusUrl) {
+                return fetch(statusUrl)
+                .then(response => response.json().then(data => ({ status: response.status, body: data })))
+                .then(({ status, body }) => {
+                    if (status !== 200) {
+                        return { status: status, body: body };
+                    }
+                    imageProcessingProgress.style.width = `${body.progress}%`;
+                    if (body.stage) imageProcessingText.textContent = body.stage;
+
+                    if (body.status === 'done') {
+                        return { status: 200, body: body.result };
+                    }
+                    if (body.status === 'failed') {
+                        return { status: 500, body: { error: body.error } };
+                    }
+                    return new Promise(resolve => setTimeout(resolve, 1000))
+                        .then(() => pollJob(statusUrl));
+                });
+            }
 
             console.log("Initiating fetch to /api/upload_image");
 
@@ -212,8 +231,15 @@ function initApp() {
                 return response.json().then(data => ({ status: response.status, body: data }))
             })
             .then(({ status, body }) => {
-                console.log("Parsed response body:", body);
-                clearInterval(progressInterval); // Stop progress simulation
+                if (status !== 202) {
+                    return { status: status, body: body };
+                }
+                console.log("Image queued as job", body.job_id);
+                imageProcessingText.textContent = 'Queued for processing...';
+                return pollJob(body.status_url);
+            })
+            .then(({ status, body }) => {
+                console.log("Job result:", body);
                 imageProcessingProgress.style.width = '100%';
                 imageProcessingProgress.classList.remove('progress-bar-animated');
 
@@ -245,7 +271,6 @@ function initApp() {
                 }
             })
             .catch(error => {
-                clearInterval(progressInterval); // Stop progress simulation
                 console.error('Fetch Error uploading image:', error);
                 imageProcessingText.textContent = 'Upload failed. See console for details.';
                 imageProcessingProgress.style.width = '100%';
@@ -268,6 +293,7 @@ function initApp() {
     // Load initial components
     console.log("Calling loadComponents for initial load...");
     loadComponents();
+    startChangeStream();
     
     // ALL OTHER FUNCTIONS GO HERE
     // Copy all your existing functions from the working version
@@ -280,26 +306,58 @@ function initApp() {
             return;
         }
         
+        // The server streams the regex result first, then the LLM's refinements
+        if (previewController) previewController.abort();
+        const controller = new AbortController();
+        previewController = controller;
+        const previewStatus = document.getElementById('preview-status');
+        
         fetch('/api/parse', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ input: input }),
+            body: JSON.stringify({ input: input, stream: true }),
+            signal: controller.signal,
         })
-        .then(response => response.json())
-        .then(data => {
-            document.getElementById('preview-name').textContent = data.name;
-            document.getElementById('preview-category').textContent = data.category;
-            document.getElementById('preview-quantity').textContent = data.quantity;
-            document.getElementById('preview-source').textContent = data.source || 'N/A';
-            document.getElementById('preview-specifications').textContent = data.specifications || 'N/A';
-            
-            parsePreview.classList.remove('d-none');
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Network response error: ${response.status} ${response.statusText}`);
+            }
+            return readJsonLines(response, event => {
+                if (event.type === 'regex') {
+                    showPreviewFields(event.result);
+                    previewStatus.textContent = 'refining...';
+                    parsePreview.classList.remove('d-none');
+                } else if (event.type === 'diff') {
+                    showPreviewFields(event.fields);
+                } else if (event.type === 'llm') {
+                    showPreviewFields(event.result);
+                    previewStatus.textContent = '';
+                } else if (event.type === 'error') {
+                    previewStatus.textContent = '(basic parsing)';
+                }
+            });
+        })
+        .then(() => {
+            if (previewStatus.textContent === 'refining...') previewStatus.textContent = '';
         })
         .catch(error => {
+            // Superseded by a newer preview
+            if (error.name === 'AbortError') return;
             console.error('Error:', error);
             alert('Failed to parse input');
+        })
+        .finally(() => {
+            if (previewController === controller) previewController = null;
+        });
+    }
+    
+    function showPreviewFields(fields) {
+        const fallbacks = { source: 'N/A', specifications: 'N/A' };
+        ['name', 'category', 'quantity', 'source', 'specifications'].forEach(field => {
+            if (!(field in fields)) return;
+            document.getElementById(`preview-${field}`).textContent = fields[field] || fallbacks[field] || fields[field];
         });
     }
     
@@ -444,6 +502,157 @@ function initApp() {
 // Keep track of all available categories
 let allCategories = [];
 
+// True while the table shows search results instead of the inventory
+let searchActive = false;
+
+// The parse preview in flight, so typing can cancel it
+let previewController = null;
+let previewTimer = null;
+
+// Read a newline-delimited JSON response, calling onEvent for each object as it arrives
+function readJsonLines(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split('\n');
+            buffer = done ? '' : lines.pop();
+            lines.filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+            return done ? undefined : pump();
+        });
+    }
+    return pump();
+}
+
+// Local copy of the inventory and the revision it reflects. After the first
+// full load only the rows changed since that revision are fetched.
+let inventoryData = [];
+let inventoryRevision = null;
+
+function compareComponents(a, b) {
+    // Same order as the server: category, name, id
+    if (a.category !== b.category) return a.category < b.category ? -1 : 1;
+    if (a.name !== b.name) return a.name < b.name ? -1 : 1;
+    return a.id - b.id;
+}
+
+function applyInventoryChanges(changes) {
+    const byId = new Map(changes.reset ? [] : inventoryData.map(item => [item.id, item]));
+    changes.upserted.forEach(item => byId.set(item.id, item));
+    changes.deleted.forEach(id => byId.delete(id));
+    inventoryData = [...byId.values()].sort(compareComponents);
+    inventoryRevision = changes.revision;
+}
+
+// Turn a format=columnar component list (one array per field, categories
+// as indexes into data.categories) back into component objects
+function decodeColumnar(data) {
+    const columns = data.fields.map(field => data.columns[field]);
+    const components = new Array(data.count);
+    for (let i = 0; i < data.count; i++) {
+        const component = {};
+        for (let f = 0; f < data.fields.length; f++) {
+            component[data.fields[f]] = columns[f][i];
+        }
+        if ('category' in component) component.category = data.categories[component.category];
+        components[i] = component;
+    }
+    return components;
+}
+
+// Resolve with the full, up-to-date component list
+function fetchInventory() {
+    if (inventoryRevision === null) {
+        return fetch('/api/components?format=columnar')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Network response error: ${response.status} ${response.statusText}`);
+            }
+            const revision = response.headers.get('X-Inventory-Revision');
+            return response.json().then(data => {
+                inventoryData = decodeColumnar(data);
+                inventoryRevision = revision === null ? null : Number(revision);
+                return inventoryData.slice();
+            });
+        });
+    }
+    
+    return fetch(`/api/components?since=${inventoryRevision}`)
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Network response error: ${response.status} ${response.statusText}`);
+        }
+        return response.json();
+    })
+    .then(changes => {
+        applyInventoryChanges(changes);
+        return inventoryData.slice();
+    });
+}
+
+// Apply changes made elsewhere to the rendered table. Rows whose category
+// and name are unchanged are replaced in place; anything that moves rows
+// around re-renders the inventory (search results are only patched).
+function syncInventory() {
+    if (inventoryRevision === null) return;
+    
+    const previous = new Map(inventoryData.map(item => [item.id, item]));
+    fetch(`/api/components?since=${inventoryRevision}`)
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Network response error: ${response.status} ${response.statusText}`);
+        }
+        return response.json();
+    })
+    .then(changes => {
+        if (changes.upserted.length === 0 && changes.deleted.length === 0) return;
+        applyInventoryChanges(changes);
+        
+        let needsRender = Boolean(changes.reset);
+        changes.deleted.forEach(id => {
+            const row = inventoryTable.querySelector(`tr[data-component-id="${id}"]`);
+            if (row) row.remove();
+        });
+        changes.upserted.forEach(item => {
+            const row = inventoryTable.querySelector(`tr[data-component-id="${item.id}"]`);
+            const old = previous.get(item.id);
+            if (row && old && old.category === item.category && old.name === item.name) {
+                row.replaceWith(buildComponentRow(item));
+            } else {
+                needsRender = true;
+            }
+        });
+        
+        if (needsRender && !searchActive) {
+            loadComponents();
+        } else {
+            loadSummary();
+        }
+    })
+    .catch(error => console.error('Error syncing inventory:', error));
+}
+
+// Follow changes made by other users (and other tabs) as they happen
+let changeStream = null;
+let syncTimer = null;
+
+function scheduleInventorySync() {
+    // Coalesce bursts of events (e.g. a bulk import) into one request
+    clearTimeout(syncTimer);
+    syncTimer = setTimeout(syncInventory, 200);
+}
+
+function startChangeStream() {
+    if (!window.EventSource || changeStream) return;
+    changeStream = new EventSource('/api/changes/stream');
+    changeStream.addEventListener('change', scheduleInventorySync);
+    // Catch up on anything missed while the connection was down
+    changeStream.addEventListener('open', scheduleInventorySync);
+}
+
 // Function to load components
 function loadComponents() {
     const loadingIndicator = document.getElementById('loading-indicator');
@@ -455,23 +664,18 @@ function loadComponents() {
     
     const selectedCategory = categoryFilter.value;
     
-    fetch('/api/components')
-    .then(response => {
-        if (!response.ok) {
-            throw new Error(`Network response error: ${response.status} ${response.statusText}`);
-        }
-        return response.json();
-    })
+    fetchInventory()
     .then(data => {
         console.log('Components loaded successfully:', data.length);
+        searchActive = false;
         // Hide loading after data is fetched
         if (loadingIndicator) {
             loadingIndicator.classList.add('d-none');
         }
         inventoryTable.classList.remove('d-none');
         
-        // Update available categories for search filters
-        updateAvailableCategories(data);
+        // Category lists, statistics and the duplicate warning
+        loadSummary();
         
         // Clear existing table
         inventoryTable.innerHTML = '';
@@ -481,10 +685,6 @@ function loadComponents() {
             ? data.filter(item => item.category === selectedCategory)
             : data;
         
-        // Get unique categories for the filter dropdown
-        const categories = [...new Set(data.map(item => item.category))];
-        updateCategoryFilter(categories);
-        
         // Group components by category
         const groupedComponents = {};
         filteredData.forEach(item => {
@@ -577,13 +777,6 @@ function loadComponents() {
                 </tr>
             `;
         }
-        
-        // Call updateDuplicateWarning safely
-        try {
-            updateDuplicateWarning(data);
-        } catch (err) {
-            console.error('Error in updateDuplicateWarning:', err);
-        }
     })
     .catch(error => {
         console.error('Error loading components:', error);
@@ -927,8 +1120,8 @@ function updateQuantity(componentId, newQuantity, quantityCell, quantityValue) {
 }
 
 // Function to update available categories for search filters
-function updateAvailableCategories(data) {
-    allCategories = [...new Set(data.map(item => item.category))].sort();
+function updateAvailableCategories(categories) {
+    allCategories = categories.slice().sort();
     
     // Update category checkboxes
     categoryCheckboxes.innerHTML = '';
@@ -989,7 +1182,8 @@ function performSearch() {
         },
         body: JSON.stringify({
             query: query,
-            filters: filters
+            filters: filters,
+            order: 'relevance'
         })
     })
     .then(response => response.json())
@@ -1002,6 +1196,8 @@ function performSearch() {
 
 // Function to display search results
 function displaySearchResults(data) {
+    searchActive = true;
+    
     // Clear existing table
     inventoryTable.innerHTML = '';
     
@@ -1095,8 +1291,6 @@ function displaySearchResults(data) {
             addRowEventListeners(row, item);
         });
     });
-    
-    updateDuplicateWarning(data);
 }
 
 // Extract row event listeners to reuse in both loadComponents and displaySearchResults
@@ -1168,7 +1362,54 @@ function resetFilters() {
     zeroQuantityFilter.value = '';
 }
 
-// After loading components in loadComponents()
+// Fetch the inventory summary and update everything derived from it
+function loadSummary() {
+    return fetch('/api/summary')
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Network response error: ${response.status} ${response.statusText}`);
+        }
+        return response.json();
+    })
+    .then(summary => {
+        const categories = summary.categories.map(category => category.name);
+        updateCategoryFilter(categories);
+        updateAvailableCategories(categories);
+        updateStorageOptions(summary.storage);
+        updateInventoryStats(summary);
+        // Rows flagged has_similar, so components marked not similar no longer count
+        updateDuplicateWarning(inventoryData);
+    })
+    .catch(error => console.error('Error loading inventory summary:', error));
+}
+
+// Suggest the known storage locations in the storage filter
+function updateStorageOptions(locations) {
+    let datalist = document.getElementById('storageLocations');
+    if (!datalist) {
+        datalist = document.createElement('datalist');
+        datalist.id = 'storageLocations';
+        document.body.appendChild(datalist);
+        storageFilter.setAttribute('list', datalist.id);
+    }
+    
+    datalist.innerHTML = '';
+    locations.filter(location => location.name).forEach(location => {
+        const option = document.createElement('option');
+        option.value = location.name;
+        option.label = `${location.component_count} component${location.component_count === 1 ? '' : 's'}`;
+        datalist.appendChild(option);
+    });
+}
+
+// Component, part and out-of-stock counts in the inventory header
+function updateInventoryStats(summary) {
+    const statsEl = document.getElementById('inventoryStats');
+    if (!statsEl) return;
+    
+    statsEl.textContent = `${summary.component_count} components · ${summary.total_quantity} parts · ${summary.zero_stock_count} out of stock`;
+}
+
 function updateDuplicateWarning(data) {
     if (!data || !Array.isArray(data)) {
         console.error('Invalid data passed to updateDuplicateWarning');
@@ -1474,15 +1715,10 @@ function loadComponentsWithHighlight(newComponentData) {
     
     const selectedCategory = categoryFilter.value;
     
-    fetch('/api/components')
-    .then(response => {
-        if (!response.ok) {
-            throw new Error(`Network response error: ${response.status} ${response.statusText}`);
-        }
-        return response.json();
-    })
+    fetchInventory()
     .then(data => {
         console.log('Components loaded successfully:', data.length);
+        searchActive = false;
         
         if (loadingIndicator) {
             loadingIndicator.classList.add('d-none');
@@ -1498,8 +1734,8 @@ function loadComponentsWithHighlight(newComponentData) {
             );
         }
         
-        // Update available categories for search filters
-        updateAvailableCategories(data);
+        // Category lists, statistics and the duplicate warning
+        loadSummary();
         
         // Filter by category if needed
         if (selectedCategory) {
@@ -1573,13 +1809,6 @@ function loadComponentsWithHighlight(newComponentData) {
         if (newComponent) {
             setTimeout(() => animateComponentToFinalPosition(newComponent, data), 2000);
         }
-        
-        // Call updateDuplicateWarning safely
-        try {
-            updateDuplicateWarning(data);
-        } catch (err) {
-            console.error('Error in updateDuplicateWarning:', err);
-        }
     })
     .catch(error => {
         console.error('Error loading components:', error);
@@ -1601,6 +1830,11 @@ function loadComponentsWithHighlight(newComponentData) {
 
 // Helper function to add a component row with optional highlight
 function addComponentRow(item, isNew = false) {
+    inventoryTable.appendChild(buildComponentRow(item, isNew));
+}
+
+// Build a component row (with its event listeners) without inserting it
+function buildComponentRow(item, isNew = false) {
     const row = document.createElement('tr');
     row.dataset.componentId = item.id;
     
@@ -1662,10 +1896,9 @@ function addComponentRow(item, isNew = false) {
         </td>
     `;
     
-    inventoryTable.appendChild(row);
-    
     // Add event listeners to the row buttons
     addRowEventListeners(row, item);
+    return row;
 }
 
 // Update animateComponentToFinalPosition to maintain category structure
@@ -0,0 +1,61 @@
+import time
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(breaker.before_call())
+    assert breaker.get_state()['state'] == OPEN
+
+def _rejected(breaker):
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        return True
+    return False
+
+def test_stale_success_does_not_close_open_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_seconds=60)
+    # A slow call is let through, then other calls open the breaker
+    slow_call = breaker.before_call()
+    _open(breaker)
+    breaker.record_success(slow_call)
+    assert breaker.get_state()['state'] == OPEN
+    assert _rejected(breaker)
+
+def test_stale_failure_does_not_end_probe():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_seconds=0.01)
+    slow_call = breaker.before_call()
+    _open(breaker)
+    time.sleep(0.02)
+    probe = breaker.before_call()
+    assert breaker.get_state()['state'] == HALF_OPEN
+    # The slow call fails while the probe is out: no second probe, still half-open
+    breaker.record_failure(slow_call)
+    assert breaker.get_state()['state'] == HALF_OPEN
+    assert _rejected(breaker)
+    breaker.record_success(probe)
+    assert breaker.get_state()['state'] == CLOSED
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_seconds=0.01)
+    _open(breaker)
+    time.sleep(0.02)
+    breaker.record_failure(breaker.before_call())
+    assert breaker.get_state()['state'] == OPEN
+    assert breaker.get_state()['opened'] == 2
+
+def test_stale_failures_after_reset_are_ignored():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_seconds=60)
+    calls = [breaker.before_call() for _ in range(2)]
+    breaker.reset()
+    for call in calls:
+        breaker.record_failure(call)
+    assert breaker.get_state()['state'] == CLOSED
+    assert breaker.get_state()['consecutive_failures'] == 0
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
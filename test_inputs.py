@@ -22,7 +22,18 @@ test_inputs = [
     "Yellow LED, 5mm, 590nm wavelength, 20mA forward current, 2.1V forward voltage, diffused, 25 pcs",
     "Texas Instruments CD4017BE decade counter IC, DIP-16, 3-15V, CMOS, tme.eu:CD4017BE, 7 pieces",
     "HC-SR04 ultrasonic distance sensor module, 5V operating voltage, 2-400cm measurement range, 4-pin, 5 units",
-    "add relay module, 5V coil, 10A/250VAC contacts, optoisolated, with mounting holes, qty:3"
+    "add relay module, 5V coil, 10A/250VAC contacts, optoisolated, with mounting holes, qty:3",
+    "Electrolytic 100 μF 25V, 10pcs",
+    "SMD power 22 μH, 1206, 5 pcs"
+]
+
+# Inputs whose category the regex parser must detect; μ (Greek mu) and µ
+# (micro sign) are the same letter to it
+category_cases = [
+    ("Electrolytic 100 μF 25V, 10pcs", "Capacitor"),
+    ("Electrolytic 100 µF 25V, 10pcs", "Capacitor"),
+    ("SMD power 22 μH, 1206, 5 pcs", "Inductor"),
+    ("SMD power 22 µH, 1206, 5 pcs", "Inductor"),
 ]
 
 # You can use this for automated testing
@@ -30,6 +41,10 @@ if __name__ == "__main__":
     # Example: Test regex parser
     from parser import parse_component
     
+    for test_input, expected in category_cases:
+        category = parse_component(test_input, use_llm=False)['category']
+        assert category == expected, f"{test_input!r}: {category} != {expected}"
+    
     for i, test_input in enumerate(test_inputs):
         print(f"\nTest #{i+1}: {test_input}")
         # Test with regex parser (LLM disabled)